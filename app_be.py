@@ -31,8 +31,8 @@ try:
     import copy
     import json
     import math
+    import threading
     from datetime import datetime
-    from threading import Timer
 
     import app_mods
     import numpy as np
@@ -87,25 +87,22 @@ class TeZ_App_BE:
                                             dl_filepath,
                                             None,
                                             tiu_save_token_file_cfg,
-                                            tiu_save_token_file)
+                                            tiu_save_token_file,
+                                            api_host=api_host, ws_endpoint=ws_endpoint)
             logger.debug(f'tcc:{str(tcc)}')
             tiu = app_mods.Tiu(tcc=tcc)
 
-            logger.info('Creating dataframe for quick access')
-            instruments = app_mods.get_system_info("TIU", "INSTRUMENT_INFO")
+            # Quick access data needs the scrip master, so it is prepared in the background.
+            # Lookups made before it is ready wait for the scrip master preparation.
+            def create_quick_access():
+                logger.info('Creating dataframe for quick access')
+                if len(symbol_exp_date_pairs):
+                    tiu.compact_search_file(symbol_exp_date_pairs)
+                    tiu.create_option_chains(symbol_exp_date_pairs)
+                tiu.create_sym_token_tsym_q_access(symbol_list=None, instruments=instruments)
 
-            symbol_exp_date_pairs = []
-            for symbol, info in instruments.items():
-                logger.debug(f"Instrument: {symbol}")
-                if info['EXCHANGE'] == 'NFO':
-                    symbol = info['SYMBOL']
-                    exp_date = info['EXPIRY_DATE']
-                    symbol_exp_date_pairs.append((symbol, exp_date))
-
-            if len(symbol_exp_date_pairs):
-                tiu.compact_search_file(symbol_exp_date_pairs)
-
-            tiu.create_sym_token_tsym_q_access(symbol_list=None, instruments=instruments)
+            th = threading.Thread(target=create_quick_access, name='TIU_QUICK_ACCESS', daemon=True)
+            th.start()
 
             return tiu
 
@@ -116,9 +113,15 @@ class TeZ_App_BE:
             diu_save_token_file_cfg = app_mods.get_system_info("DIU", "SAVE_TOKEN_FILE_CFG")
             diu_save_token_file = app_mods.get_system_info("DIU", "SAVE_TOKEN_FILE_NAME")
 
-            dcc = app_mods.Diu_CreateConfig(diu_cred_file, None, diu_token_file, False, None, None, diu_save_token_file_cfg, diu_save_token_file)
+            dcc = app_mods.Diu_CreateConfig(diu_cred_file, None, diu_token_file, False, None, None, diu_save_token_file_cfg, diu_save_token_file,
+                                            api_host=api_host, ws_endpoint=ws_endpoint)
             logger.debug(f'dcc:{str(dcc)}')
             diu = app_mods.Diu(dcc=dcc)
+            try:
+                # ltp of the ladder legs older than this is not used, a quote is fetched instead
+                diu.ws_wrap.max_tick_age = float(app_mods.get_system_info("DIU", "MAX_TICK_AGE_SECS"))
+            except (KeyError, TypeError):
+                pass
 
             diu.ul_symbol = app_mods.get_system_info("GUI_CONFIG", "RADIOBUTTON_DEF_VALUE")
 
@@ -129,13 +132,110 @@ class TeZ_App_BE:
             bku = app_mods.BookKeeperUnit(bku_file, reset=False)
             return bku
 
+        # Long lived order and background I/O threads, started before the first click
+        self.exec_service = utils.ExecService()
+        utils.set_exec_service(self.exec_service)
+        self.exec_service.warm()
+
+        # Per click latency of each stage, summarised at exit
+        try:
+            trace_cfg = app_mods.get_system_info("SYSTEM", "TRACING")
+        except (KeyError, TypeError):
+            trace_cfg = None
+        trace_cfg = trace_cfg or dict()
+        self.trace_file = trace_cfg.get('SUMMARY_FILE')
+        self.tracer = utils.Tracer(capacity=trace_cfg.get('CAPACITY') or utils.Tracer.CAPACITY,
+                                   enabled=str(trace_cfg.get('ENABLED', 'YES')).upper() == 'YES')
+        utils.set_tracer(self.tracer)
+
+        # One thread runs the time triggered jobs (square off, periodic refreshes) of the app
+        market_timing = app_mods.get_system_info("SYSTEM", "MARKET_TIMING")
+        try:
+            holidays = app_mods.get_system_info("SYSTEM", "MARKET_HOLIDAYS")
+        except (KeyError, TypeError):
+            holidays = None
+        calendar = utils.MarketCalendar(market_timing['OPEN'], market_timing['CLOSE'], holidays)
+        self.scheduler = utils.Scheduler(calendar=calendar)
+        utils.set_scheduler(self.scheduler)
+        self.scheduler.start()
+
+        # Scrip master download, parsing and indexing starts right away and
+        # overlaps with login and session validation of TIU and DIU.
+        instruments = app_mods.get_system_info("TIU", "INSTRUMENT_INFO")
+        symbol_exp_date_pairs = []
+        for symbol, info in instruments.items():
+            logger.debug(f"Instrument: {symbol}")
+            if info['EXCHANGE'] == 'NFO':
+                symbol = info['SYMBOL']
+                exp_date = info['EXPIRY_DATE']
+                symbol_exp_date_pairs.append((symbol, exp_date))
+
+        dl_filepath = app_mods.get_system_info("SYSTEM", "DL_FOLDER")
+        self.scrip_prep = app_mods.start_scrip_master_prep(dl_filepath, symbol_exp_date_pairs)
+
+        # another Noren server, the local simulated broker of tests/sim_broker.py for one
+        try:
+            api_host = app_mods.get_system_info("SYSTEM", "BROKER_API_HOST")
+            ws_endpoint = app_mods.get_system_info("SYSTEM", "BROKER_WS_ENDPOINT")
+        except (KeyError, TypeError):
+            api_host = ws_endpoint = None
+
+        # Broker calls are paced by the rate limiter only when it is opted in
+        try:
+            rate_limiter = app_mods.get_system_info("SYSTEM", "RATE_LIMITER")
+        except (KeyError, TypeError):
+            rate_limiter = 'NO'
+        if str(rate_limiter).upper() == 'YES':
+            app_mods.http_transport.enable_rate_limiter()
+            logger.info('Broker calls are paced by the rate limiter')
+
         self.tiu = create_tiu()
         self.diu = create_diu()
         self.bku = create_bku()
 
-        ocpu_cc = app_mods.Ocpu_CreateConfig(tiu=self.tiu,diu=self.diu, bku=self.bku)
+        # Margin follows the fills on the order update stream and is reconciled in the background.
+        # Orders are confirmed from the pushed order updates.
+        # Both only if the feed is of the trading account
+        try:
+            margin_refresh = float(app_mods.get_system_info("TIU", "MARGIN_REFRESH_SECS"))
+        except (KeyError, TypeError):
+            margin_refresh = app_mods.MarginState.REFRESH_INTERVAL
+        if self.diu.fv.shoonya_accountid == self.tiu.fv.shoonya_accountid:
+            self.diu.ws_wrap.add_order_update_listener(self.tiu.margin.on_order_update)
+            self.tiu.order_events = app_mods.OrderEventRouter(self.diu.ws_wrap)
+        else:
+            logger.info('Data feed is of another account, orders are confirmed by polling '
+                        'and margin is kept by the periodic refresh only')
+        self.tiu.start_margin_refresh(margin_refresh)
+
+        try:
+            order_engine = app_mods.get_system_info("TIU", "ORDER_ENGINE")
+        except KeyError:
+            order_engine = 'THREADS'
+        if order_engine == 'ASYNC':
+            self.tiu.order_engine = app_mods.AsyncOrderEngine(self.tiu.fv, order_events=self.tiu.order_events,
+                                                              notifier=self.tiu.notifier)
+            self.tiu.order_engine.start()
+
+        # Order details of ATM +/- N strikes are kept ready, driven by the underlying ticks
+        try:
+            n_strikes = int(app_mods.get_system_info("TIU", "LADDER_STRIKES"))
+        except (KeyError, TypeError):
+            n_strikes = app_mods.StrikeLadderPrefetcher.N_STRIKES
+        self.ladder = app_mods.StrikeLadderPrefetcher(self.tiu, self.diu.ws_wrap, n_strikes=n_strikes)
+        for _, info in instruments.items():
+            ul_token = self.diu.get_ul_token(info['UL_INSTRUMENT'])
+            self.ladder.add_instrument(ul_token, info['EXCHANGE'], info['SYMBOL'], info['EXPIRY_DATE'])
+        self.ladder.start()
+
+        ocpu_cc = app_mods.Ocpu_CreateConfig(tiu=self.tiu, diu=self.diu, bku=self.bku, ladder=self.ladder)
         self.ocpu = app_mods.OCPU(ocpu_cc=ocpu_cc)
 
+        # Order batches are kept armed while the gui is unlocked, a click only dispatches
+        self.ocpu_inst_info = dict()
+        self.armed = app_mods.ArmedTicketUnit(self.ocpu, self.diu.ws_wrap)
+        self.armed.start()
+
         self._sqoff_time = None
         self.sqoff_timer = None
 
@@ -146,19 +246,16 @@ class TeZ_App_BE:
         minute = datetime.strptime(auto_sq_off_time_str, '%H:%M').minute
         self._sq_off_time = datetime.now().replace(hour=hr, minute=minute, second=0, microsecond=0)
 
-        rm_durn = utils.calcRemainingDuration(self._sq_off_time.hour, self._sq_off_time.minute)
-        if (rm_durn > 0):
-            self.sqoff_timer = Timer(rm_durn, self.__square_off_position_timer__)
-        if self.sqoff_timer is not None:
-            self.sqoff_timer.name = "SQ_OFF_TIMER"
-            self.sqoff_timer.daemon = True
-            self.sqoff_timer.start()
-        else:
+        # snapshot and exit legs are kept ready ahead of the time, the exits leave on time
+        try:
+            prearm_secs = float(app_mods.get_system_info("SYSTEM", "SQ_OFF_PREARM_SECS"))
+        except (KeyError, TypeError):
+            prearm_secs = app_mods.AutoSquareOff.PREARM_SECS
+        self.sqoff_timer = app_mods.AutoSquareOff(self.tiu, self.bku.fetch_order_id, self._sq_off_time,
+                                                  prearm_secs=prearm_secs, scheduler=self.scheduler)
+        if not self.sqoff_timer.start():
             logger.debug("Square off Timer Is not Created.. as Time has elapsed ")
-
-    def __square_off_position_timer__(self):
-        logger.info(f'{datetime.now().time()} !! Auto Square Off Time !!')
-        self.square_off_position(mode='ALL')
+            self.sqoff_timer = None
 
     @property
     def ul_symbol(self):
@@ -167,11 +264,24 @@ class TeZ_App_BE:
     @ul_symbol.setter
     def ul_symbol(self, ul_symbol):
         self.diu.ul_symbol = ul_symbol
+        if self.armed.armed:
+            self.arm_order_tickets(True)
 
     def exit_app_be(self):
         if self.sqoff_timer is not None:
             if self.sqoff_timer.is_alive():
-                self.sqoff_timer.cancel()
+                self.sqoff_timer.stop()
+        self.ladder.stop()
+        self.armed.stop()
+        self.tiu.stop_margin_refresh()
+        self.scheduler.stop()
+        if self.tiu.order_engine is not None:
+            self.tiu.order_engine.stop()
+        self.exec_service.shutdown()
+        if self.tiu.fv.transport.limiter is not None:
+            logger.info(f'Broker rate limiter: {self.tiu.fv.transport.limiter.metrics()}')
+        if self.tracer.enabled:
+            self.tracer.export(self.trace_file)
 
     @staticmethod
     def get_instrument_info(exchange, ul_inst):
@@ -184,10 +294,11 @@ class TeZ_App_BE:
                 break
         return instrument_info  # symbol, exp_date, ce_offset, pe_offset
 
-    def market_action(self, action):
-
-        ul_sym = self.diu.ul_symbol
-        exch = app_mods.get_system_info("TIU", "EXCHANGE")
+    def __get_ocpu_inst_info__(self, exch, ul_sym):
+        # the instrument config does not change during the session, built once per instrument
+        key = (exch, ul_sym)
+        if key in self.ocpu_inst_info:
+            return self.ocpu_inst_info[key]
 
         inst_info_dict = TeZ_App_BE.get_instrument_info(exch, ul_sym)
         inst_info = {key.lower(): value for key, value in inst_info_dict.items()}
@@ -204,8 +315,33 @@ class TeZ_App_BE:
                                                 qty=qty, 
                                                 n_legs=nlegs 
                                                 )
+        self.ocpu_inst_info[key] = inst_info
+        return inst_info
 
-        self.ocpu.crete_and_place_order(action, inst_info=inst_info)
+    def arm_order_tickets(self, armed: bool):
+        if not armed:
+            self.armed.disarm()
+            return
+        ul_sym = self.diu.ul_symbol
+        exch = app_mods.get_system_info("TIU", "EXCHANGE")
+        inst_info = self.__get_ocpu_inst_info__(exch, ul_sym)
+        self.armed.arm(inst_info, self.diu.get_ul_token(ul_sym))
+
+    def market_action(self, action):
+        with self.tracer.trace(f'CLICK_{action.upper()}'):
+            # armed batch if it is fresh and still for the ATM strike, else the regular path
+            batch = self.armed.take(action)
+            if batch is not None:
+                logger.info(f'Armed ticket: {action} {batch.tsym} qty: {batch.qty} ltp: {batch.ltp}')
+                self.ocpu.dispatch(batch)
+                return
+
+            with self.tracer.span('CONFIG'):
+                ul_sym = self.diu.ul_symbol
+                exch = app_mods.get_system_info("TIU", "EXCHANGE")
+                inst_info = self.__get_ocpu_inst_info__(exch, ul_sym)
+
+            self.ocpu.crete_and_place_order(action, inst_info=inst_info)
 
     def square_off_position(self, mode='SELECT'):
         df = self.bku.fetch_order_id()
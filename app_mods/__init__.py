@@ -1,9 +1,19 @@
 from .fv_api_extender import ShoonyaApiPy
+from .symbol_index import (SymbolIndex, SymRecord)
+from .option_chain import (OptionChain, OptionLeg)
+from .strike_grid import (StrikeGrid, StrikeGridService)
+from .scrip_master import (ScripMasterPrep, start_scrip_master_prep)
 from .app_cfg import (get_system_config, get_system_info, get_session_id_from_gsheet)
 from .ws_wrap import WS_WrapU
+from .margin_state import (MarginState, MarginSnapshot)
+from .order_events import OrderEventRouter
+from .sq_off import (SquareOffEngine, SquareOffReport, AutoSquareOff)
 from .tiu import (Tiu,Tiu_OrderStatus, Diu, Diu_CreateConfig, Tiu_CreateConfig)
 from .bku import (BookKeeperUnit)
-from .ocpu import (Ocpu_CreateConfig, OCPU, OcpuInstrumentInfo)
+from .async_exec import AsyncOrderEngine
+from .strike_ladder import (StrikeLadderPrefetcher, LadderLeg)
+from .ocpu import (Ocpu_CreateConfig, OCPU, OcpuInstrumentInfo, OrderBatch)
+from .armed_ticket import (ArmedTicketUnit, ArmedTicket)
 from .shared_classes import (TickData, SimpleDataPort, Component_Type, LiveFeedStatus, 
                              Ctrl, Market_Timing, BaseInst, 
                              FVInstrument, SysInst, BO_B_SL_LMT_Order, BO_B_LMT_Order, 
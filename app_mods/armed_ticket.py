@@ -0,0 +1,160 @@
+"""
+File: armed_ticket.py
+Author: [Tarakeshwar NC]
+Date: April 10, 2024
+Description:  This script keeps Buy and Short order batches ready while the GUI is
+unlocked. The batches (legs, quantities, remarks and OCO prices) are rebuilt from the
+ticks of the underlying using only prepared data, so that a click only stamps the
+ticket and dispatches the orders. A ticket that is too old or does not match the
+current ATM strike is not used, the click then takes the regular path.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/10"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    import threading
+    from typing import NamedTuple
+
+    from app_utils.scheduler import MonotonicClock
+
+    from .ocpu import OCPU, OcpuInstrumentInfo, OrderBatch
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+
+class ArmedTicket(NamedTuple):
+    batch: OrderBatch
+    built_at: float  # clock.now()
+    arm_id: int      # arming the ticket was built for
+
+
+class ArmedTicketUnit(object):
+    ACTIONS = ('Buy', 'Short')
+    MAX_AGE = 1.0             # secs, older tickets are rebuilt on the click path
+    REBUILD_INTERVAL = 0.25   # secs, minimum gap between rebuilds
+
+    def __init__(self, ocpu: OCPU, ws_wrap=None, clock: MonotonicClock = None):
+        """
+        Args:
+            clock (MonotonicClock): FakeClock in the tests
+        """
+        self.ocpu = ocpu
+        self.ws_wrap = ws_wrap
+        self.clock = clock if clock is not None else MonotonicClock()
+        self.inst_info: OcpuInstrumentInfo = None
+        self.ul_token = None
+        self.tickets = dict()  # action -> ArmedTicket
+        self.armed = False
+        # each arm and disarm starts a new arming, a build of an earlier one is dropped
+        self.arm_id = 0
+        self.lock = threading.Lock()
+        self.evt = threading.Event()
+        self.stop_evt = threading.Event()
+        self.th = None
+        self.hits = 0
+        self.misses = 0
+
+    def start(self):
+        if self.ws_wrap is not None:
+            self.ws_wrap.add_tick_listener(self.on_tick)
+        self.th = threading.Thread(target=self.__run__, name='ARMED_TICKETS', daemon=True)
+        self.th.start()
+
+    def stop(self):
+        self.disarm()
+        self.stop_evt.set()
+        self.evt.set()
+
+    def arm(self, inst_info: OcpuInstrumentInfo, ul_token):
+        with self.lock:
+            self.arm_id += 1
+            self.inst_info = inst_info
+            self.ul_token = str(ul_token)
+            self.tickets = dict()
+            self.armed = True
+        logger.info(f'Order tickets armed: {inst_info.exchange} {inst_info.symbol}')
+        self.evt.set()
+
+    def disarm(self):
+        if self.armed:
+            logger.info(f'Order tickets disarmed, hits: {self.hits} misses: {self.misses}')
+        with self.lock:
+            self.arm_id += 1
+            self.armed = False
+            self.tickets = dict()
+
+    def on_tick(self, token, ltp):
+        if self.armed and token == self.ul_token:
+            self.evt.set()
+
+    def __run__(self):
+        while not self.stop_evt.is_set():
+            # quiet underlying still refreshes the tickets before they age out
+            self.evt.wait(ArmedTicketUnit.MAX_AGE / 2)
+            self.evt.clear()
+            if not self.armed:
+                continue
+            try:
+                self.__build__()
+            except Exception as e:
+                logger.error(f'Arming tickets failed: {e}')
+                logger.debug(traceback.format_exc())
+            self.stop_evt.wait(ArmedTicketUnit.REBUILD_INTERVAL)
+
+    def __build__(self):
+        with self.lock:
+            arm_id, inst_info = self.arm_id, self.inst_info
+        tickets = dict()
+        for action in ArmedTicketUnit.ACTIONS:
+            batch = self.ocpu.prepare_orders(action, inst_info, prepared_only=True)
+            if batch is not None and len(batch.orders):
+                tickets[action] = ArmedTicket(batch, self.clock.now(), arm_id)
+        # a disarm or re-arm during the build drops the result, even if armed again for the same instrument
+        with self.lock:
+            if self.armed and arm_id == self.arm_id:
+                self.tickets = tickets
+
+    def take(self, action: str):
+        """Ticket batch for the click, consumed on use.
+
+        Returns:
+            OrderBatch: ready batch, None if there is no fresh ticket for the current strike
+        """
+        with self.lock:
+            ticket = self.tickets.pop(action, None) if self.armed else None
+            if ticket is not None and ticket.arm_id != self.arm_id:
+                ticket = None
+        batch = None
+        if ticket is not None and (self.clock.now() - ticket.built_at) <= ArmedTicketUnit.MAX_AGE:
+            leg = self.ocpu.prepared_leg(action, self.inst_info)
+            if leg is not None and leg.token == ticket.batch.token:
+                batch = ticket.batch
+        if batch is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        # next ticket for the same action
+        self.evt.set()
+        return batch
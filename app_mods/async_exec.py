@@ -0,0 +1,303 @@
+"""
+File: async_exec.py
+Author: [Tarakeshwar NC]
+Date: April 15, 2024
+Description:  This script provides the asyncio order execution engine. The legs of a
+click are placed, confirmed and followed up with their OCO orders as coroutines on one
+long lived event loop, over a pooled httpx client. Concurrency is bounded and the
+confirmation of every leg has a deadline, an order not final by then is cancelled at the
+broker and its fill so far is returned, to be recorded and protected. The result has the same form as Tiu.place_and_confirm_tez_order, so the
+engine can be used in its place.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/15"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    import asyncio
+    import json
+    import threading
+    import time
+
+    import httpx
+
+    from . import http_transport, rate_limiter, shared_classes
+    from .fv_api_extender import ShoonyaApiPy
+    from .tiu import Tiu, Tiu_OrderStatus
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+# rejections that are not an error of the order itself
+SOFT_REJ_REASONS = ('rms:blocked', 'margin', 'rms: auto square off block')
+
+
+class AsyncOrderEngine(object):
+    MAX_CONCURRENCY = 10
+    LEG_DEADLINE = 8.0   # secs from the start of a leg after its slot, the confirmation is cut off then
+    EVENT_POLL = 0.01    # secs, check of the pushed order updates
+    FINAL_READS = 3      # reads of the order state after a cancel
+    FINAL_STATES = ('complete', 'rejected', 'canceled')
+    POOL_SIZE = 16
+
+    def __init__(self, fv: ShoonyaApiPy, order_events=None,
+                 max_concurrency: int = MAX_CONCURRENCY, leg_deadline: float = LEG_DEADLINE,
+                 notifier=None):
+        """
+        Args:
+            fv (ShoonyaApiPy): logged in session, used for the request payloads
+            order_events (OrderEventRouter): pushed order updates, polled if None
+        """
+        self.fv = fv
+        self.order_events = order_events
+        self.max_concurrency = max_concurrency
+        self.leg_deadline = leg_deadline
+        self.notifier = notifier
+        self.loop = None
+        self.client = None
+        self.sem = None
+        self.th = None
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        self.th = threading.Thread(target=self.loop.run_forever, name='ASYNC_ORDER_LOOP', daemon=True)
+        self.th.start()
+        asyncio.run_coroutine_threadsafe(self.__setup__(), self.loop).result()
+        logger.info(f'Async order engine started, concurrency: {self.max_concurrency}')
+
+    async def __setup__(self):
+        limits = httpx.Limits(max_connections=AsyncOrderEngine.POOL_SIZE,
+                              max_keepalive_connections=AsyncOrderEngine.POOL_SIZE)
+        self.client = httpx.AsyncClient(limits=limits)
+        self.sem = asyncio.Semaphore(self.max_concurrency)
+
+    def stop(self):
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.client.aclose(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.th.join()
+        self.loop.close()
+        self.loop = None
+
+    async def __post__(self, request):
+        url, payload = request
+        connect, read = http_transport.timeout_for(url)
+        limiter = getattr(self.fv.transport, 'limiter', None)
+        if limiter is None:
+            res = await self.client.post(url, content=payload, timeout=httpx.Timeout(read, connect=connect))
+            return json.loads(res.text)
+
+        # paced together with the calls of the threads, the wait is kept off the loop
+        acquire = asyncio.ensure_future(asyncio.to_thread(limiter.acquire, url))
+        try:
+            permit = await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            # leg cut off by its deadline, the slot taken by the thread is given back
+            acquire.add_done_callback(lambda f: None if f.cancelled() or f.exception() else limiter.release(f.result()))
+            raise
+        start = time.monotonic()
+        try:
+            res = await self.client.post(url, content=payload, timeout=httpx.Timeout(read, connect=connect))
+        except httpx.TransportError:
+            limiter.release(permit, throttled=True)
+            raise
+        except BaseException:
+            limiter.release(permit)
+            raise
+        limiter.release(permit, latency=time.monotonic() - start,
+                        throttled=rate_limiter.is_throttled(res.status_code, res.text))
+        return json.loads(res.text)
+
+    async def __order_state__(self, order_id, check_cnt):
+        """Same order as Tiu.__get_order_state__, the pushed update first, then polling"""
+        events = self.order_events
+        with app_utils.get_tracer().span('CONFIRM_POLL'):
+            if events is not None and events.live:
+                wait = Tiu.CONFIRM_EVENT_DEADLINE if check_cnt == 0 else Tiu.CONFIRM_SLEEP_PERIOD
+                end = time.monotonic() + wait
+                while True:
+                    msg = events.get(order_id)
+                    if events.is_final(msg):
+                        return msg
+                    if time.monotonic() >= end:
+                        break
+                    await asyncio.sleep(AsyncOrderEngine.EVENT_POLL)
+            elif check_cnt:
+                await asyncio.sleep(Tiu.CONFIRM_SLEEP_PERIOD)
+            r_os_list = await self.__post__(self.fv.single_order_history_request(order_id))
+            return r_os_list[0] if isinstance(r_os_list, list) and len(r_os_list) else {}
+
+    @staticmethod
+    def __fill__(order, r_os_dict, ord_status, filled_qty):
+        ord_status.avg_price = float(r_os_dict.get('avgprc', 0))
+        ord_status.trantype = order.buy_or_sell
+        ord_status.fillshares = filled_qty if order.buy_or_sell == 'B' else -filled_qty
+        ord_status.fill_timestamp = r_os_dict.get('exch_tm')
+
+    async def __confirm__(self, order, order_id, ord_status):
+        qty = order.quantity
+        for check_cnt in range(0, Tiu.CONFIRM_COUNT):
+            r_os_dict = await self.__order_state__(order_id, check_cnt)
+            status = r_os_dict.get('status', '').lower()
+            if status == 'rejected':
+                rej_reason = r_os_dict.get('rejreason', '').lower()
+                ord_status.rejReason = rej_reason
+                if any(rej_reason.find(reason) != -1 for reason in SOFT_REJ_REASONS):
+                    return Tiu_OrderStatus.SOFT_FAILURE_REJRMS
+                return Tiu_OrderStatus.HARD_FAILURE
+            if status == 'complete' and int(r_os_dict.get('fillshares', 0)) == qty:
+                AsyncOrderEngine.__fill__(order, r_os_dict, ord_status, qty)
+                return Tiu_OrderStatus.SUCCESS
+
+        # Not filled even after few secs.
+        return await self.__cancel__(order, order_id, ord_status)
+
+    async def __cancel__(self, order, order_id, ord_status):
+        """Cancels the order at the broker and reads its final state, the fill so far is kept"""
+        qty = order.quantity
+        r = await self.__post__(self.fv.cancel_order_request(order_id))
+        if not isinstance(r, dict) or r.get('stat') != 'Ok':
+            # filled or rejected in the meantime, its state tells
+            logger.info(f'cancel of {order_id} failed: {r.get("emsg") if isinstance(r, dict) else r}')
+        r_os_dict = dict()
+        for check_cnt in range(0, AsyncOrderEngine.FINAL_READS):
+            r_os_dict = await self.__order_state__(order_id, check_cnt)
+            if r_os_dict.get('status', '').lower() in AsyncOrderEngine.FINAL_STATES:
+                break
+        filled_qty = int(r_os_dict.get('fillshares') or 0)
+        if not filled_qty:
+            return Tiu_OrderStatus.HARD_FAILURE
+        AsyncOrderEngine.__fill__(order, r_os_dict, ord_status, filled_qty)
+        return Tiu_OrderStatus.SUCCESS if filled_qty == qty else Tiu_OrderStatus.SOFT_FAILURE_QTY
+
+    async def __place_oco__(self, com_order, ord_status):
+        f_order: shared_classes.OCO_FOLLOW_UP_MKT_I_Order = com_order.follow_up_order
+        remarks = f_order.remarks + '_' + ord_status.order_id if f_order.remarks else ord_status.order_id
+        request = self.fv.gtt_oco_order_request(buy_or_sell=f_order.buy_or_sell,
+                                                product_type=f_order.product_type,
+                                                exchange=f_order.exchange,
+                                                tradingsymbol=f_order.tradingsymbol,
+                                                book_loss_alert_price=f_order.book_loss_alert_price,
+                                                book_loss_price=f_order.book_loss_price,
+                                                book_loss_price_type=f_order.price_type,
+                                                book_profit_alert_price=f_order.book_profit_alert_price,
+                                                book_profit_price=f_order.book_profit_price,
+                                                book_profit_price_type=f_order.price_type,
+                                                quantity=abs(ord_status.fillshares),
+                                                remarks=remarks)
+        with app_utils.get_tracer().span('OCO_PLACE'):
+            r = await self.__post__(request)
+        if isinstance(r, dict) and r.get('stat') == 'OI created':
+            logger.info(f'Place order success:: al id  : {r["al_id"]}')
+            com_order.al_id = r['al_id']
+            return Tiu_OrderStatus.SUCCESS
+        logger.info(f'OCO place_order : Failure {r.get("emsg") if isinstance(r, dict) else r}')
+        return Tiu_OrderStatus.HARD_FAILURE
+
+    async def __leg__(self, com_order, tag, use_gtt_oco):
+        """Primary order of the leg, its confirmation and its OCO
+
+        Returns:
+            tuple: ((status, ord_status), oco status or None)
+        """
+        order = com_order
+        if isinstance(order, (shared_classes.Combi_Primary_B_MKT_And_OCO_S_MKT_I_Order_NSE,
+                              shared_classes.Combi_Primary_S_MKT_And_OCO_B_MKT_I_Order_NSE)):
+            order = order.primary_order
+
+        status = Tiu_OrderStatus.HARD_FAILURE
+        ord_status = shared_classes.OrderStatus()
+        async with self.sem:
+            # queued behind other legs, the deadline starts with the slot
+            end = time.monotonic() + self.leg_deadline
+            request = self.fv.place_order_request(buy_or_sell=order.buy_or_sell,
+                                                  product_type=order.product_type,
+                                                  exchange=order.exchange,
+                                                  tradingsymbol=order.tradingsymbol,
+                                                  quantity=order.quantity, discloseqty=0,
+                                                  trigger_price=order.trigger_price,
+                                                  price=order.price,
+                                                  price_type=order.price_type,
+                                                  bookloss_price=order.book_loss_price,
+                                                  bookprofit_price=order.book_profit_price,
+                                                  trail_price=0.0,
+                                                  retention=order.retention, remarks=order.remarks)
+            with app_utils.get_tracer().span('PLACE_ORDER'):
+                r = await self.__post__(request)
+            if isinstance(r, dict) and r.get('stat') == 'Ok':
+                logger.info(f'Order Attempt success:: order id  : {r["norenordno"]}')
+                ord_status.order_id = r['norenordno']
+                try:
+                    status = await asyncio.wait_for(self.__confirm__(order, ord_status.order_id, ord_status),
+                                                    max(0.0, end - time.monotonic()))
+                except asyncio.TimeoutError:
+                    logger.error(f'{tag}: order {ord_status.order_id} not confirmed in {self.leg_deadline} secs, '
+                                 f'cancelling it')
+                    status = await self.__cancel__(order, ord_status.order_id, ord_status)
+                    logger.info(f'{tag}: order {ord_status.order_id} after the cancel: {status.name} '
+                                f'filled: {ord_status.fillshares}')
+            else:
+                ord_status.emsg = r.get('emsg') if isinstance(r, dict) else None
+                logger.info(f'place_order : Failure {ord_status.emsg}')
+
+            # follow up right after the fill of this leg, a part fill left by a cancel is protected too
+            oco_status = None
+            if status in (Tiu_OrderStatus.SUCCESS, Tiu_OrderStatus.SOFT_FAILURE_QTY) and use_gtt_oco:
+                com_order.order_id = ord_status.order_id
+                oco_status = await self.__place_oco__(com_order, ord_status)
+
+        if status == Tiu_OrderStatus.HARD_FAILURE:
+            mesg = f'{tag}: Check manually, Quit the App, Orders not going Through'
+            logger.error(mesg)
+            if self.notifier is not None:
+                self.notifier.put_message(mesg)
+        return (status, ord_status), oco_status
+
+    async def __place_all__(self, orders, tag, use_gtt_oco):
+        legs = [self.__leg__(order, tag, use_gtt_oco) for order in orders]
+        return await asyncio.gather(*legs, return_exceptions=True)
+
+    def place_and_confirm_tez_order(self, orders, tag: str | None = None, use_gtt_oco=False):
+        """Blocking call from the gui thread, same result as Tiu.place_and_confirm_tez_order"""
+        leg_results = asyncio.run_coroutine_threadsafe(self.__place_all__(orders, tag, use_gtt_oco), self.loop).result()
+
+        resp_exception = 0
+        resp_ok = 0
+        result = []
+        for order, leg_result in zip(orders, leg_results):
+            if isinstance(leg_result, BaseException):
+                logger.error(f"Exception for item {order}: {leg_result!r}")
+                resp_exception = resp_exception + 1
+                continue
+            r_tuple, oco_status = leg_result
+            result.append(r_tuple)
+            status, ord_status = r_tuple
+            if status == Tiu_OrderStatus.SUCCESS:
+                resp_ok = resp_ok + 1
+                order.order_id = ord_status.order_id
+                logger.info(f'{ord_status}')
+            if oco_status == Tiu_OrderStatus.SUCCESS:
+                resp_ok = resp_ok + 1
+
+        return resp_exception, resp_ok, result
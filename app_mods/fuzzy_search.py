@@ -0,0 +1,181 @@
+"""
+File: fuzzy_search.py
+Author: [Tarakeshwar NC]
+Date: April 7, 2024
+Description:  This script provides an indexed fuzzy search over trading symbols.
+Symbols are grouped by a prefix trie on the first PREFIX_LEN characters and every
+prefix bucket keeps a trigram inverted index. A search only looks at the bucket of the
+query, ranks it by shared trigrams and verifies the best candidates with the
+SequenceMatcher ratio, so the "first 5 characters match and 95% similarity" rule of
+the earlier file scan still holds.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/7"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    from difflib import SequenceMatcher
+
+    import numpy as np
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+PREFIX_LEN = 5
+THRESHOLD = 0.95
+
+
+def is_similar(str1, str2, min_length=PREFIX_LEN, threshold=THRESHOLD):
+    """Beginning of the strings match and the similarity is above the threshold"""
+    return str1[:min_length] == str2[:min_length] and \
+        SequenceMatcher(None, str1, str2).ratio() >= threshold
+
+
+def trigrams(text):
+    return [text[i:i + 3] for i in range(len(text) - 2)]
+
+
+class _Bucket(object):
+    """Symbols sharing a prefix along with their trigram postings"""
+    def __init__(self):
+        self.ids = []
+        self.n_trigrams = []
+        self.postings = dict()
+
+    def add(self, sym_id, name):
+        pos = len(self.ids)
+        self.ids.append(sym_id)
+        # trigrams inside the common prefix are shared by the bucket, not useful for ranking
+        name_trigrams = set(trigrams(name[PREFIX_LEN - 2:]))
+        self.n_trigrams.append(len(name_trigrams))
+        for tg in name_trigrams:
+            self.postings.setdefault(tg, []).append(pos)
+
+    def freeze(self):
+        self.ids = np.asarray(self.ids, dtype=np.int64)
+        self.n_trigrams = np.asarray(self.n_trigrams, dtype=np.int32)
+        self.postings = {tg: np.asarray(p, dtype=np.int32) for tg, p in self.postings.items()}
+
+
+class FuzzySymbolSearch(object):
+    END = None  # trie key of the bucket stored at a node
+
+    def __init__(self, names: list):
+        """
+        Args:
+            names (list): trading symbols, position in the list is the returned id
+        """
+        self.names = list(names)
+        self.exact = dict()
+        self.trie = dict()
+        buckets = []
+        for sym_id, name in enumerate(self.names):
+            self.exact.setdefault(name, sym_id)
+            node = self.trie
+            for ch in name[:PREFIX_LEN]:
+                node = node.setdefault(ch, {})
+            bucket = node.get(FuzzySymbolSearch.END)
+            if bucket is None:
+                bucket = node[FuzzySymbolSearch.END] = _Bucket()
+                buckets.append(bucket)
+            bucket.add(sym_id, name)
+        for bucket in buckets:
+            bucket.freeze()
+        logger.debug(f'{len(self.names)} symbols, {len(buckets)} prefix buckets')
+
+    def __len__(self):
+        return len(self.names)
+
+    def __node__(self, prefix):
+        node = self.trie
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def starts_with(self, prefix: str):
+        """ids of all symbols starting with prefix"""
+        node = self.__node__(prefix[:PREFIX_LEN])
+        if node is None:
+            return []
+        ids = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for key, child in node.items():
+                if key is FuzzySymbolSearch.END:
+                    ids.extend(child.ids.tolist())
+                else:
+                    stack.append(child)
+        return sorted(i for i in ids if self.names[i].startswith(prefix))
+
+    def candidates(self, text: str, limit: int = 10):
+        """Symbols with the same PREFIX_LEN characters ranked by the shared trigrams.
+
+        Returns:
+            list: (id, score) tuples, best first. score is the trigram Dice coefficient.
+        """
+        node = self.__node__(text[:PREFIX_LEN])
+        bucket = node.get(FuzzySymbolSearch.END) if node is not None else None
+        if bucket is None:
+            return []
+
+        q_trigrams = set(trigrams(text[PREFIX_LEN - 2:]))
+        postings = [bucket.postings[tg] for tg in q_trigrams if tg in bucket.postings]
+        if postings:
+            counts = np.bincount(np.concatenate(postings), minlength=len(bucket.ids))
+        else:
+            counts = np.zeros(len(bucket.ids), dtype=np.int64)
+
+        # Dice coefficient of the trigram sets
+        total = bucket.n_trigrams + len(q_trigrams)
+        scores = np.divide(2.0 * counts, total, out=np.ones(len(counts)), where=total > 0)
+
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        # ties keep the listing order, as the file scan did
+        top = top[np.lexsort((bucket.ids[top], -scores[top]))]
+        return [(int(bucket.ids[pos]), float(scores[pos])) for pos in top]
+
+    def match(self, text: str, threshold: float = THRESHOLD, limit: int = 5):
+        """Best symbol passing is_similar, verified over the top ranked candidates.
+
+        Returns:
+            int: id, None if no symbol is similar enough
+        """
+        sym_id = self.exact.get(text)
+        if sym_id is not None:
+            return sym_id
+
+        best_id, best_ratio = None, threshold
+        sm = SequenceMatcher(None, '', text)  # text is the second sequence, analysed once
+        for sym_id, _ in self.candidates(text, limit):
+            sm.set_seq1(self.names[sym_id])
+            # cheap upper bounds first, ratio() only when the bound can pass
+            if sm.real_quick_ratio() < best_ratio or sm.quick_ratio() < best_ratio:
+                continue
+            ratio = sm.ratio()
+            if ratio > best_ratio or (ratio == best_ratio and best_id is None):
+                best_id, best_ratio = sym_id, ratio
+        return best_id
@@ -28,22 +28,18 @@ import app_utils as utils
 logger = utils.get_logger(__name__)
 
 try:
-    import io
     import json
     import os
     import threading
     import time
     import urllib
-    import zipfile
-    from datetime import datetime
-    from difflib import SequenceMatcher
     from sre_constants import FAILURE, SUCCESS
 
-    import requests
-    from NorenRestApiPy.NorenApi import NorenApi
-    import pandas as pd
-
     from .shared_classes import Market_Timing
+    from . import fuzzy_search, http_transport, scrip_master
+    from .payload_templates import PayloadTemplates, placeholder
+    from .option_chain import OptionChain
+    from .strike_grid import StrikeGridService
 
 except Exception as e:
     logger.debug(traceback.format_exc())
@@ -72,51 +68,32 @@ class FeedBaseObj(object):
         return
 
 
-class ShoonyaApiPy(NorenApi, FeedBaseObj):
+class ShoonyaApiPy(http_transport.PooledNorenApi, FeedBaseObj):
     __name = "FINVASIA_IF"
     DATAFEED_TIMEOUT: float = float(20.0)  # 5 secs time out
     __count = 0
+    API_HOST = 'https://api.shoonya.com/NorenWClientTP/'
+    WS_ENDPOINT = 'wss://api.shoonya.com/NorenWSTP/'
 
     def __init__(self, dl_file: bool = True, use_file: bool = True,
                  dl_filepath: str = None, market_hours: Market_Timing = None,
-                 ws_monitor_cfg: bool = True):
-        NorenApi.__init__(self, host='https://api.shoonya.com/NorenWClientTP/',
-                          websocket='wss://api.shoonya.com/NorenWSTP/')
+                 ws_monitor_cfg: bool = True, host: str = API_HOST, websocket: str = WS_ENDPOINT):
+        # host and websocket of another Noren server, tests/sim_broker.py for one
+        http_transport.PooledNorenApi.__init__(self, host=host, websocket=websocket)
         FeedBaseObj.__init__(self, ws_monitor_cfg=ws_monitor_cfg)
 
-        def download_unzip_symbols_file(url, folder, srcfile, dstfile):
-            ret = FAILURE
-
-            try:
-                # Download the zip file
-                response = urllib.request.urlopen(url, timeout=60)
-            except requests.exceptions.Timeout:
-                logger.debug('requests Timeout exception occured')
-            except Exception as e:
-                logger.debug(f'Exception occured: {str(e)}')
-            else:
-                data = response.read()
-
-                # Extract the zip file
-                with zipfile.ZipFile(io.BytesIO(data)) as zip_ref:
-                    logger.debug('extracting the zip file')
-                    zip_ref.extractall(folder)
-
-                if os.path.exists(srcfile):
-                    logger.debug(f'Renaming the file {srcfile} -> {dstfile}')
-                    os.rename(srcfile, dstfile)
-                    ret = SUCCESS
-
-            return ret
+        # pooled keep-alive connections shared by all the REST calls, NorenApi included
+        self.transport = http_transport.get_transport()
+        # GTT / OCO payloads serialized once per account, symbol and product
+        self.payload_templates = PayloadTemplates()
 
         logger.info('Creating Shoonya Object..')
 
-        self.scripmaster_url: str = "https://api.shoonya.com/NSE_symbols.txt.zip"
-        self.nfo_scripmaster_url: str = 'https://api.shoonya.com/NFO_symbols.txt.zip'
         self.scripmaster_folder: str = dl_filepath
         self.scripmaster_file: str = ""
+        self.nfo_scripmaster_file: str = ""
         self.use_file = use_file
-        self.shoonya_api_host = r'https://api.shoonya.com/NorenWClientTP/'
+        self.shoonya_api_host = host
         self.shoonya_userid = None
         self.shoonya_accountid = None
         self.shoonya_susertoken = None
@@ -126,59 +103,67 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
         else:
             self.mh = market_hours
 
-        hr = datetime.strptime(self.mh.mo, "%H:%M").hour
-        min = datetime.strptime(self.mh.mo, "%H:%M").minute
-        self.m_open = datetime.now().replace(hour=hr, minute=min, second=0, microsecond=0)
-
-        hr = datetime.strptime(self.mh.mc, "%H:%M").hour
-        min = datetime.strptime(self.mh.mc, "%H:%M").minute
-        self.m_close = datetime.now().replace(hour=hr, minute=min, second=0, microsecond=0)
+        # open and close of the day they are asked on, not of the day the session was created
+        self.calendar = utils.MarketCalendar(self.mh.mo, self.mh.mc)
         logger.debug(f'market open: {self.m_open} market close: {self.m_close}')
 
         self.streamingdata = None
+        self.option_chains = dict()
+        self.nfo_compact_df = None
+        self.strike_grids = None
 
+        self.scrip_prep = None
         if dl_file and dl_filepath:
-            url = self.scripmaster_url
-            filename = os.path.basename(url)  # Get the filename from the URL
-            filename = filename[:-4]  # Remove the .zip extension
-
-            dstfilename = self.scripmaster_file = os.path.join(self.scripmaster_folder, f'FV_{filename}')
-            srcfilename = os.path.join(self.scripmaster_folder, filename)
-
-            logger.debug(f'srcfilename: {srcfilename} dstfilename:{dstfilename}')
-
-            logger.info(f'scripmaster_file: {self.scripmaster_file}')
-            new_file = False
-            if os.path.exists(self.scripmaster_file):
-                timestamp = os.path.getmtime(self.scripmaster_file)
-                modification_datetime = datetime.fromtimestamp(timestamp)
-
-                # modification time should be more than 8:30 am
-                if modification_datetime >= datetime.now().replace(hour=8, minute=45, second=0, microsecond=0):
-                    new_file = True
-                if not new_file:
-                    logger.debug(f'Removing the file: {self.scripmaster_file}')
-                    os.remove(self.scripmaster_file)
-            if not new_file:
-                download_unzip_symbols_file(url=url, folder=self.scripmaster_folder, srcfile=srcfilename, dstfile=dstfilename)
-
-            nfo_url = self.nfo_scripmaster_url
-            nfo_filename = os.path.basename(nfo_url)  # Get the filename from the URL
-            nfo_filename = nfo_filename[:-4]  # Remove the .zip extension
-
-            nfo_dstfilename = self.nfo_scripmaster_file = os.path.join(self.scripmaster_folder, f'FV_{nfo_filename}')
-            nfo_srcfilename = os.path.join(self.scripmaster_folder, nfo_filename)
-            logger.debug(f'nfo_srcfilename: {nfo_srcfilename} nfo_dstfilename:{nfo_dstfilename}')
-
-            logger.info(f'nfo_scripmaster_file: {self.nfo_scripmaster_file}')
-            if os.path.exists(self.nfo_scripmaster_file):
-                os.remove(self.nfo_scripmaster_file)
-            download_unzip_symbols_file(url=nfo_url, folder=self.scripmaster_folder, srcfile=nfo_srcfilename, dstfile=nfo_dstfilename)
+            # Download and indexing continue in the background, login need not wait for it.
+            self.scrip_prep = scrip_master.start_scrip_master_prep(dl_filepath)
+            self.scripmaster_file = self.scrip_prep.scripmaster_file
+            self.nfo_scripmaster_file = self.scrip_prep.nfo_scripmaster_file
+
+    @property
+    def m_open(self):
+        return self.calendar.open_at()
+
+    @property
+    def m_close(self):
+        return self.calendar.close_at()
+
+    def wait_scrip_master(self, timeout: float = None):
+        if self.scrip_prep is None:
+            return False
+        return self.scrip_prep.wait(timeout)
+
+    @property
+    def sym_indices(self):
+        if self.scrip_prep is None:
+            return {}
+        self.scrip_prep.wait()
+        return self.scrip_prep.sym_indices
+
+    @property
+    def fuzzy_indices(self):
+        if self.scrip_prep is None:
+            return {}
+        self.scrip_prep.wait()
+        return self.scrip_prep.fuzzy_indices
+
+    def get_sym_index(self, exchange):
+        return self.sym_indices.get(exchange)
+
+    def get_option_chain_index(self, symbol, expiry):
+        key = (symbol, expiry.upper())
+        chain = self.option_chains.get(key)
+        if chain is None:
+            sym_index = self.sym_indices.get('NFO')
+            if sym_index is not None:
+                chain = OptionChain.from_index(sym_index, symbol, key[1])
+                if chain is not None:
+                    self.option_chains[key] = chain
+        return chain
 
     def login(self, userid, password, twoFA, vendor_code, api_secret, imei):
         self.shoonya_userid = userid
         self.shoonya_accountid = userid
-        r = NorenApi.login(self, userid, password, twoFA, vendor_code, api_secret, imei)
+        r = http_transport.PooledNorenApi.login(self, userid, password, twoFA, vendor_code, api_secret, imei)
         if r is not None and isinstance(r, dict):
             self.shoonya_susertoken = r['susertoken']
         return r
@@ -190,66 +175,63 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
         return super().set_session(userid, password, usertoken)
 
     def compact_search_file(self, symbol_expdate_pairs):
-        input_file_path = self.nfo_scripmaster_file
-        output_file_path = os.path.splitext(input_file_path)[0] + '.csv'
-
-        with open(input_file_path, 'r') as file:
-            header = file.readline().strip()
-
-        # Convert the first line to a list of columns
-        # Extra comma at the end creates extra column in the dataframe. This is
-        # elminated by the following way.
-        columns = [col for col in header.split(',') if col]
-        # Create an empty DataFrame to store the results
-        results = pd.DataFrame(columns=columns)
-        # Iterate over each symbol and expiry date combination
-        for symbol, expdate in symbol_expdate_pairs:
-            df = pd.read_csv(input_file_path, sep=',', usecols=columns)
-            df = df[(df['Symbol'] == symbol) & (df['Expiry'] == expdate)]
-            df = df.astype(object)
-            results = pd.concat([results, df], ignore_index=True)
-            # deleting the dataframe to conserve the memory
-            del df
-
-        results.to_csv(output_file_path, index=False)
-
-    def get_strike_diff(self):
-        input_file_path = self.nfo_scripmaster_file
-        input_file_path = os.path.splitext(input_file_path)[0] + '.csv'
-        data = pd.read_csv(input_file_path)
-
-        # Filter data for Option Type PE
-        pe_data = data[data['OptionType'] == 'PE']
-
-        # Extract Strike Prices for PE options
-        strike_prices = pe_data['StrikePrice'].tolist()
-
-        # Sort the Strike Prices
-        strike_prices.sort()
-
-        # Calculate differences between consecutive Strike Prices
-        differences = [strike_prices[i+1] - strike_prices[i] for i in range(len(strike_prices)-1)]
-
-        # Find the minimum difference
-        min_difference = min(differences)
-        return min_difference
-
-    def searchscrip(self, exchange, searchtext):
-        # check if the symbol is available in the local txt file.
-        # if not available then call the Parent search scrip
+        self.wait_scrip_master()
+        if self.scrip_prep is not None and set(symbol_expdate_pairs) <= set(self.scrip_prep.symbol_expdate_pairs):
+            logger.debug('compacted frame is prepared in the background')
+            self.nfo_compact_df = self.scrip_prep.nfo_df
+            return
+        self.nfo_compact_df = scrip_master.compact_search_file(self.nfo_scripmaster_file, symbol_expdate_pairs)
 
-        def string_similarity(str1, str2):
-            similarity = SequenceMatcher(None, str1, str2).ratio()
-            return similarity
+    def get_strike_grid(self, symbol, expiry):
+        if self.strike_grids is None:
+            sym_index = self.sym_indices.get('NFO')
+            if sym_index is None:
+                return None
+            self.strike_grids = StrikeGridService(sym_index)
+        return self.strike_grids.get(symbol, expiry)
+
+    def get_strike_diff(self, symbol=None, expiry=None, price=None):
+        """Strike interval of the (symbol, expiry) pair. Without a pair, the smallest
+        interval of the compacted pairs."""
+        if symbol is not None and expiry is not None:
+            pairs = [(symbol, expiry)]
+        elif self.scrip_prep is not None:
+            pairs = self.scrip_prep.symbol_expdate_pairs
+        else:
+            pairs = []
+
+        intervals = []
+        for sym, exp in pairs:
+            grid = self.get_strike_grid(sym, exp)
+            if grid is not None:
+                intervals.append(grid.interval if price is None else grid.step_at(price))
+        intervals = [interval for interval in intervals if interval]
+        if not intervals:
+            logger.error(f'Strike interval is not available: {pairs}')
+            return None
+        return min(intervals)
 
-        def check_beginning_match(str1, str2, min_length=5):
-            return str1[:min_length] == str2[:min_length]
+    def __searchscrip_api__(self, exchange, searchtext, reply_on_miss: bool = False):
+        """SearchScrip of the broker. On a miss, the reply of the broker is returned if reply_on_miss,
+        so that an unknown symbol ('no data') can be told from a failed call"""
+        logger.debug(f"Searching scrip through api {exchange} {searchtext}")
+        if not reply_on_miss:
+            return super(ShoonyaApiPy, self).searchscrip(exchange=exchange, searchtext=searchtext)
 
-        def check_similarity_and_beginning_match(str1, str2, min_length=5, threshold=0.95):
-            is_beginning_match = check_beginning_match(str1, str2, min_length)
-            similarity_percentage = string_similarity(str1, str2) * 100
+        url = f'{self.shoonya_api_host}/SearchScrip'
+        values = {'uid': self.shoonya_userid, 'exch': exchange, 'stext': urllib.parse.quote_plus(searchtext)}
+        payload = 'jData=' + json.dumps(values) + f'&jKey={self.shoonya_susertoken}'
+        res = self.transport.post(url, data=payload)
+        try:
+            return json.loads(res.text)
+        except ValueError:
+            logger.debug(f'SearchScrip reply: {res.status_code} {res.text[:100]}')
+            return None
 
-            return is_beginning_match and (similarity_percentage >= threshold * 100)
+    def searchscrip(self, exchange, searchtext, reply_on_miss: bool = False):
+        # check if the symbol is available in the local txt file.
+        # if not available then call the Parent search scrip
+        # reply_on_miss: the Not_Ok reply of the broker is returned instead of None
 
         def read_symbol_info(filename, exchange, search_txt):
             # Open the symbol file for reading
@@ -290,7 +272,7 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
                         break
 
                 elif exchange == 'NFO':
-                    if check_similarity_and_beginning_match(tsym, search_txt):
+                    if fuzzy_search.is_similar(tsym, search_txt):
                         logger.debug(f'{line_values}')
                         sym_dict = {'exch': exchange, 'token': int(token.strip()), 'tsym': tsym.strip()}
                         values.append(sym_dict)
@@ -304,17 +286,28 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
 
         use_file = self.use_file
 
+        sym_index = self.sym_indices.get(exchange)
+        if sym_index is not None:
+            rec = sym_index.by_name(searchtext) if exchange == 'NSE' else sym_index.by_tsym(searchtext)
+            if rec is None and exchange == 'NFO':
+                fuzzy = self.fuzzy_indices.get(exchange)
+                if fuzzy is not None:
+                    rec = sym_index.at(fuzzy.match(searchtext))
+                    if rec is None:
+                        # indexed search already covers the file, no scan
+                        return self.__searchscrip_api__(exchange, searchtext, reply_on_miss)
+            if rec is not None:
+                return {'stat': 'Ok', 'values': [{'exch': exchange, 'token': rec.token, 'tsym': rec.tsym}]}
+
         found = False
         if exchange == 'NSE':
             scripmaster_file = self.scripmaster_file
 
         elif exchange == 'NFO':
             scripmaster_file = self.nfo_scripmaster_file
-            csv_file_path = os.path.splitext(scripmaster_file)[0] + '.csv'
-            logger.info(f'Reading from {csv_file_path} ')
-            if os.path.exists(csv_file_path):
-                logger.debug(f'{csv_file_path} exists')
-                df = pd.read_csv(csv_file_path)
+            df = self.nfo_compact_df
+            if df is not None:
+                logger.debug('Searching in the compacted frame')
                 # Extract row where 'searchtext' is present in the 'tsym' column
                 matching_rows = df.loc[df['TradingSymbol'] == searchtext]
                 # Check if any rows were found
@@ -348,15 +341,13 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
                 logger.debug(f"Searching scrip in the {scripmaster_file} {exchange} {searchtext}")
                 sym_info = read_symbol_info(scripmaster_file, exchange=exchange, search_txt=searchtext)
                 if sym_info is None:
-                    logger.debug(f"Searching scrip through api {exchange} {searchtext}")
-                    sym_info = super(ShoonyaApiPy, self).searchscrip(exchange=exchange, searchtext=searchtext)
+                    sym_info = self.__searchscrip_api__(exchange, searchtext, reply_on_miss)
                     logger.debug(f"{searchtext} {sym_info}")
                     return sym_info
                 else:
                     return sym_info
             else:
-                logger.debug(f"Searching scrip through api {exchange} {searchtext}")
-                return super(ShoonyaApiPy, self).searchscrip(exchange=exchange, searchtext=searchtext)
+                return self.__searchscrip_api__(exchange, searchtext, reply_on_miss)
         else:
             return resDict
 
@@ -368,7 +359,7 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
 
         payload = 'jData=' + json.dumps(values) + f'&jKey={self.shoonya_susertoken}'
 
-        res = requests.post(url, data=payload)
+        res = self.transport.post(url, data=payload)
 
         resDict = json.loads(res.text)
         if resDict['stat'] == 'Not_Ok':
@@ -411,7 +402,7 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
 
         payload = 'jData=' + json.dumps(values) + f'&jKey={self.shoonya_susertoken}'
 
-        res = requests.post(url, data=payload)
+        res = self.transport.post(url, data=payload)
 
         resDict = json.loads(res.text)
         if resDict['stat'] == 'Not_Ok':
@@ -459,7 +450,7 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
 
         print(payload)
 
-        res = requests.post(url, data=payload)
+        res = self.transport.post(url, data=payload)
 
         resDict = json.loads(res.text)
         if resDict['stat'] == 'Not_Ok':
@@ -512,8 +503,49 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
         }
         """
 
+        url, payload = self.gtt_oco_order_request(buy_or_sell, exchange, tradingsymbol, quantity, product_type,
+                                                  book_loss_alert_price, book_loss_price, book_loss_price_type,
+                                                  book_profit_alert_price, book_profit_price, book_profit_price_type,
+                                                  remarks)
+
+        logger.debug(payload)
+        res = self.transport.post(url, data=payload)
+
+        resDict = json.loads(res.text)
+        if resDict['stat'] == 'Not_Ok':
+            logger.debug(resDict['emsg'])
+            return None
+
+        return resDict
+
+    def gtt_oco_order_request(self, buy_or_sell,
+                              exchange, tradingsymbol, quantity, product_type: str,
+                              book_loss_alert_price: float, book_loss_price: float,
+                              book_loss_price_type: str,
+                              book_profit_alert_price: float, book_profit_price: float,
+                              book_profit_price_type: str,
+                              remarks=None):
+        """url and payload of place_gtt_oco_order, for callers with their own transport"""
         url = f'{self.shoonya_api_host}/PlaceOCOOrder'
 
+        key = ('PlaceOCOOrder', self.shoonya_userid, self.shoonya_accountid, exchange, tradingsymbol, product_type,
+               buy_or_sell, book_loss_price_type, book_profit_price_type)
+        template = self.payload_templates.get(key, lambda: self.__gtt_oco_values__(
+            buy_or_sell, exchange, tradingsymbol, placeholder('qty'), product_type,
+            placeholder('y'), placeholder('bl_prc'), book_loss_price_type,
+            placeholder('x'), placeholder('bp_prc'), book_profit_price_type, placeholder('remarks')))
+        payload = template.fill(self.shoonya_susertoken, qty=quantity,
+                                x=book_profit_alert_price, y=book_loss_alert_price,
+                                bp_prc=book_profit_price, bl_prc=book_loss_price,
+                                remarks=remarks if remarks is not None else "")
+        return url, payload
+
+    def __gtt_oco_values__(self, buy_or_sell,
+                           exchange, tradingsymbol, quantity, product_type: str,
+                           book_loss_alert_price, book_loss_price, book_loss_price_type: str,
+                           book_profit_alert_price, book_profit_price, book_profit_price_type: str,
+                           remarks=None):
+        """jData of PlaceOCOOrder"""
         # prepare the data
         values = {'ordersource': 'API'}
         values["uid"] = self.shoonya_userid
@@ -556,17 +588,58 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
                                              "qty": str(quantity),
                                              "prc": str(book_loss_price)
                                              }
-        payload = 'jData=' + json.dumps(values) + f'&jKey={self.shoonya_susertoken}'
+        return values
 
-        logger.debug(payload)
-        res = requests.post(url, data=payload)
+    def place_order_request(self, buy_or_sell, product_type,
+                            exchange, tradingsymbol, quantity, discloseqty,
+                            price_type, price=0.0, trigger_price=None,
+                            retention='DAY', amo='NO', remarks=None, bookloss_price=0.0, bookprofit_price=0.0,
+                            trail_price=0.0):
+        """url and payload of NorenApi.place_order, for callers with their own transport"""
+        url = f'{self.shoonya_api_host}/PlaceOrder'
 
-        resDict = json.loads(res.text)
-        if resDict['stat'] == 'Not_Ok':
-            logger.debug(resDict['emsg'])
-            return None
+        values = {'ordersource': 'API'}
+        values["uid"] = self.shoonya_userid
+        values["actid"] = self.shoonya_accountid
+        values["trantype"] = buy_or_sell
+        values["prd"] = product_type
+        values["exch"] = exchange
+        values["tsym"] = urllib.parse.quote_plus(tradingsymbol)
+        values["qty"] = str(quantity)
+        values["dscqty"] = str(discloseqty)
+        values["prctyp"] = price_type
+        values["prc"] = str(price)
+        values["trgprc"] = str(trigger_price)
+        values["ret"] = retention
+        values["remarks"] = remarks
+        values["amo"] = amo
 
-        return resDict
+        # cover order or high leverage order, bracket order
+        if product_type == 'H' or product_type == 'B':
+            values["blprc"] = str(bookloss_price)
+            if product_type == 'B':
+                values["bpprc"] = str(bookprofit_price)
+            if trail_price != 0.0:
+                values["trailprc"] = str(trail_price)
+
+        payload = 'jData=' + json.dumps(values) + f'&jKey={self.shoonya_susertoken}'
+        return url, payload
+
+    def single_order_history_request(self, orderno):
+        url = f'{self.shoonya_api_host}/SingleOrdHist'
+        values = {'ordersource': 'API'}
+        values["uid"] = self.shoonya_userid
+        values["norenordno"] = orderno
+        payload = 'jData=' + json.dumps(values) + f'&jKey={self.shoonya_susertoken}'
+        return url, payload
+
+    def cancel_order_request(self, orderno):
+        url = f'{self.shoonya_api_host}/CancelOrder'
+        values = {'ordersource': 'API'}
+        values["uid"] = self.shoonya_userid
+        values["norenordno"] = str(orderno)
+        payload = 'jData=' + json.dumps(values) + f'&jKey={self.shoonya_susertoken}'
+        return url, payload
 
     def modify_gtt_oco_order(self, buy_or_sell,
                              exchange, tradingsymbol, quantity, product_type: str,
@@ -589,8 +662,50 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
         al_id:str = previous gtt order alert id
         remarks = order tag
         """
+        url, payload = self.modify_gtt_oco_order_request(buy_or_sell, exchange, tradingsymbol, quantity, product_type,
+                                                         book_loss_alert_price, book_loss_price, book_loss_price_type,
+                                                         book_profit_alert_price, book_profit_price,
+                                                         book_profit_price_type, al_id, remarks)
+
+        logger.debug(payload)
+
+        res = self.transport.post(url, data=payload)
+
+        resDict = json.loads(res.text)
+        if resDict['stat'] == 'Not_Ok':
+            logger.debug(resDict['emsg'])
+            return None
+
+        return resDict
+
+    def modify_gtt_oco_order_request(self, buy_or_sell,
+                                     exchange, tradingsymbol, quantity, product_type: str,
+                                     book_loss_alert_price: float, book_loss_price: float, book_loss_price_type: str,
+                                     book_profit_alert_price: float, book_profit_price: float,
+                                     book_profit_price_type: str,
+                                     al_id: str, remarks: str = None):
+        """url and payload of modify_gtt_oco_order"""
         url = f'{self.shoonya_api_host}/ModifyOCOOrder'
 
+        key = ('ModifyOCOOrder', self.shoonya_userid, self.shoonya_accountid, exchange, tradingsymbol, product_type,
+               buy_or_sell, book_loss_price_type, book_profit_price_type)
+        template = self.payload_templates.get(key, lambda: self.__modify_gtt_oco_values__(
+            buy_or_sell, exchange, tradingsymbol, placeholder('qty'), product_type,
+            placeholder('y'), placeholder('bl_prc'), book_loss_price_type,
+            placeholder('x'), placeholder('bp_prc'), book_profit_price_type,
+            placeholder('al_id'), placeholder('remarks')))
+        payload = template.fill(self.shoonya_susertoken, qty=quantity,
+                                x=book_profit_alert_price, y=book_loss_alert_price,
+                                bp_prc=book_profit_price, bl_prc=book_loss_price,
+                                al_id=al_id, remarks=remarks if remarks is not None else "")
+        return url, payload
+
+    def __modify_gtt_oco_values__(self, buy_or_sell,
+                                  exchange, tradingsymbol, quantity, product_type: str,
+                                  book_loss_alert_price, book_loss_price, book_loss_price_type: str,
+                                  book_profit_alert_price, book_profit_price, book_profit_price_type: str,
+                                  al_id: str, remarks: str = None):
+        """jData of ModifyOCOOrder"""
         # prepare the data
         values = {'ordersource': 'API'}
         values["uid"] = self.shoonya_userid
@@ -637,18 +752,7 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
                                              "prc": str(book_loss_price),
                                              #   "al_id": al_id
                                              }
-        payload = 'jData=' + json.dumps(values) + f'&jKey={self.shoonya_susertoken}'
-
-        logger.debug(payload)
-
-        res = requests.post(url, data=payload)
-
-        resDict = json.loads(res.text)
-        if resDict['stat'] == 'Not_Ok':
-            logger.debug(resDict['emsg'])
-            return None
-
-        return resDict
+        return values
 
     def cancel_gtt_order(self, al_id: str):
         url = f'{self.shoonya_api_host}/CancelGTTOrder'
@@ -662,7 +766,7 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
 
         logger.debug(payload)
 
-        res = requests.post(url, data=payload)
+        res = self.transport.post(url, data=payload)
 
         resDict = json.loads(res.text)
         if resDict['stat'] == 'Not_Ok':
@@ -684,7 +788,7 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
 
         logger.debug(payload)
 
-        res = requests.post(url, data=payload)
+        res = self.transport.post(url, data=payload)
 
         resDict = json.loads(res.text)
         if isinstance(resDict, dict) and resDict['stat'] == 'Not_Ok':
@@ -702,7 +806,7 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
         payload = 'jData=' + json.dumps(values) + f'&jKey={self.shoonya_susertoken}'
 
         logger.debug(f'self.shoonya_userid = {self.shoonya_userid} payload :{payload}')
-        res = requests.post(url, data=payload)
+        res = self.transport.post(url, data=payload)
 
         resDict = json.loads(res.text)
         if isinstance(resDict, dict) and resDict['stat'] == 'Not_Ok':
@@ -715,6 +819,15 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
         self.streamingdata = streamingdata.copy()
         logger.debug(f"{self.streamingdata}")
 
+    def add_streamingdata(self, ws_tokens: list):
+        """tokens subscribed after the connect, they are subscribed again on a reconnect"""
+        current = self.streamingdata or []
+        # a new list, the monitor thread may be iterating the old one
+        self.streamingdata = current + [ws_token for ws_token in ws_tokens if ws_token not in current]
+
+    def remove_streamingdata(self, ws_tokens: list):
+        self.streamingdata = [ws_token for ws_token in (self.streamingdata or []) if ws_token not in ws_tokens]
+
     def connect_to_datafeed_server(self, on_message=None,
                                    on_order_update=None,
                                    on_open=None,
@@ -730,6 +843,19 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
             if self.app_cb_on_open is not None:
                 self.app_cb_on_open()
 
+        def close_callback():
+            nonlocal self
+            # also on a drop, the websocket thread of NorenApi connects again and opens it
+            self.ws_connected = False
+            if self.app_cb_on_disconnect is not None:
+                self.app_cb_on_disconnect()
+
+        def error_callback(error):
+            nonlocal self
+            logger.debug(f'Websocket error: {error}')
+            if self.app_cb_on_error is not None:
+                self.app_cb_on_error(error)
+
         def subscribe_callback(mesg):
             nonlocal self
             self.ws_v2_data_flow_evt.set()
@@ -756,7 +882,9 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
                     logger.debug(f'Creating Websocket {re_connect_count}')
                 self.start_websocket(order_update_callback=order_update_callback,
                                      subscribe_callback=subscribe_callback,
-                                     socket_open_callback=open_callback)
+                                     socket_open_callback=open_callback,
+                                     socket_close_callback=close_callback,
+                                     socket_error_callback=error_callback)
                 re_connect = False
                 re_connect_count += 1
 
@@ -776,7 +904,7 @@ class ShoonyaApiPy(NorenApi, FeedBaseObj):
                             exit = True
                             break
                         else:
-                            if self.m_open <= datetime.now() < self.m_close:
+                            if self.calendar.is_open():
                                 logger.debug("Market hours:: Needs to be Reconnected ..")
                                 re_connect = True
                                 break
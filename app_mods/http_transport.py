@@ -0,0 +1,191 @@
+"""
+File: http_transport.py
+Author: [Tarakeshwar NC]
+Date: April 14, 2024
+Description:  This script provides the shared HTTP transport of the Shoonya REST calls.
+All the calls go over one requests session with a keep-alive connection pool that is
+large enough for the legs placed in parallel, so a click does not pay a TCP + TLS
+handshake per leg. Each endpoint gets its own timeout and the calls are paced by the
+rate limiter, when it is enabled. The NorenApi calls, which use the requests module directly, go to
+the same session through PooledNorenApi, the NorenApi module itself is not patched.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/14"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    import threading
+    import time
+    import types
+
+    import requests
+    from requests.adapters import HTTPAdapter
+    import NorenRestApiPy.NorenApi as noren_api_module
+
+    from .rate_limiter import RateLimiter, is_throttled
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+CONNECT_TIMEOUT = 3.05  # secs
+
+# (connect, read) timeouts in secs, keyed by the last part of the url
+ENDPOINT_TIMEOUTS = {
+    'PlaceOrder': (CONNECT_TIMEOUT, 5.0),
+    'ModifyOrder': (CONNECT_TIMEOUT, 5.0),
+    'CancelOrder': (CONNECT_TIMEOUT, 5.0),
+    'ExitSNOOrder': (CONNECT_TIMEOUT, 5.0),
+    'PlaceGTTOrder': (CONNECT_TIMEOUT, 5.0),
+    'PlaceOCOOrder': (CONNECT_TIMEOUT, 5.0),
+    'ModifyOCOOrder': (CONNECT_TIMEOUT, 5.0),
+    'CancelGTTOrder': (CONNECT_TIMEOUT, 5.0),
+    'SingleOrdHist': (CONNECT_TIMEOUT, 3.0),
+    'GetQuotes': (CONNECT_TIMEOUT, 3.0),
+    'GetSecurityInfo': (CONNECT_TIMEOUT, 3.0),
+    'SearchScrip': (CONNECT_TIMEOUT, 3.0),
+    'Limits': (CONNECT_TIMEOUT, 5.0),
+    'QuickAuth': (CONNECT_TIMEOUT, 15.0),
+    'TPSeries': (CONNECT_TIMEOUT, 20.0),
+    'EODChartData': (CONNECT_TIMEOUT, 20.0),
+}
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, 10.0)
+
+
+def timeout_for(url: str, timeouts: dict = ENDPOINT_TIMEOUTS):
+    """(connect, read) timeout of the endpoint of the url"""
+    return timeouts.get(url.rstrip('/').rsplit('/', 1)[-1], DEFAULT_TIMEOUT)
+
+
+class HttpTransport(object):
+    POOL_SIZE = 16  # legs are placed by up to 10 threads at a time
+
+    def __init__(self, pool_size: int = POOL_SIZE, timeouts: dict = None, limiter: RateLimiter = None):
+        self.timeouts = dict(ENDPOINT_TIMEOUTS) if timeouts is None else timeouts
+        self.limiter = limiter
+        self.session = requests.Session()
+        # no retries, an order request must not be sent twice
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.n_requests = 0
+
+    def timeout_for(self, url: str):
+        return timeout_for(url, self.timeouts)
+
+    def __send__(self, send, url, timeout, **kwargs):
+        self.n_requests += 1
+        if timeout is None:
+            timeout = self.timeout_for(url)
+        if self.limiter is None:
+            return send(url, timeout=timeout, **kwargs)
+
+        permit = self.limiter.acquire(url)
+        start = time.monotonic()
+        try:
+            res = send(url, timeout=timeout, **kwargs)
+        except requests.exceptions.RequestException:
+            # timeouts and dropped connections are taken as the broker being overloaded
+            self.limiter.release(permit, throttled=True)
+            raise
+        except Exception:
+            self.limiter.release(permit)
+            raise
+        self.limiter.release(permit, latency=time.monotonic() - start,
+                             throttled=is_throttled(res.status_code, res.text))
+        return res
+
+    def post(self, url, data=None, timeout=None, **kwargs):
+        return self.__send__(self.session.post, url, timeout, data=data, **kwargs)
+
+    def get(self, url, timeout=None, **kwargs):
+        return self.__send__(self.session.get, url, timeout, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class RequestsShim(object):
+    """Stands for the requests module inside NorenApi, the posts go to the transport"""
+    def __init__(self, transport: HttpTransport = None):
+        """
+        Args:
+            transport (HttpTransport): shared transport if None
+        """
+        self._transport = transport
+
+    @property
+    def transport(self):
+        return self._transport if self._transport is not None else get_transport()
+
+    def post(self, url, data=None, **kwargs):
+        return self.transport.post(url, data=data, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.transport.get(url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+
+_transport = None
+_lock = threading.Lock()
+
+
+def get_transport():
+    """Shared transport, the calls are not paced until the rate limiter is enabled"""
+    global _transport
+    with _lock:
+        if _transport is None:
+            _transport = HttpTransport()
+        return _transport
+
+
+def enable_rate_limiter(limiter: RateLimiter = None):
+    """Paces the calls of the shared transport, opt in through sys_cfg.yml"""
+    transport = get_transport()
+    transport.limiter = RateLimiter() if limiter is None else limiter
+    return transport.limiter
+
+
+def pooled_api(api_cls: type, shim: RequestsShim = None):
+    """Subclass of the api class, its methods post over the transport of the shim.
+
+    The methods of NorenApi call the requests module of their module directly, the ones that
+    do are copied into the subclass with requests bound to the shim. The base class and its
+    module are left as they are, other users of NorenApi still go to requests.
+    """
+    shim = RequestsShim() if shim is None else shim
+    methods = {'__module__': __name__}
+    for name, fn in vars(api_cls).items():
+        if isinstance(fn, types.FunctionType) and 'requests' in fn.__code__.co_names:
+            method = types.FunctionType(fn.__code__, dict(fn.__globals__, requests=shim), fn.__name__,
+                                        fn.__defaults__, fn.__closure__)
+            method.__kwdefaults__ = fn.__kwdefaults__
+            method.__qualname__ = fn.__qualname__
+            method.__doc__ = fn.__doc__
+            methods[name] = method
+    return type(f'Pooled{api_cls.__name__}', (api_cls,), methods)
+
+
+# NorenApi with the REST calls on the shared transport
+PooledNorenApi = pooled_api(noren_api_module.NorenApi)
@@ -0,0 +1,131 @@
+"""
+File: margin_state.py
+Author: [Tarakeshwar NC]
+Date: April 12, 2024
+Description:  This script keeps the account margin current during the session.
+The margin is reconciled with the broker limits (get_limits) periodically in the
+background and moved in between by the fills seen on the order update stream.
+Readers get the last snapshot without locking or REST calls.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/12"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    import locale
+    import threading
+    import time
+    from typing import NamedTuple
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+
+class MarginSnapshot(NamedTuple):
+    cash: float         # cash + payin + uncleared cash
+    used: float         # margin used, broker value moved by the fills seen since
+    reconciled_at: float  # time.time() of the last get_limits
+
+    @property
+    def available(self):
+        return self.cash - self.used
+
+
+class MarginState(object):
+    REFRESH_INTERVAL = 30.0  # secs
+
+    def __init__(self, actid: str = None):
+        """
+        Args:
+            actid (str): account of the margin, order updates of other accounts are ignored
+        """
+        self.actid = actid
+        self.snapshot = MarginSnapshot(0.0, 0.0, 0.0)
+        self.positions = dict()  # token -> (net qty, amount blocked)
+        self.filled = dict()     # norenordno -> qty already applied
+        self.lock = threading.Lock()
+        self.n_fills = 0
+
+    @property
+    def avlble_margin(self):
+        # the snapshot is replaced as a whole, a plain read is consistent
+        return self.snapshot.available
+
+    @staticmethod
+    def parse_limits(acct_limits: dict):
+        cash = locale.atof(acct_limits["cash"]) + locale.atof(acct_limits["payin"]) + locale.atof(acct_limits["unclearedcash"])
+        try:
+            used = locale.atof(acct_limits['marginused'])
+        except Exception:
+            used = float(0.0)
+        return cash, used
+
+    def reconcile(self, acct_limits: dict):
+        """Takes the broker limits as the new base, fills already applied are part of it"""
+        cash, used = MarginState.parse_limits(acct_limits)
+        with self.lock:
+            drift = used - self.snapshot.used
+            self.snapshot = MarginSnapshot(cash, used, time.time())
+        logger.debug(f'Margin reconciled cash: {cash:.2f} used: {used:.2f} drift: {drift:.2f}')
+        return self.snapshot
+
+    def on_order_update(self, msg: dict):
+        """Order update of the websocket, only the new fill qty of an order is applied"""
+        if self.actid is not None and msg.get('actid', self.actid) != self.actid:
+            return
+        try:
+            norenordno = msg['norenordno']
+            fillshares = int(msg.get('fillshares', 0))
+            if not fillshares:
+                return
+            price = float(msg.get('avgprc') or msg.get('flprc') or msg.get('prc'))
+            sign = 1 if msg['trantype'] == 'B' else -1
+            token = str(msg['token'])
+        except (KeyError, TypeError, ValueError):
+            return
+
+        with self.lock:
+            new_qty = fillshares - self.filled.get(norenordno, 0)
+            if new_qty <= 0:
+                return
+            self.filled[norenordno] = fillshares
+            delta = self.__apply_fill__(token, sign * new_qty, price)
+            snap = self.snapshot
+            self.snapshot = MarginSnapshot(snap.cash, snap.used + delta, snap.reconciled_at)
+            self.n_fills += 1
+        logger.debug(f'fill {norenordno} {token} qty: {sign * new_qty} @ {price} margin used: {delta:+.2f}')
+
+    def __apply_fill__(self, token, qty, price):
+        """Updates the position of the token, returns the change of the blocked amount"""
+        net_qty, blocked = self.positions.get(token, (0, 0.0))
+        old_blocked = blocked
+        if net_qty == 0 or (net_qty > 0) == (qty > 0):
+            blocked += abs(qty) * price
+        else:
+            # closing releases the entry amount in proportion, the rest opens the other side
+            closed = min(abs(qty), abs(net_qty))
+            blocked -= blocked * closed / abs(net_qty)
+            blocked += (abs(qty) - closed) * price
+        net_qty += qty
+        self.positions[token] = (net_qty, blocked if net_qty else 0.0)
+        return self.positions[token][1] - old_blocked
@@ -0,0 +1,151 @@
+"""
+File: option_chain.py
+Author: [Tarakeshwar NC]
+Date: April 3, 2024
+Description:  This script provides an in-memory option chain per (underlying, expiry).
+Strikes are kept sorted in numpy arrays along with CE/PE token, trading symbol, lot size
+and tick size, so that ATM and offset strikes are resolved against listed strikes only.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/3"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    from typing import NamedTuple
+
+    import numpy as np
+
+    from .symbol_index import SymbolIndex
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+
+class OptionLeg(NamedTuple):
+    strike: float
+    optt: str
+    token: str
+    tsym: str
+    ls: int
+    ti: float
+
+
+class OptionChain(object):
+    def __init__(self, symbol: str, expiry: str, strikes: np.ndarray,
+                 ce_token: np.ndarray, pe_token: np.ndarray,
+                 ce_tsym: np.ndarray, pe_tsym: np.ndarray,
+                 ls: np.ndarray, ti: np.ndarray):
+        self.symbol = symbol
+        self.expiry = expiry
+        self.strikes = strikes
+        self.ce_token = ce_token
+        self.pe_token = pe_token
+        self.ce_tsym = ce_tsym
+        self.pe_tsym = pe_tsym
+        self.ls = ls
+        self.ti = ti
+
+    def __len__(self):
+        return len(self.strikes)
+
+    def __str__(self):
+        if not len(self.strikes):
+            return f'{self.symbol} {self.expiry}: empty'
+        return f'{self.symbol} {self.expiry}: {len(self.strikes)} strikes {self.strikes[0]:.0f} - {self.strikes[-1]:.0f}'
+
+    @classmethod
+    def from_index(cls, sym_index: SymbolIndex, symbol: str, expiry: str):
+        """Creates the chain from the NFO symbol index.
+
+        Returns:
+            OptionChain: chain, None if no options are listed for the pair
+        """
+        records = sym_index.records
+        mask = (records['symbol'] == symbol.encode()) & (records['expiry'] == expiry.encode())
+        opt = records[mask]
+        ce = opt[opt['optt'] == b'CE']
+        pe = opt[opt['optt'] == b'PE']
+        if not len(ce) and not len(pe):
+            logger.debug(f'No options for {symbol} {expiry}')
+            return None
+
+        strikes = np.union1d(ce['strike'], pe['strike'])
+        n = len(strikes)
+
+        def side(leg):
+            token = np.full(n, -1, dtype=np.int64)
+            tsym = np.full(n, '', dtype='U40')
+            pos = np.searchsorted(strikes, leg['strike'])
+            token[pos] = leg['token']
+            tsym[pos] = leg['tsym'].astype('U40')
+            return token, tsym
+
+        ce_token, ce_tsym = side(ce)
+        pe_token, pe_tsym = side(pe)
+
+        ls = np.ones(n, dtype=np.int32)
+        ti = np.full(n, 0.05)
+        for leg in (pe, ce):
+            pos = np.searchsorted(strikes, leg['strike'])
+            ls[pos] = leg['ls']
+            ti[pos] = leg['ti']
+
+        chain = cls(symbol, expiry, strikes, ce_token, pe_token, ce_tsym, pe_tsym, ls, ti)
+        logger.debug(str(chain))
+        return chain
+
+    def atm_index(self, ltp: float):
+        """Index of the listed strike nearest to ltp. On a tie the higher strike is used."""
+        n = len(self.strikes)
+        i = int(np.searchsorted(self.strikes, ltp))
+        if i <= 0:
+            return 0
+        if i >= n:
+            return n - 1
+        lower = self.strikes[i - 1]
+        upper = self.strikes[i]
+        return i - 1 if abs(ltp - lower) < abs(ltp - upper) else i
+
+    def leg_at(self, i: int, optt: str):
+        """optt: 'C'/'CE' or 'P'/'PE'"""
+        if i < 0 or i >= len(self.strikes):
+            return None
+        if optt[0] == 'C':
+            token, tsym, optt = self.ce_token[i], self.ce_tsym[i], 'CE'
+        else:
+            token, tsym, optt = self.pe_token[i], self.pe_tsym[i], 'PE'
+        if token < 0:
+            return None
+        return OptionLeg(strike=float(self.strikes[i]), optt=optt, token=str(token), tsym=str(tsym),
+                         ls=int(self.ls[i]), ti=float(self.ti[i]))
+
+    def resolve(self, ltp: float, optt: str, offset: int = 0):
+        """Resolves the ATM strike for ltp moved by offset listed strikes.
+        offset: 0 means ATM, +ve moves to higher strikes and -ve to lower strikes.
+
+        Returns:
+            OptionLeg: leg, None if the strike is not listed
+        """
+        if not len(self.strikes):
+            return None
+        return self.leg_at(self.atm_index(ltp) + int(offset or 0), optt)
@@ -0,0 +1,93 @@
+"""
+File: order_events.py
+Author: [Tarakeshwar NC]
+Date: April 13, 2024
+Description:  This script routes the order updates pushed on the websocket to the
+threads confirming the orders. A thread placing an order waits on its norenordno and
+is woken up as soon as the broker pushes a final state (complete, rejected, canceled).
+Updates that arrive before the wait starts are kept, so none are missed.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/13"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    import threading
+    from collections import OrderedDict
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+
+class OrderEventRouter(object):
+    FINAL_STATES = ('complete', 'rejected', 'canceled')
+    MAX_ORDERS = 1024
+
+    def __init__(self, ws_wrap=None):
+        """
+        Args:
+            ws_wrap (WS_WrapU): feed with the order updates, the router registers itself on it
+        """
+        self.ws_wrap = ws_wrap
+        self.orders = OrderedDict()  # norenordno -> latest order update
+        self.cond = threading.Condition()
+        self.n_events = 0
+        if ws_wrap is not None:
+            ws_wrap.add_order_update_listener(self.on_order_update)
+
+    @property
+    def live(self):
+        """updates can be expected only while the websocket is open"""
+        return self.ws_wrap is None or bool(getattr(self.ws_wrap, 'fv_socket_opened', False))
+
+    @staticmethod
+    def is_final(msg):
+        return msg is not None and msg.get('status', '').lower() in OrderEventRouter.FINAL_STATES
+
+    def on_order_update(self, msg: dict):
+        norenordno = msg.get('norenordno')
+        if norenordno is None or 'status' not in msg:
+            return
+        with self.cond:
+            self.orders[norenordno] = msg
+            self.orders.move_to_end(norenordno)
+            while len(self.orders) > OrderEventRouter.MAX_ORDERS:
+                self.orders.popitem(last=False)
+            self.n_events += 1
+            self.cond.notify_all()
+
+    def get(self, norenordno):
+        """latest update of the order, None if nothing is pushed yet"""
+        with self.cond:
+            return self.orders.get(norenordno)
+
+    def wait(self, norenordno, timeout: float):
+        """Waits for the final state of the order.
+
+        Returns:
+            dict: order update in a final state, None if it is not pushed within timeout
+        """
+        with self.cond:
+            if self.cond.wait_for(lambda: OrderEventRouter.is_final(self.orders.get(norenordno)), timeout):
+                return self.orders[norenordno]
+        return None
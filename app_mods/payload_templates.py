@@ -0,0 +1,95 @@
+"""
+File: payload_templates.py
+Author: [Tarakeshwar NC]
+Date: April 19, 2024
+Description:  This script provides the pre-serialized payloads of the broker requests.
+A template is the jData of a request serialized once with placeholders for the fields
+that change per call (qty, prices, remarks, al_id). The static part (uid, actid, quoted
+trading symbol, product, retention ..) is not rebuilt or serialized again, a call only
+joins the serialized pieces with its values.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/19"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    import json
+    import re
+    import threading
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+PLACEHOLDER = re.compile(r'"\{\{(\w+)\}\}"')
+
+
+def placeholder(field: str):
+    return '{{' + field + '}}'
+
+
+def encode(value):
+    """json string of the value, as json.dumps of the request dict gives it"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return '"' + str(value) + '"'
+    return json.dumps(value if isinstance(value, str) else str(value))
+
+
+class PayloadTemplate(object):
+    def __init__(self, values: dict):
+        """
+        Args:
+            values (dict): jData of the request, the variable fields hold placeholder(field)
+        """
+        pieces = PLACEHOLDER.split('jData=' + json.dumps(values))
+        self.parts = pieces[0::2]   # static text around the fields
+        self.fields = pieces[1::2]  # field of each gap, a field can appear more than once
+
+    def fill(self, jkey: str, **fields):
+        """payload of the request with the given fields"""
+        parts = self.parts
+        out = [parts[0]]
+        for i, field in enumerate(self.fields):
+            out.append(encode(fields[field]))
+            out.append(parts[i + 1])
+        out.append('&jKey=')
+        out.append(jkey)
+        return ''.join(out)
+
+
+class PayloadTemplates(object):
+    """Templates keyed by the static part of the request, built on first use"""
+    def __init__(self):
+        self.templates = dict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.templates)
+
+    def get(self, key: tuple, build):
+        """template of the key, build() gives the jData with the placeholders on a miss"""
+        template = self.templates.get(key)
+        if template is None:
+            template = PayloadTemplate(build())
+            with self.lock:
+                self.templates[key] = template
+        return template
@@ -0,0 +1,244 @@
+"""
+File: rate_limiter.py
+Author: [Tarakeshwar NC]
+Date: April 17, 2024
+Description:  This script provides the pacing of the Shoonya REST calls. Every call takes
+a token from the bucket of its endpoint class (order, query, GTT) and a slot of the shared
+concurrency limit before it is sent. The limit is adapted AIMD style, it grows by one per
+window of good replies and is halved on throttling replies, timeouts or slow orders.
+Waiting calls are served by priority, so a square off goes ahead of the background queries.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/17"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    import heapq
+    import itertools
+    import re
+    import threading
+    import time
+    from contextlib import contextmanager
+    from typing import NamedTuple
+
+    import requests
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+# endpoint classes
+ORDER = 'ORDER'
+QUERY = 'QUERY'
+GTT = 'GTT'
+
+ENDPOINT_CLASSES = {
+    'PlaceOrder': ORDER,
+    'ModifyOrder': ORDER,
+    'CancelOrder': ORDER,
+    'ExitSNOOrder': ORDER,
+    'PlaceGTTOrder': GTT,
+    'PlaceOCOOrder': GTT,
+    'ModifyOCOOrder': GTT,
+    'CancelGTTOrder': GTT,
+    'GetPendingGTTOrder': GTT,
+    'GetEnabledGTTs': GTT,
+}
+
+# (tokens per sec, burst) of each endpoint class, kept below the broker limits
+BUCKETS = {ORDER: (10.0, 10), GTT: (5.0, 5), QUERY: (20.0, 20)}
+
+# replies slower than this (secs) are taken as congestion, None: latency is not used
+LATENCY_TARGETS = {ORDER: 1.0, GTT: 1.0, QUERY: None}
+
+# priorities, lower is served first
+SQ_OFF = 0
+TRADE = 1
+BACKGROUND = 2
+DEFAULT_PRIORITY = {ORDER: TRADE, GTT: TRADE, QUERY: BACKGROUND}
+
+THROTTLE_STATUS_CODES = (429, 502, 503, 504)
+THROTTLE_EMSG = re.compile(r'too many|rate limit|throttl|try after|exceed.*request|request.*exceed', re.IGNORECASE)
+
+
+class RateLimitTimeout(requests.exceptions.RequestException):
+    """Call not sent, no slot in time. Handled with the other failed requests of the broker calls"""
+    pass
+
+
+class Permit(NamedTuple):
+    ep_class: str
+    priority: int
+    granted_at: float
+
+
+def endpoint_class(url: str):
+    return ENDPOINT_CLASSES.get(url.rstrip('/').rsplit('/', 1)[-1], QUERY)
+
+
+def is_throttled(status_code: int, text: str = ''):
+    """True if the reply is the broker pushing back, not a business rejection"""
+    if status_code in THROTTLE_STATUS_CODES:
+        return True
+    return 'Not_Ok' in text and THROTTLE_EMSG.search(text) is not None
+
+
+_context = threading.local()
+
+
+@contextmanager
+def priority(level: int):
+    """Calls made by this thread inside the block are queued with the given priority"""
+    saved = getattr(_context, 'priority', None)
+    _context.priority = level
+    try:
+        yield
+    finally:
+        _context.priority = saved
+
+
+class TokenBucket(object):
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def ready(self, now: float):
+        self.refill(now)
+        return self.tokens >= 1.0
+
+    def take(self):
+        self.tokens -= 1.0
+
+    def wait_time(self, now: float):
+        """secs until the next token"""
+        self.refill(now)
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+
+class RateLimiter(object):
+    INITIAL_LIMIT = 8
+    MIN_LIMIT = 1
+    MAX_LIMIT = 16          # connection pool of the transport
+    BACKGROUND_RESERVE = 1  # slots the background queries leave free for orders
+    ACQUIRE_TIMEOUT = 10.0  # secs
+    DECREASE_WINDOW = 1.0   # secs
+
+    def __init__(self, buckets: dict = None, latency_targets: dict = None,
+                 initial_limit: int = INITIAL_LIMIT, min_limit: int = MIN_LIMIT, max_limit: int = MAX_LIMIT):
+        self.buckets = {ep_class: TokenBucket(rate, burst) for ep_class, (rate, burst) in (buckets or BUCKETS).items()}
+        self.latency_targets = dict(LATENCY_TARGETS) if latency_targets is None else latency_targets
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(initial_limit)
+        self.inflight = 0
+        self.waiters = []  # heap of [priority, seq, ep_class]
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.last_decrease = 0.0
+        self.n_granted = 0
+        self.n_throttled = 0
+        self.n_decreases = 0
+        self.max_wait = 0.0
+
+    def __has_slot__(self, prio: int):
+        limit = int(self.limit)
+        if prio >= BACKGROUND and limit > self.BACKGROUND_RESERVE:
+            limit -= self.BACKGROUND_RESERVE
+        return self.inflight < limit
+
+    def __next_waiter__(self, now: float):
+        """highest priority waiter that has a token and a slot"""
+        for waiter in sorted(self.waiters):
+            prio, _, ep_class = waiter
+            if self.buckets[ep_class].ready(now) and self.__has_slot__(prio):
+                return waiter
+            if not self.__has_slot__(prio):
+                # lower priorities do not get ahead of a waiter held up by the limit
+                return None
+        return None
+
+    def acquire(self, url: str, prio: int = None, timeout: float = ACQUIRE_TIMEOUT):
+        ep_class = endpoint_class(url)
+        if prio is None:
+            prio = getattr(_context, 'priority', None)
+        if prio is None:
+            prio = DEFAULT_PRIORITY[ep_class]
+        start = time.monotonic()
+        deadline = start + timeout
+        waiter = [prio, next(self.seq), ep_class]
+        with self.cond:
+            heapq.heappush(self.waiters, waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self.__next_waiter__(now) is waiter:
+                        self.buckets[ep_class].take()
+                        self.inflight += 1
+                        self.n_granted += 1
+                        self.max_wait = max(self.max_wait, now - start)
+                        return Permit(ep_class, prio, now)
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise RateLimitTimeout(f'no slot for {url} in {timeout} secs')
+                    token_wait = self.buckets[ep_class].wait_time(now)
+                    self.cond.wait(min(remaining, token_wait) if token_wait > 0 else remaining)
+            finally:
+                self.waiters.remove(waiter)
+                heapq.heapify(self.waiters)
+                self.cond.notify_all()
+
+    def release(self, permit: Permit, latency: float = None, throttled: bool = False):
+        """Returns the slot, latency (secs) and throttling of the reply adapt the limit"""
+        target = self.latency_targets.get(permit.ep_class)
+        slow = target is not None and latency is not None and latency > target
+        with self.cond:
+            self.inflight -= 1
+            if throttled:
+                self.n_throttled += 1
+            if throttled or slow:
+                self.__decrease__(time.monotonic())
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+    def __decrease__(self, now: float):
+        # once per window, the replies of one burst halve the limit only once
+        if now - self.last_decrease < self.DECREASE_WINDOW:
+            return
+        self.last_decrease = now
+        limit = max(self.min_limit, self.limit / 2)
+        if int(limit) != int(self.limit):
+            logger.info(f'Broker concurrency limit {int(self.limit)} -> {int(limit)}')
+        self.limit = limit
+        self.n_decreases += 1
+
+    def metrics(self):
+        with self.cond:
+            return {'limit': int(self.limit), 'inflight': self.inflight, 'waiting': len(self.waiters),
+                    'granted': self.n_granted, 'throttled': self.n_throttled,
+                    'decreases': self.n_decreases, 'max_wait_ms': round(self.max_wait * 1000, 3)}
@@ -0,0 +1,206 @@
+"""
+File: scrip_master.py
+Author: [Tarakeshwar NC]
+Date: April 5, 2024
+Description:  This script prepares the scrip master files in the background.
+Download, parsing, index building and compaction of the NFO master run on a
+separate thread started at launch. Users of the data block only if they need it
+before it is ready.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/5"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils as utils
+
+logger = utils.get_logger(__name__)
+
+try:
+    import os
+    import threading
+    import time
+
+    import pandas as pd
+
+    from .fuzzy_search import FuzzySymbolSearch
+    from .symbol_index import SymbolIndex
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+
+# Column types of the NFO scrip master. Repeated values are categories, so
+# a single read of the full master stays small and fast to filter.
+NFO_DTYPES = {
+    'Exchange': 'category',
+    'Token': 'int64',
+    'LotSize': 'int32',
+    'Symbol': 'category',
+    'TradingSymbol': 'string',
+    'Expiry': 'category',
+    'Instrument': 'category',
+    'OptionType': 'category',
+    'StrikePrice': 'float64',
+    'TickSize': 'float64',
+}
+
+
+def compacted_file_name(input_file_path):
+    return os.path.splitext(input_file_path)[0] + '.pkl'
+
+
+def load_compacted(input_file_path, symbol_expdate_pairs):
+    """Loads the compacted frame persisted for input_file_path.
+
+    Returns:
+        DataFrame: compacted frame, None if missing, stale or not covering the pairs
+    """
+    output_file_path = compacted_file_name(input_file_path)
+    try:
+        if os.path.getmtime(output_file_path) < os.path.getmtime(input_file_path):
+            return None
+        df = pd.read_pickle(output_file_path)
+    except Exception:
+        return None
+    if not set(symbol_expdate_pairs) <= set(df.attrs.get('pairs', [])):
+        return None
+    return df
+
+
+def compact_search_file(input_file_path, symbol_expdate_pairs):
+    """Filters the NFO master down to the (symbol, expiry) pairs.
+
+    The master is read once and all pairs are selected in one vectorized pass,
+    so the cost does not depend on the number of pairs. The result is also
+    persisted as a pickle next to the master.
+
+    Returns:
+        DataFrame: rows of the requested pairs
+    """
+    pairs = list(dict.fromkeys(tuple(pair) for pair in symbol_expdate_pairs))
+    df = load_compacted(input_file_path, pairs)
+    if df is not None:
+        logger.debug(f'compacted frame loaded: {len(df)} rows')
+        return df
+
+    with open(input_file_path, 'r') as file:
+        header = file.readline().strip()
+
+    # Extra comma at the end creates extra column in the dataframe. This is
+    # elminated by the following way.
+    columns = [col for col in header.split(',') if col]
+    dtypes = {col: dtype for col, dtype in NFO_DTYPES.items() if col in columns}
+    df = pd.read_csv(input_file_path, sep=',', usecols=columns, dtype=dtypes)
+
+    keys = pd.MultiIndex.from_arrays([df['Symbol'], df['Expiry']])
+    df = df[keys.isin(pairs)].reset_index(drop=True)
+    for col in df.select_dtypes('category').columns:
+        df[col] = df[col].cat.remove_unused_categories()
+    df.attrs['pairs'] = pairs
+
+    output_file_path = compacted_file_name(input_file_path)
+    try:
+        df.to_pickle(output_file_path)
+    except Exception as e:
+        logger.error(f'Unable to persist {output_file_path}: {e}')
+    logger.debug(f'compacted frame: {len(df)} rows')
+    return df
+
+
+class ScripMasterPrep(object):
+    NSE_URL = "https://api.shoonya.com/NSE_symbols.txt.zip"
+    NFO_URL = 'https://api.shoonya.com/NFO_symbols.txt.zip'
+
+    def __init__(self, dl_folder: str, symbol_expdate_pairs: list = None):
+        self.dl_folder = dl_folder
+        self.symbol_expdate_pairs = list(symbol_expdate_pairs) if symbol_expdate_pairs else []
+        self.scripmaster_file = self.__dst_file__(ScripMasterPrep.NSE_URL)
+        self.nfo_scripmaster_file = self.__dst_file__(ScripMasterPrep.NFO_URL)
+        self.sym_indices = dict()
+        self.fuzzy_indices = dict()
+        self.nfo_df = None
+        self.ready_evt = threading.Event()
+        self.th = None
+
+    def __dst_file__(self, url):
+        filename = os.path.basename(url)[:-4]  # Remove the .zip extension
+        return os.path.join(self.dl_folder, f'FV_{filename}')
+
+    def start(self):
+        self.th = threading.Thread(target=self.__prepare__, name='SCRIP_MASTER_PREP', daemon=True)
+        self.th.start()
+
+    def __prepare__(self):
+        start = time.perf_counter()
+        try:
+            # Downloaded zip files are cached for the trading day, restarts do not download again.
+            dl_cache = utils.ArtifactCache(self.dl_folder)
+            for url, dst_file in ((ScripMasterPrep.NSE_URL, self.scripmaster_file),
+                                  (ScripMasterPrep.NFO_URL, self.nfo_scripmaster_file)):
+                logger.info(f'scripmaster_file: {dst_file}')
+                if not dl_cache.fetch(url, dst_file, member=os.path.basename(url)[:-4]):
+                    logger.error(f'Unable to fetch {url}')
+            dl_cache.evict()
+
+            # One time (per download) build step, lookups afterwards do not parse the files.
+            for exch, dst_file in (('NSE', self.scripmaster_file), ('NFO', self.nfo_scripmaster_file)):
+                sym_index = SymbolIndex.load(dst_file, exch)
+                if sym_index is not None:
+                    self.sym_indices[exch] = sym_index
+
+            # NFO searches are fuzzy on the trading symbol, ids are the index positions.
+            if 'NFO' in self.sym_indices:
+                tsyms = self.sym_indices['NFO'].records['tsym'].astype('U').tolist()
+                self.fuzzy_indices['NFO'] = FuzzySymbolSearch(tsyms)
+
+            if len(self.symbol_expdate_pairs) and os.path.exists(self.nfo_scripmaster_file):
+                self.nfo_df = compact_search_file(self.nfo_scripmaster_file, self.symbol_expdate_pairs)
+        except Exception as e:
+            logger.error(f'Scrip master preparation failed: {e}')
+            logger.debug(traceback.format_exc())
+        finally:
+            self.ready_evt.set()
+        logger.info(f'Scrip master ready in {time.perf_counter() - start:.2f} secs')
+
+    def is_ready(self):
+        return self.ready_evt.is_set()
+
+    def wait(self, timeout: float = None):
+        if not self.ready_evt.is_set():
+            logger.info('Waiting for scrip master preparation..')
+        return self.ready_evt.wait(timeout)
+
+
+_G_SCRIP_MASTER_PREP = dict()
+_G_SCRIP_MASTER_PREP_LOCK = threading.Lock()
+
+
+def start_scrip_master_prep(dl_folder: str, symbol_expdate_pairs: list = None):
+    """Starts the background preparation for the folder, if not started already.
+
+    Returns:
+        ScripMasterPrep: preparation object shared by all users of the folder
+    """
+    key = os.path.abspath(dl_folder)
+    with _G_SCRIP_MASTER_PREP_LOCK:
+        prep = _G_SCRIP_MASTER_PREP.get(key)
+        if prep is None:
+            prep = _G_SCRIP_MASTER_PREP[key] = ScripMasterPrep(dl_folder, symbol_expdate_pairs)
+            prep.start()
+    return prep
@@ -0,0 +1,197 @@
+"""
+File: sec_info_cache.py
+Author: [Tarakeshwar NC]
+Date: April 11, 2024
+Description:  This script provides the trading day cache of the security info
+(freeze qty, lot size, tick size ..) keyed by (exchange, token). The values do not
+change during the day, so each token is fetched from the broker once. The cache is
+saved in the download folder and loaded again on a restart on the same trading day.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/11"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    import json
+    import os
+    import threading
+    from datetime import datetime, timedelta
+
+    from app_utils.exec_service import BG_IO
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+
+class SecurityInfoCache(object):
+    FILE_NAME = 'sec_info_cache.json'
+
+    def __init__(self, dl_filepath: str = None, refresh_time: str = "08:45"):
+        """
+        Args:
+            dl_filepath (str): folder of the saved cache, None keeps it in memory only
+            refresh_time (str): entries made before this time belong to the previous trading day
+        """
+        self.file_name = os.path.join(dl_filepath, SecurityInfoCache.FILE_NAME) if dl_filepath else None
+        self.refresh_time = datetime.strptime(refresh_time, "%H:%M").time()
+        self.entries = dict()  # (exchange, token) -> security info
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()  # one writer of the file at a time
+        self.save_pending = False
+        self.day = self.trading_day()
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def trading_day(self, ts: datetime = None):
+        if ts is None:
+            ts = datetime.now()
+        day = ts.date()
+        if ts.time() < self.refresh_time:
+            day = day - timedelta(days=1)
+        return day.isoformat()
+
+    @staticmethod
+    def key(exchange, token):
+        return (exchange.upper(), str(token))
+
+    def load(self):
+        if self.file_name is None or not os.path.exists(self.file_name):
+            return
+        try:
+            with open(self.file_name) as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.info(f'Security info cache not loaded: {e}')
+            return
+        if saved.get('day') != self.day:
+            logger.debug(f'Security info cache of {saved.get("day")} is stale')
+            return
+        with self.lock:
+            for key, info in saved.get('info', {}).items():
+                exchange, token = key.split('|')
+                self.entries[(exchange, token)] = info
+        logger.info(f'Security info cache loaded: {len(self.entries)} tokens')
+
+    def save(self):
+        if self.file_name is None:
+            return
+        with self.save_lock:
+            with self.lock:
+                saved = {'day': self.day,
+                         'info': {f'{exchange}|{token}': info for (exchange, token), info in self.entries.items()}}
+            tmp_file = self.file_name + '.tmp'
+            try:
+                with open(tmp_file, 'w') as f:
+                    json.dump(saved, f)
+                os.replace(tmp_file, self.file_name)
+            except OSError as e:
+                logger.info(f'Security info cache not saved: {e}')
+
+    def save_later(self):
+        """Saves the cache on the BG_IO lane, the entries put till the save starts go with it"""
+        if self.file_name is None:
+            return None
+        with self.lock:
+            if self.save_pending:
+                return None
+            self.save_pending = True
+        return app_utils.get_exec_service().submit(BG_IO, self.__save_pending__)
+
+    def __save_pending__(self):
+        with self.lock:
+            self.save_pending = False
+        self.save()
+
+    def __check_day__(self):
+        day = self.trading_day()
+        if day != self.day:
+            logger.info(f'Trading day changed {self.day} -> {day}, clearing {len(self.entries)} tokens')
+            self.entries.clear()
+            self.day = day
+
+    def get(self, exchange: str, token):
+        """cached security info, None if it is not fetched yet"""
+        key = SecurityInfoCache.key(exchange, token)
+        with self.lock:
+            self.__check_day__()
+            info = self.entries.get(key)
+            if info is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return info
+
+    def put(self, exchange: str, token, info: dict):
+        # only the successful replies are kept, failures are fetched again
+        if not isinstance(info, dict) or info.get('stat') != 'Ok':
+            return False
+        with self.lock:
+            self.__check_day__()
+            self.entries[SecurityInfoCache.key(exchange, token)] = info
+        return True
+
+    def resolve(self, exchange: str, token, fetcher):
+        """Cached security info, fetcher(exchange, token) on a miss.
+
+        Returns:
+            dict: security info, the reply of the fetcher if it is not cacheable
+        """
+        info = self.get(exchange, token)
+        if info is None:
+            info = fetcher(exchange, str(token))
+            # the caller is on the order path, the file is written in the background
+            if self.put(exchange, token, info):
+                self.save_later()
+        return info
+
+    def fill(self, exchange: str, tokens, fetcher):
+        """Fetches the missing tokens in parallel and saves the cache once.
+
+        Returns:
+            int: number of tokens fetched
+        """
+        missing = [str(token) for token in dict.fromkeys(tokens) if self.get(exchange, token) is None]
+        if not missing:
+            return 0
+        exec_service = app_utils.get_exec_service()
+        futures = [exec_service.submit(BG_IO, fetcher, exchange, token) for token in missing]
+        replies = []
+        for token, future in zip(missing, futures):
+            try:
+                replies.append(future.result())
+            except Exception as e:
+                logger.info(f'Security info of {exchange} {token} not fetched: {e}')
+                replies.append(None)
+        n_filled = sum(self.put(exchange, token, info) for token, info in zip(missing, replies))
+        if n_filled:
+            self.save()
+        logger.debug(f'Security info filled: {exchange} {n_filled}/{len(missing)}')
+        return n_filled
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,100 @@
+"""
+File: slicing.py
+Author: [Tarakeshwar NC]
+Date: April 18, 2024
+Description:  This script provides the order slicing planner shared by the entry and the
+exit paths. A quantity is split into legs that are whole lots and below the freeze
+quantity, spread as evenly as possible over the number of legs asked for. The plans use
+integer arithmetic only and are memoized, the inputs of an instrument do not change
+during the day, so a click gets its plan from the cache.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/18"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    import math
+    from functools import lru_cache
+    from typing import NamedTuple, Tuple
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+MARGIN_BUFFER = 1.1  # 10% over the ltp for the price moving before the fill
+
+
+class LegPlan(NamedTuple):
+    qty: int                # total quantity of the legs
+    legs: Tuple[int, ...]   # quantity of each leg, larger legs first
+    max_leg_qty: int        # largest quantity allowed in one leg
+
+    @property
+    def n_legs(self):
+        return len(self.legs)
+
+
+def max_leg_qty(lot_size: int, frz_qty: int = None):
+    """Largest whole lot quantity of one order, None if there is no freeze limit.
+
+    Important: frz_qty is 1801 for nifty fno and not 1800 in finvasia api, an order
+    must be below the freeze quantity.
+    """
+    if frz_qty is None:
+        return None
+    return ((frz_qty - 1) // lot_size) * lot_size
+
+
+def affordable_qty(qty: int, lot_size: int, price: float, margin: float, buffer: float = MARGIN_BUFFER):
+    """qty reduced to the whole lots the margin can pay for"""
+    if price is None or price <= 0 or margin is None or margin >= price * buffer * qty:
+        return qty
+    return (math.floor(margin / (buffer * price)) // lot_size) * lot_size
+
+
+@lru_cache(maxsize=1024)
+def plan_legs(qty: int, lot_size: int = 1, frz_qty: int = None, n_legs: int = 1):
+    """Splits qty into legs.
+
+    Args:
+        qty (int): total quantity, the part that is not a whole lot is left out
+        lot_size (int): every leg is a multiple of it
+        frz_qty (int): every leg is below it, None for no limit
+        n_legs (int): legs asked for, raised to the minimum the freeze quantity needs
+            and lowered to one lot per leg
+
+    Returns:
+        LegPlan: legs of the plan, no legs if qty is below a lot
+    """
+    lot_size = max(int(lot_size), 1)
+    lots = int(qty) // lot_size
+    leg_limit = max_leg_qty(lot_size, frz_qty)
+    if lots <= 0 or leg_limit == 0:
+        return LegPlan(0, (), leg_limit)
+
+    max_lots = lots if leg_limit is None else leg_limit // lot_size
+    min_legs = -(-lots // max_lots)
+    n_legs = min(max(int(n_legs), min_legs), lots)
+
+    base, extra = divmod(lots, n_legs)
+    legs = tuple((base + 1) * lot_size if i < extra else base * lot_size for i in range(n_legs))
+    return LegPlan(lots * lot_size, legs, leg_limit)
@@ -0,0 +1,496 @@
+"""
+File: sq_off.py
+Author: [Tarakeshwar NC]
+Date: April 20, 2024
+Description:  This script provides the square off engine. The order book, the pending
+GTTs and the positions are fetched together as one snapshot. The cancels and the exits
+are worked out from the snapshot in one reconciliation of the data frames, and are then
+sent in parallel under an overall deadline. Items that did not finish by the deadline
+are reported, so that they can be checked manually. The auto square off prepares all
+of it ahead of the square off time, so that the exits leave on time.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/20"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    import concurrent.futures
+    import threading
+    import time
+    from datetime import datetime
+    from typing import Callable, List, NamedTuple
+
+    import pandas as pd
+
+    from app_utils.exec_service import BG_IO, ORDER
+
+    from . import rate_limiter, slicing
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+OPEN_STATES = ['open', 'pending', 'trigger_pending']
+
+
+class SqOffItem(NamedTuple):
+    kind: str       # CANCEL_ORDER, EXIT_BO, CANCEL_GTT, EXIT
+    ref: str        # order id, alert id or trading symbol
+    qty: int = 0
+    tsym: str = ''  # symbol the item belongs to
+
+
+class ExitPosition(NamedTuple):
+    exch: str
+    tsym: str
+    token: str
+    buy_or_sell: str
+    qty: int
+
+
+class SqOffPlan(NamedTuple):
+    cancels: List[SqOffItem]
+    exits: List[ExitPosition]
+
+
+class PreparedSquareOff(NamedTuple):
+    records: pd.DataFrame
+    plan: SqOffPlan
+    exit_legs: list         # (SqOffItem, ExitPosition) of each exit order
+    prepared_at: datetime
+
+
+class SquareOffReport(NamedTuple):
+    done: List[SqOffItem]
+    failed: List[SqOffItem]
+    unfinished: List[SqOffItem]
+    elapsed: float
+    first_exit: float = None  # secs from the start to the first exit order
+
+    @property
+    def complete(self):
+        return not self.failed and not self.unfinished
+
+
+def as_frame(r):
+    return pd.DataFrame(r) if isinstance(r, list) and len(r) else pd.DataFrame()
+
+
+def reconcile(records: pd.DataFrame, order_book: pd.DataFrame, gtts: pd.DataFrame, positions: pd.DataFrame):
+    """Cancels and exits of the recorded orders, worked out on the whole snapshot at once.
+
+    Args:
+        records (DataFrame): orders of the book keeper, filtered to the ones to square off
+        order_book, gtts, positions (DataFrame): broker snapshot, empty if there is nothing
+
+    Returns:
+        SqOffPlan: what is to be sent
+    """
+    order_ids = records['Order_ID']
+    rec_tsym = records['TradingSymbol_Token'].str.split('_').str[0]
+
+    cancels = []
+    bo_order_ids = []
+    if len(order_book):
+        status = order_book['status'].str.lower()
+        is_open = status.isin(OPEN_STATES)
+        rows = order_book.loc[order_book['norenordno'].isin(order_ids) & is_open]
+        cancels += [SqOffItem('CANCEL_ORDER', order_id, 0, tsym) for order_id, tsym in zip(rows['norenordno'], rows['tsym'])]
+        if 'snonum' in order_book and 'snoordt' in order_book:
+            # bracket order children of the equity legs that are still open
+            children = (order_book['snonum'].isin(order_ids) & is_open &
+                        order_book['tsym'].str.contains('-EQ', regex=False) &
+                        (pd.to_numeric(order_book['snoordt'], errors='coerce') == 0))
+            rows = order_book.loc[children]
+            bo_order_ids = rows['snonum'].tolist()
+            cancels += [SqOffItem('EXIT_BO', snonum, 0, tsym) for snonum, tsym in zip(rows['snonum'], rows['tsym'])]
+
+    if len(gtts) and 'al_id' in gtts:
+        alert_ids = records['OCO_Alert_ID'].astype(str)
+        pending = records['OCO_Alert_ID'].notna() & alert_ids.isin(gtts['al_id'].astype(str))
+        cancels += [SqOffItem('CANCEL_GTT', al_id, 0, tsym) for al_id, tsym in zip(alert_ids[pending], rec_tsym[pending])]
+
+    # recorded qty against the net intraday position of each symbol
+    rec = records.groupby('TradingSymbol_Token')['Qty'].sum().reset_index()
+    parts = rec['TradingSymbol_Token'].str.split('_')
+    rec['tsym'] = parts.str[0]
+    rec['token'] = parts.str[1]
+    if len(positions):
+        posn = positions.loc[positions['prd'] == 'I', ['token', 'netqty']].copy()
+        posn['token'] = posn['token'].astype(str)
+        posn['netqty'] = pd.to_numeric(posn['netqty'], errors='coerce').fillna(0).astype(int)
+        posn = posn.groupby('token')['netqty'].sum()
+        rec['net_qty'] = rec['token'].map(posn).fillna(0).astype(int).abs()
+    else:
+        rec['net_qty'] = 0
+    # the bracket orders exited above close their own qty
+    bo_qty = records.loc[order_ids.isin(bo_order_ids)].groupby('TradingSymbol_Token')['Qty'].sum().abs()
+    rec['bo_qty'] = rec['TradingSymbol_Token'].map(bo_qty).fillna(0).astype(int)
+    # system exits only what it has triggered, extra qty taken manually is left to the user
+    rec['exit_qty'] = (rec['Qty'].abs().clip(upper=rec['net_qty']) - rec['bo_qty']).clip(lower=0)
+    rec = rec[rec['exit_qty'] > 0]
+    exits = [ExitPosition('NSE' if '-EQ' in tsym else 'NFO', tsym, token, 'S' if qty > 0 else 'B', int(exit_qty))
+             for tsym, token, qty, exit_qty in zip(rec['tsym'], rec['token'], rec['Qty'], rec['exit_qty'])]
+
+    return SqOffPlan(cancels, exits)
+
+
+def net_qty(positions, posn: ExitPosition):
+    """Intraday qty of the symbol that the exit closes, 0 if it is flat or reversed"""
+    frame = as_frame(positions)
+    if not len(frame):
+        return 0
+    rows = frame.loc[(frame['prd'] == 'I') & (frame['token'].astype(str) == str(posn.token))]
+    net = int(pd.to_numeric(rows['netqty'], errors='coerce').fillna(0).sum())
+    return max(0, net if posn.buy_or_sell == 'S' else -net)
+
+
+class SquareOffEngine(object):
+    DEADLINE = 5.0  # secs, whole square off
+    FAILURE_COUNT = 2
+    CONFIRM_COUNT = 10  # checks of the exit order state, within the deadline
+    FINAL_READ_DEADLINE = 1.0  # secs, positions read at the fire of a prepared square off
+
+    def __init__(self, tiu, deadline: float = DEADLINE, failure_count: int = FAILURE_COUNT):
+        """
+        Args:
+            tiu (Tiu): trading session, its broker object and security info cache are used
+        """
+        self.tiu = tiu
+        self.fv = tiu.fv
+        self.deadline = deadline
+        self.failure_count = failure_count
+        self.exec_service = app_utils.get_exec_service()
+        self.lock = threading.Lock()
+        self.first_exit_at = None
+
+    def __submit__(self, fn, *args):
+        def task():
+            # lane threads do not carry the priority of the caller
+            with rate_limiter.priority(rate_limiter.SQ_OFF):
+                return fn(*args)
+        return self.exec_service.submit(ORDER, task)
+
+    def snapshot(self):
+        fv = self.fv
+        futures = [self.__submit__(fn) for fn in (fv.get_order_book, fv.get_pending_gtt_order, fv.get_positions)]
+        _, not_done = concurrent.futures.wait(futures, timeout=self.deadline)
+        if not_done:
+            raise TimeoutError(f'snapshot not done in {self.deadline} secs')
+        return [future.result() for future in futures]
+
+    def __cancel_order__(self, order_id):
+        r = self.fv.cancel_order(order_id)
+        return isinstance(r, dict) and r.get('stat') == 'Ok'
+
+    def __exit_bo__(self, snonum):
+        r = self.fv.exit_order(snonum, 'B')
+        if isinstance(r, dict) and r.get('stat') == 'Ok':
+            logger.debug(f'child order {snonum} exited')
+            return True
+        logger.info(f'Exit order of {snonum} Failed, Check Manually')
+        return False
+
+    def __cancel_gtt__(self, al_id):
+        r = self.fv.cancel_gtt_order(al_id=str(al_id))
+        if isinstance(r, dict) and r.get('stat') == "OI deleted":
+            logger.debug(f'alert id {al_id} cancellation success')
+            return True
+        logger.debug(f'alert_id: {al_id} : {r}')
+        return False
+
+    def __exit_qty__(self, posn: ExitPosition, cancels, end: float, final_read=None, read_end: float = None):
+        """Qty of the symbol to exit, once its open orders and GTTs are cancelled.
+
+        A cancel that failed or is not done may be of an order or GTT that has filled
+        after the snapshot, the position is read again and the exit is capped to it.
+
+        Args:
+            final_read (Future): positions read at the fire, the exit is capped to it
+                if it is done by read_end, else the snapshot qty is exited
+
+        Returns:
+            int: qty to exit, None if the position is not known
+        """
+        cancels_ok = True
+        if cancels:
+            _, not_done = concurrent.futures.wait(cancels, timeout=max(0.0, end - time.monotonic()))
+            cancels_ok = not not_done and all(future.exception() is None and future.result() for future in cancels)
+
+        if cancels_ok:
+            if final_read is None:
+                return posn.qty
+            try:
+                positions = final_read.result(timeout=max(0.0, read_end - time.monotonic()))
+            except Exception as e:
+                positions = None
+                logger.debug(f'get_positions: {e!r}')
+            if not isinstance(positions, list):
+                logger.warning(f'Final position read failed, exit of {posn.tsym} on the snapshot qty {posn.qty}')
+                return posn.qty
+        else:
+            logger.info(f'Cancels of {posn.tsym} failed or not done, its position is read again')
+            try:
+                positions = self.fv.get_positions()
+            except Exception as e:
+                positions = None
+                logger.debug(f'get_positions: {e}')
+            if not isinstance(positions, list):
+                logger.warning(f'Position of {posn.tsym} is not known, exit skipped, Check Manually')
+                return None
+        qty = min(posn.qty, net_qty(positions, posn))
+        if qty != posn.qty:
+            logger.info(f'Exit of {posn.tsym} reduced {posn.qty} --> {qty}, position changed after the snapshot')
+        return qty
+
+    def __exit_leg__(self, posn: ExitPosition, qty: int, exit_qty=None, offset: int = 0):
+        """
+        Args:
+            exit_qty (Future): qty of the symbol to exit, the legs before this one take the first offset of it
+        """
+        if exit_qty is not None:
+            # open orders and GTTs of the symbol are cancelled before it is exited
+            symbol_qty = exit_qty.result()
+            if symbol_qty is None:
+                return False
+            qty = min(qty, max(0, symbol_qty - offset))
+            if not qty:
+                logger.info(f'Exit leg of {posn.tsym} skipped, the position is closed')
+                return True
+        for _ in range(self.failure_count + 1):
+            with self.lock:
+                if self.first_exit_at is None:
+                    self.first_exit_at = time.monotonic()
+            r = self.fv.place_order(posn.buy_or_sell, product_type='I', exchange=posn.exch, tradingsymbol=posn.tsym,
+                                    quantity=qty, price_type='MKT', discloseqty=0.0)
+            if r is None or r.get('stat') == 'Not_Ok':
+                logger.info(f'Exit order Failed: {posn.tsym} {None if r is None else r.get("emsg")}')
+                continue
+            order_id = r['norenordno']
+            # the fill comes a few ms after the ack, wait for the final state
+            status = None
+            for check_cnt in range(self.CONFIRM_COUNT):
+                status = self.tiu.__get_order_state__(order_id, check_cnt)['status'].lower()
+                if status in ('complete', 'rejected', 'canceled'):
+                    break
+            if status == 'complete':
+                logger.info(f'Exit order Complete: order_id: {order_id}')
+                return True
+            logger.info(f'Exit order InComplete: order_id: {order_id} {status} Check Manually')
+            return False
+        return False
+
+    def __exit_legs__(self, exits: List[ExitPosition]):
+        """exit orders of the positions, sliced below the freeze qty"""
+        tokens = dict()
+        for posn in exits:
+            tokens.setdefault(posn.exch, []).append(posn.token)
+        for exch, exch_tokens in tokens.items():
+            self.tiu.fill_security_info(exch, exch_tokens)
+
+        legs = []
+        for posn in exits:
+            r = self.tiu.fetch_security_info(exchange=posn.exch, token=posn.token)
+            frz_qty = int(r['frzqty']) if isinstance(r, dict) and 'frzqty' in r else None
+            ls = int(r['ls']) if isinstance(r, dict) and 'ls' in r else 1
+            plan = slicing.plan_legs(posn.qty, ls, frz_qty)
+            if plan.qty != posn.qty:
+                logger.info(f'Exit qty {posn.qty} of {posn.tsym} is not a multiple of lot size {ls}, Check Manually')
+            legs.extend((SqOffItem('EXIT', posn.tsym, leg_qty, posn.tsym), posn) for leg_qty in plan.legs)
+        return legs
+
+    def prepare(self, records: pd.DataFrame):
+        """Snapshot, reconciliation and exit legs, nothing is sent.
+
+        Returns:
+            PreparedSquareOff: None if the snapshot failed
+        """
+        try:
+            order_book, gtts, positions = self.snapshot()
+        except Exception as e:
+            logger.info(f'Square off snapshot Failed: {e}, Check Manually')
+            return None
+        if not isinstance(order_book, list):
+            logger.info('get_order_book Failed, Check Manually')
+            return None
+
+        plan = reconcile(records, as_frame(order_book), as_frame(gtts), as_frame(positions))
+        logger.debug(f'Square off plan: {plan}')
+        return PreparedSquareOff(records, plan, self.__exit_legs__(plan.exits), datetime.now())
+
+    def fire(self, prepared: PreparedSquareOff, final_read: bool = False):
+        """Sends the cancels and the exits, the exits of a symbol follow its cancels
+
+        Args:
+            final_read (bool): positions are read along with the cancels and the exits are
+                capped to them, for a snapshot that was prepared ahead of the fire
+        """
+        start = time.monotonic()
+        end = start + self.deadline
+        self.first_exit_at = None
+
+        positions = self.__submit__(self.fv.get_positions) if final_read else None
+        read_end = min(end, start + SquareOffEngine.FINAL_READ_DEADLINE)
+        futures = dict()
+        cancels_of = dict()
+        for item in prepared.plan.cancels:
+            fn = {'CANCEL_ORDER': self.__cancel_order__, 'EXIT_BO': self.__exit_bo__,
+                  'CANCEL_GTT': self.__cancel_gtt__}[item.kind]
+            future = self.__submit__(fn, item.ref)
+            futures[future] = item
+            cancels_of.setdefault(item.tsym, []).append(future)
+        exit_qty_of = dict()
+        offset_of = dict()
+        for item, posn in prepared.exit_legs:
+            if (posn.tsym in cancels_of or final_read) and posn.tsym not in exit_qty_of:
+                exit_qty_of[posn.tsym] = self.__submit__(self.__exit_qty__, posn, cancels_of.get(posn.tsym), end,
+                                                         positions, read_end)
+            offset = offset_of.get(posn.tsym, 0)
+            offset_of[posn.tsym] = offset + item.qty
+            futures[self.__submit__(self.__exit_leg__, posn, item.qty, exit_qty_of.get(posn.tsym), offset)] = item
+
+        report = SquareOffReport([], [], [], 0.0)
+        done, not_done = concurrent.futures.wait(futures, timeout=max(0.0, end - time.monotonic()))
+        for future in done:
+            item = futures[future]
+            try:
+                ok = future.result()
+            except Exception as e:
+                logger.info(f'{item} Exception: {e}')
+                ok = False
+            (report.done if ok else report.failed).append(item)
+        # still running, the result is not known by the deadline
+        report.unfinished.extend(futures[future] for future in not_done)
+
+        first_exit = None if self.first_exit_at is None else self.first_exit_at - start
+        report = report._replace(elapsed=time.monotonic() - start, first_exit=first_exit)
+        log = logger.info if report.complete else logger.warning
+        log(f'Square off in {report.elapsed:.3f} secs, done: {len(report.done)} failed: {report.failed} '
+            f'unfinished: {report.unfinished}')
+        return report
+
+    def run(self, records: pd.DataFrame):
+        start = time.monotonic()
+        prepared = self.prepare(records)
+        if prepared is None:
+            return SquareOffReport([], [SqOffItem('SNAPSHOT', '')], [], time.monotonic() - start)
+        report = self.fire(prepared)
+        return report._replace(elapsed=time.monotonic() - start)
+
+
+class AutoSquareOff(object):
+    PREARM_SECS = 30.0
+    REFRESH_SECS = 2.0   # snapshot refresh while armed
+    FINAL_LEAD = 0.5     # secs, the last refresh is started at least this much before the time
+
+    def __init__(self, tiu, fetch_records: Callable, sq_off_time: datetime,
+                 prearm_secs: float = PREARM_SECS, refresh_secs: float = REFRESH_SECS, scheduler=None):
+        """
+        Args:
+            tiu (Tiu): trading session
+            fetch_records (Callable): orders of the book keeper, None if there are none
+            sq_off_time (datetime): time of the square off
+            prearm_secs (float): the snapshot and the exit legs are prepared this much ahead
+            scheduler (Scheduler): the application scheduler if None
+        """
+        self.tiu = tiu
+        self.fetch_records = fetch_records
+        self.sq_off_time = sq_off_time
+        self.prearm_secs = prearm_secs
+        self.refresh_secs = refresh_secs
+        self.scheduler = scheduler
+        self.jobs = []
+        self.lock = threading.Lock()
+        self.done_evt = threading.Event()
+        self.fire_at = None
+        self.prepared = None
+        self.report = None
+        self.lag = None  # secs, actual time - scheduled time
+
+    def start(self):
+        if self.scheduler is None:
+            self.scheduler = app_utils.get_scheduler()
+        clock = self.scheduler.clock
+        fire_at = clock.at(self.sq_off_time)
+        if fire_at <= clock.now():
+            logger.debug('Auto square off is not armed, as time has elapsed')
+            return False
+        self.fire_at = fire_at
+        # refreshes are REST calls on the background lane, the fire is on time on the order lane
+        self.jobs = [self.scheduler.every(self.refresh_secs, self.__refresh__, name='SQ_OFF_REFRESH', lane=BG_IO,
+                                          start=max(clock.now(), fire_at - self.prearm_secs),
+                                          until=fire_at - AutoSquareOff.FINAL_LEAD),
+                     self.scheduler.call_at(fire_at, self.__fire__, name='SQ_OFF', lane=ORDER, precise=True)]
+        logger.info(f'Auto square off at {self.sq_off_time.time()}, prepared {self.prearm_secs} secs ahead')
+        return True
+
+    def stop(self):
+        for job in self.jobs:
+            job.cancel()
+        self.done_evt.set()
+
+    def is_alive(self):
+        return self.fire_at is not None and not self.done_evt.is_set()
+
+    def wait(self, timeout: float = None):
+        """True once the square off is done or stopped"""
+        return self.done_evt.wait(timeout)
+
+    def __prepare__(self):
+        df = self.fetch_records()
+        records = None if df is None else self.tiu.square_off_records(df)
+        if records is None:
+            return None
+        return self.tiu.prepare_square_off(records)
+
+    def __refresh__(self):
+        prepared = self.__prepare__()
+        with self.lock:
+            self.prepared = prepared
+
+    def __fire__(self):
+        try:
+            self.lag = self.scheduler.clock.now() - self.fire_at
+            with self.lock:
+                prepared = self.prepared
+            logger.info(f'{datetime.now().time()} !! Auto Square Off Time !!')
+
+            if prepared is not None:
+                # the snapshot is up to a refresh old, the exits are capped to a final position read
+                self.report = self.tiu.fire_square_off(prepared, final_read=True)
+                first_exit = self.report.first_exit
+                logger.info(f'Auto square off lag: {self.lag * 1000:.3f} ms, first exit order: '
+                            f'{"-" if first_exit is None else f"{(self.lag + first_exit) * 1000:.3f} ms"} '
+                            f'after the time, snapshot of {prepared.prepared_at.time()}')
+
+            # orders recorded after the last snapshot
+            df = self.fetch_records()
+            records = None if df is None else self.tiu.square_off_records(df)
+            if records is not None and prepared is not None:
+                records = records[~records['Order_ID'].isin(prepared.records['Order_ID'])]
+            if records is not None and len(records):
+                logger.info(f'Auto square off of {len(records)} orders after the snapshot')
+                self.report = self.tiu.square_off_position(records)
+            elif prepared is None:
+                logger.info(f'Auto square off lag: {self.lag * 1000:.3f} ms, no position to square off')
+        finally:
+            self.done_evt.set()
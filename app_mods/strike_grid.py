@@ -0,0 +1,140 @@
+"""
+File: strike_grid.py
+Author: [Tarakeshwar NC]
+Date: April 6, 2024
+Description:  This script discovers the strike interval per (underlying, expiry) from
+the NFO symbol index. Listed strikes are not always evenly spaced (far OTM strikes are
+usually wider apart), so the grid is kept as segments of constant spacing. Grids are
+computed once with numpy and served from memory.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/6"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    import threading
+
+    import numpy as np
+
+    from .symbol_index import SymbolIndex
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+
+class StrikeGrid(object):
+    def __init__(self, symbol: str, expiry: str, strikes: np.ndarray):
+        self.symbol = symbol
+        self.expiry = expiry
+        self.strikes = np.unique(np.asarray(strikes, dtype=np.float64))
+
+        diffs = np.diff(self.strikes)
+        if len(diffs):
+            # a new segment starts wherever the spacing changes
+            brk = np.flatnonzero(np.diff(diffs)) + 1
+            starts = np.concatenate(([0], brk))
+            self.seg_start = self.strikes[starts]
+            self.seg_step = diffs[starts]
+            self.interval = float(diffs.min())
+        else:
+            self.seg_start = self.strikes[:1]
+            self.seg_step = np.zeros(len(self.strikes))
+            self.interval = None
+
+    def __len__(self):
+        return len(self.strikes)
+
+    def __str__(self):
+        if not len(self.strikes):
+            return f'{self.symbol} {self.expiry}: empty'
+        segs = ', '.join(f'{start:.0f}+{step:.0f}' for start, step in zip(self.seg_start, self.seg_step))
+        return f'{self.symbol} {self.expiry}: interval {self.interval} segments [{segs}]'
+
+    def is_uniform(self):
+        return len(self.seg_step) <= 1
+
+    def step_at(self, price: float):
+        """Strike spacing of the segment that contains price"""
+        if not len(self.seg_step):
+            return None
+        i = int(np.searchsorted(self.seg_start, price, side='right')) - 1
+        i = min(max(i, 0), len(self.seg_step) - 1)
+        return float(self.seg_step[i])
+
+    def nearest(self, price: float, offset: int = 0):
+        """Listed strike nearest to price moved by offset listed strikes.
+        On a tie the higher strike is used.
+
+        Returns:
+            float: strike, None if outside the grid
+        """
+        n = len(self.strikes)
+        if not n:
+            return None
+        i = int(np.searchsorted(self.strikes, price))
+        if i >= n:
+            i = n - 1
+        elif i > 0 and abs(price - self.strikes[i - 1]) < abs(price - self.strikes[i]):
+            i = i - 1
+        i += int(offset or 0)
+        if i < 0 or i >= n:
+            return None
+        return float(self.strikes[i])
+
+
+class StrikeGridService(object):
+    def __init__(self, sym_index: SymbolIndex = None):
+        self.sym_index = sym_index
+        self.grids = dict()
+        self.lock = threading.Lock()
+
+    def __build__(self, symbol, expiry):
+        records = self.sym_index.records
+        mask = ((records['symbol'] == symbol.encode()) & (records['expiry'] == expiry.encode()) &
+                np.isin(records['optt'], (b'CE', b'PE')))
+        return StrikeGrid(symbol, expiry, records['strike'][mask])
+
+    def get(self, symbol: str, expiry: str):
+        """
+        Returns:
+            StrikeGrid: grid of the pair, None if no options are listed
+        """
+        key = (symbol, expiry.upper())
+        grid = self.grids.get(key)
+        if grid is None and self.sym_index is not None:
+            with self.lock:
+                grid = self.grids.get(key)
+                if grid is None:
+                    grid = self.__build__(*key)
+                    logger.debug(str(grid))
+                    self.grids[key] = grid
+        if grid is None or not len(grid):
+            return None
+        return grid
+
+    def interval(self, symbol: str, expiry: str, price: float = None):
+        """Strike interval of the pair. With price, the spacing around the price."""
+        grid = self.get(symbol, expiry)
+        if grid is None:
+            return None
+        return grid.interval if price is None else grid.step_at(price)
@@ -0,0 +1,214 @@
+"""
+File: strike_ladder.py
+Author: [Tarakeshwar NC]
+Date: April 9, 2024
+Description:  This script keeps the order details of the configured instruments ready
+ahead of the click. For option instruments a ladder of ATM +/- N strikes is resolved
+(token, trading symbol, lot size, tick size and freeze qty) and moved along as the
+underlying crosses strike boundaries. The ladder legs are also subscribed on the
+websocket, so the option ltp is read from the feed. Updates are driven by the
+underlying ticks of WS_WrapU and done on a background thread.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/9"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    import threading
+    from typing import NamedTuple
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+
+class LadderLeg(NamedTuple):
+    strike: float
+    optt: str
+    token: str
+    tsym: str
+    ls: int
+    ti: float
+    frz_qty: int
+
+
+class LadderSnapshot(NamedTuple):
+    atm: int    # index of the ATM strike in the option chain, -1 for cash instruments
+    legs: dict  # (chain index, 'C'/'P') -> LadderLeg, (-1, None) for cash instruments
+
+
+class StrikeLadderPrefetcher(object):
+    N_STRIKES = 2
+
+    def __init__(self, tiu, ws_wrap=None, n_strikes: int = N_STRIKES):
+        """
+        Args:
+            tiu (Tiu): used for the option chains and the security info
+            ws_wrap (WS_WrapU): feed of the underlying, ladder legs are subscribed on it
+            n_strikes (int): strikes kept on either side of ATM
+        """
+        self.tiu = tiu
+        self.ws_wrap = ws_wrap
+        self.n_strikes = n_strikes
+        self.instruments = dict()   # underlying token -> [(exchange, symbol, expiry)]
+        self.ladders = dict()       # (exchange, symbol, expiry) -> LadderSnapshot
+        self.frz_qty = dict()       # token -> freeze qty
+        self.pending = dict()       # (exchange, symbol, expiry) -> ltp
+        self.lock = threading.Lock()
+        self.evt = threading.Event()
+        self.stop_evt = threading.Event()
+        self.th = None
+
+    @staticmethod
+    def key(exchange, symbol, expiry=None):
+        return (exchange, symbol, expiry.upper() if exchange == 'NFO' and expiry else None)
+
+    def add_instrument(self, ul_token, exchange: str, symbol: str, expiry: str = None):
+        key = StrikeLadderPrefetcher.key(exchange, symbol, expiry)
+        self.instruments.setdefault(str(ul_token), []).append(key)
+        if exchange == 'NSE':
+            # cash instruments do not move with the underlying, prepared once
+            with self.lock:
+                self.pending[key] = None
+            self.evt.set()
+
+    def start(self):
+        if self.ws_wrap is not None:
+            self.ws_wrap.add_tick_listener(self.on_tick)
+        self.th = threading.Thread(target=self.__run__, name='STRIKE_LADDER', daemon=True)
+        self.th.start()
+
+    def stop(self):
+        self.stop_evt.set()
+        self.evt.set()
+
+    def on_tick(self, token, ltp):
+        """Called on the feed thread, only checks for a strike boundary crossing"""
+        keys = self.instruments.get(str(token))
+        if not keys:
+            return
+        for key in keys:
+            if key[0] != 'NFO':
+                continue
+            snapshot = self.ladders.get(key)
+            chain = self.tiu.get_option_chain_index(key[1], key[2]) if snapshot is not None else None
+            if chain is not None and chain.atm_index(ltp) == snapshot.atm:
+                continue
+            with self.lock:
+                self.pending[key] = ltp
+            self.evt.set()
+
+    def __run__(self):
+        while not self.stop_evt.is_set():
+            self.evt.wait()
+            self.evt.clear()
+            with self.lock:
+                pending, self.pending = self.pending, dict()
+            for key, ltp in pending.items():
+                try:
+                    self.__refresh__(key, ltp)
+                except Exception as e:
+                    logger.error(f'Ladder refresh failed {key}: {e}')
+                    logger.debug(traceback.format_exc())
+
+    def __get_frz_qty__(self, exchange, token, tsym):
+        frz_qty = self.frz_qty.get(token)
+        if frz_qty is None:
+            r = self.tiu.get_security_info(exchange=exchange, symbol=tsym, token=token)
+            if isinstance(r, dict) and 'frzqty' in r:
+                frz_qty = self.frz_qty[token] = int(r['frzqty'])
+        return frz_qty
+
+    def __refresh__(self, key, ltp):
+        exchange, symbol, expiry = key
+        if exchange == 'NSE':
+            token, tsym = self.tiu.search_scrip(exchange=exchange, symbol=symbol)
+            if tsym is None:
+                return
+            _, ti, ls = self.tiu.fetch_ltp(exchange, token)
+            if ti is None:
+                return
+            leg = LadderLeg(None, None, token, tsym, int(ls), ti, self.__get_frz_qty__(exchange, token, tsym))
+            self.ladders[key] = LadderSnapshot(-1, {(-1, None): leg})
+            self.__subscribe__(exchange, [token])
+            logger.info(f'Prepared {symbol}: {leg}')
+            return
+
+        chain = self.tiu.get_option_chain_index(symbol, expiry)
+        if chain is None or ltp is None:
+            return
+        atm = chain.atm_index(ltp)
+        prev = self.ladders.get(key)
+        prev_legs = prev.legs if prev is not None else {}
+        # security info of the new legs in one parallel batch
+        new_legs = [chain.leg_at(i, optt) for i in range(atm - self.n_strikes, atm + self.n_strikes + 1)
+                    for optt in ('C', 'P') if (i, optt) not in prev_legs]
+        self.tiu.fill_security_info(exchange, [leg.token for leg in new_legs if leg is not None])
+        legs = dict()
+        for i in range(atm - self.n_strikes, atm + self.n_strikes + 1):
+            for optt in ('C', 'P'):
+                leg = prev_legs.get((i, optt))
+                if leg is None:
+                    opt_leg = chain.leg_at(i, optt)
+                    if opt_leg is None:
+                        continue
+                    frz_qty = self.__get_frz_qty__(exchange, opt_leg.token, opt_leg.tsym)
+                    leg = LadderLeg(*opt_leg, frz_qty)
+                legs[(i, optt)] = leg
+        # readers see either the old or the new ladder, never a partial one
+        self.ladders[key] = LadderSnapshot(atm, legs)
+        self.__subscribe__(exchange, [leg.token for leg in legs.values()])
+        # strikes out of the window are not fed any more
+        dropped = [leg.token for i, leg in prev_legs.items() if i not in legs]
+        if dropped and self.ws_wrap is not None:
+            self.ws_wrap.unsubscribe_tokens(exchange, dropped)
+        logger.debug(f'{symbol} {expiry} ladder ATM {chain.strikes[atm]:.0f} legs: {len(legs)}')
+
+    def __subscribe__(self, exchange, tokens):
+        if self.ws_wrap is not None:
+            self.ws_wrap.subscribe_tokens(exchange, tokens)
+
+    def get(self, exchange: str, symbol: str, expiry: str = None, ltp: float = None,
+            optt: str = None, offset: int = 0):
+        """Prepared leg for the click, None if it is not in the ladder.
+
+        Args:
+            ltp (float): underlying ltp, picks the ATM strike
+            optt (str): 'C' or 'P' for options
+            offset (int): strikes away from ATM
+        """
+        key = StrikeLadderPrefetcher.key(exchange, symbol, expiry)
+        snapshot = self.ladders.get(key)
+        if snapshot is None:
+            return None
+        if exchange == 'NSE':
+            return snapshot.legs.get((-1, None))
+        chain = self.tiu.get_option_chain_index(symbol, expiry)
+        if chain is None or ltp is None:
+            return None
+        return snapshot.legs.get((chain.atm_index(ltp) + int(offset or 0), optt[0]))
+
+    def get_ltp(self, token):
+        """ltp from the feed, None if no tick is received yet or it is stale"""
+        if self.ws_wrap is None:
+            return None
+        return self.ws_wrap.get_ltp(token)
@@ -0,0 +1,152 @@
+"""
+File: symbol_cache.py
+Author: [Tarakeshwar NC]
+Date: April 8, 2024
+Description:  This script provides the symbol resolution cache shared by TIU and DIU.
+Results of (exchange, symbol) -> (token, tsym) lookups are kept in a bounded LRU map
+that is cleared when the trading day changes. Misses are cached as well, for a shorter
+time, so repeated lookups of an unknown symbol do not go to the broker every time.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/8"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    import threading
+    import time
+    from collections import OrderedDict
+    from datetime import datetime, timedelta
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+
+class SymbolCache(object):
+    MAX_SIZE = 1024
+    NEGATIVE_TTL = 300.0  # secs
+
+    def __init__(self, max_size: int = MAX_SIZE, negative_ttl: float = NEGATIVE_TTL,
+                 refresh_time: str = "08:45"):
+        """
+        Args:
+            max_size (int): number of entries kept, least recently used ones are dropped
+            negative_ttl (float): seconds a miss is remembered
+            refresh_time (str): entries made before this time belong to the previous trading day
+        """
+        self.max_size = max_size
+        self.negative_ttl = negative_ttl
+        self.refresh_time = datetime.strptime(refresh_time, "%H:%M").time()
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.day = self.trading_day()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def trading_day(self, ts: datetime = None):
+        if ts is None:
+            ts = datetime.now()
+        day = ts.date()
+        if ts.time() < self.refresh_time:
+            day = day - timedelta(days=1)
+        return day
+
+    @staticmethod
+    def key(exchange, symbol):
+        return (exchange.upper(), symbol.upper())
+
+    def __check_day__(self):
+        day = self.trading_day()
+        if day != self.day:
+            logger.info(f'Trading day changed {self.day} -> {day}, clearing {len(self.entries)} symbols')
+            self.entries.clear()
+            self.day = day
+
+    def get(self, exchange: str, symbol: str):
+        """
+        Returns:
+            tuple: (found, value). value is (token, tsym), None for a cached miss.
+        """
+        key = SymbolCache.key(exchange, symbol)
+        with self.lock:
+            self.__check_day__()
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expiry = entry
+                if expiry is None or expiry > time.monotonic():
+                    self.entries.move_to_end(key)
+                    if value is None:
+                        self.negative_hits += 1
+                    else:
+                        self.hits += 1
+                    return True, value
+                del self.entries[key]
+            self.misses += 1
+        return False, None
+
+    def put(self, exchange: str, symbol: str, value):
+        """value: (token, tsym), None to remember a miss"""
+        key = SymbolCache.key(exchange, symbol)
+        expiry = None if value is not None else time.monotonic() + self.negative_ttl
+        with self.lock:
+            self.__check_day__()
+            self.entries[key] = (value, expiry)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def resolve(self, exchange: str, symbol: str, resolver):
+        """Cached value, resolver(exchange, symbol) on a miss.
+        resolver returns (token, tsym), tsym None when the symbol is unknown, None when the
+        lookup failed (no reply, expired session, throttling). Only unknown symbols are
+        remembered, a failed lookup is tried again on the next call.
+
+        Returns:
+            tuple: (token, tsym), (None, None) when the symbol is unknown or the lookup failed
+        """
+        found, value = self.get(exchange, symbol)
+        if not found:
+            resolved = resolver(exchange, symbol)
+            if resolved is None:
+                return (None, None)
+            token, tsym = resolved
+            value = (token, tsym) if tsym is not None else None
+            self.put(exchange, symbol, value)
+        return value if value is not None else (None, None)
+
+    def invalidate(self, exchange: str = None, symbol: str = None):
+        with self.lock:
+            if exchange is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(SymbolCache.key(exchange, symbol), None)
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'negative_hits': self.negative_hits,
+                    'misses': self.misses, 'evictions': self.evictions}
@@ -0,0 +1,196 @@
+"""
+File: symbol_index.py
+Author: [Tarakeshwar NC]
+Date: April 2, 2024
+Description:  This script provides a memory mapped index over the downloaded
+scrip master files (NSE_symbols.txt / NFO_symbols.txt).
+The index is built once a day from the text file and saved as a numpy file.
+Afterwards it is opened in mmap mode and lookups are plain dictionary accesses.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/2"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+import app_utils
+
+logger = app_utils.get_logger(__name__)
+
+try:
+    import os
+    from typing import NamedTuple
+
+    import numpy as np
+    import pandas as pd
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+
+# Fixed width record stored in the index file. Widths are comfortably above
+# the longest values seen in the finvasia scrip masters.
+SYM_REC_DTYPE = np.dtype([('exch', 'S4'),
+                          ('token', 'i8'),
+                          ('ls', 'i4'),
+                          ('symbol', 'S40'),
+                          ('tsym', 'S40'),
+                          ('expiry', 'S12'),
+                          ('instrument', 'S8'),
+                          ('optt', 'S2'),
+                          ('strike', 'f8'),
+                          ('ti', 'f8')])
+
+NSE_COLUMNS = ['Exchange', 'Token', 'LotSize', 'Symbol', 'TradingSymbol', 'Instrument', 'TickSize']
+NFO_COLUMNS = ['Exchange', 'Token', 'LotSize', 'Symbol', 'TradingSymbol', 'Expiry', 'Instrument',
+               'OptionType', 'StrikePrice', 'TickSize']
+
+
+class SymRecord(NamedTuple):
+    exch: str
+    token: int
+    ls: int
+    symbol: str
+    tsym: str
+    expiry: str
+    instrument: str
+    optt: str
+    strike: float
+    ti: float
+
+
+class SymbolIndex(object):
+    def __init__(self, exchange: str, records: np.ndarray):
+        self.exchange = exchange
+        self.records = records
+
+        symbols = records['symbol'].astype('U').tolist()
+        tsyms = records['tsym'].astype('U').tolist()
+        tokens = records['token'].tolist()
+
+        # first occurrence wins, same as the earlier line by line scan
+        self._token_map = dict()
+        self._tsym_map = dict()
+        self._name_map = dict()
+        for i, (token, tsym, symbol) in enumerate(zip(tokens, tsyms, symbols)):
+            self._token_map.setdefault(token, i)
+            self._tsym_map.setdefault(tsym, i)
+            self._name_map.setdefault(tsym, i)
+            self._name_map.setdefault(symbol, i)
+
+        self._contract_map = dict()
+        if exchange == 'NFO':
+            expiries = records['expiry'].astype('U').tolist()
+            optts = records['optt'].astype('U').tolist()
+            strikes = records['strike'].tolist()
+            for i, key in enumerate(zip(symbols, expiries, strikes, optts)):
+                self._contract_map.setdefault(key, i)
+
+        logger.debug(f'{exchange}: {len(records)} records indexed')
+
+    def __len__(self):
+        return len(self.records)
+
+    @staticmethod
+    def index_file_name(src_file: str):
+        return os.path.splitext(src_file)[0] + '.npy'
+
+    @staticmethod
+    def build(src_file: str, exchange: str):
+        """Parses the scrip master text file and writes the fixed width index file next to it.
+
+        Args:
+            src_file (str): downloaded scrip master file
+            exchange (str): 'NSE' or 'NFO'
+
+        Returns:
+            str: index file name
+        """
+        columns = NFO_COLUMNS if exchange == 'NFO' else NSE_COLUMNS
+        df = pd.read_csv(src_file, sep=',', usecols=columns, dtype=str, keep_default_na=False)
+
+        records = np.zeros(len(df), dtype=SYM_REC_DTYPE)
+        records['exch'] = df['Exchange'].str.strip().to_numpy(dtype='S4')
+        records['token'] = pd.to_numeric(df['Token'], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+        records['ls'] = pd.to_numeric(df['LotSize'], errors='coerce').fillna(1).to_numpy(dtype=np.int32)
+        records['symbol'] = df['Symbol'].str.strip().to_numpy(dtype='S40')
+        records['instrument'] = df['Instrument'].str.strip().to_numpy(dtype='S8')
+        records['ti'] = pd.to_numeric(df['TickSize'], errors='coerce').fillna(0.05).to_numpy(dtype=np.float64)
+
+        tsym = df['TradingSymbol'].str.strip()
+        if exchange == 'NSE':
+            # For NIFTY 50 symbol and trading symbols are interchanged in the NSE_symbols.txt
+            nifty = (df['Symbol'].str.upper() == 'NIFTY 50') | (tsym.str.upper() == 'NIFTY INDEX')
+            records['symbol'][nifty.to_numpy()] = tsym[nifty].to_numpy(dtype='S40')
+            tsym = tsym.mask(nifty, 'Nifty 50')
+        else:
+            records['expiry'] = df['Expiry'].str.strip().to_numpy(dtype='S12')
+            records['optt'] = df['OptionType'].str.strip().to_numpy(dtype='S2')
+            records['strike'] = pd.to_numeric(df['StrikePrice'], errors='coerce').fillna(0.0).to_numpy(dtype=np.float64)
+        records['tsym'] = tsym.to_numpy(dtype='S40')
+
+        idx_file = SymbolIndex.index_file_name(src_file)
+        np.save(idx_file, records, allow_pickle=False)
+        logger.info(f'{exchange} symbol index created: {idx_file} records: {len(records)}')
+        return idx_file
+
+    @classmethod
+    def load(cls, src_file: str, exchange: str):
+        """Opens the index for the given scrip master file. The index is rebuilt
+        only if it is missing or older than the scrip master file.
+
+        Returns:
+            SymbolIndex: index, None if the scrip master is not available
+        """
+        idx_file = cls.index_file_name(src_file)
+        try:
+            if not os.path.exists(idx_file) or \
+               (os.path.exists(src_file) and os.path.getmtime(idx_file) < os.path.getmtime(src_file)):
+                if not os.path.exists(src_file):
+                    return None
+                cls.build(src_file, exchange)
+            records = np.load(idx_file, mmap_mode='r', allow_pickle=False)
+        except Exception as e:
+            logger.error(f'Unable to load symbol index {idx_file}: {e}')
+            logger.debug(traceback.format_exc())
+            return None
+        return cls(exchange, records)
+
+    def __record__(self, i):
+        if i is None:
+            return None
+        r = self.records[i]
+        return SymRecord(exch=r['exch'].decode(), token=int(r['token']), ls=int(r['ls']),
+                         symbol=r['symbol'].decode(), tsym=r['tsym'].decode(),
+                         expiry=r['expiry'].decode(), instrument=r['instrument'].decode(),
+                         optt=r['optt'].decode(), strike=float(r['strike']), ti=float(r['ti']))
+
+    def at(self, i: int):
+        return self.__record__(i)
+
+    def by_token(self, token):
+        return self.__record__(self._token_map.get(int(token)))
+
+    def by_tsym(self, tsym: str):
+        return self.__record__(self._tsym_map.get(tsym))
+
+    def by_name(self, name: str):
+        """symbol or trading symbol match, as used for NSE searches"""
+        return self.__record__(self._name_map.get(name))
+
+    def by_contract(self, symbol: str, expiry: str, strike: float, optt: str):
+        return self.__record__(self._contract_map.get((symbol, expiry, float(strike), optt)))
@@ -44,7 +44,13 @@ try:
     import requests
     import yaml
 
-    from . import fv_api_extender, shared_classes, ws_wrap
+    from app_utils.exec_service import BG_IO, ORDER
+
+    from . import fv_api_extender, rate_limiter, shared_classes, ws_wrap
+    from .margin_state import MarginState
+    from .sec_info_cache import SecurityInfoCache
+    from .sq_off import SquareOffEngine
+    from .symbol_cache import SymbolCache
 except Exception as e:
     logger.debug(traceback.format_exc())
     logger.error(("Import Error " + str(e)))
@@ -73,6 +79,8 @@ class Biu_CreateConfig(NamedTuple):
     notifier: None  # =None
     save_tokenfile_cfg: bool  # =False
     save_token_file: str  # ='../../Finvasia_login/temp/tarak_token_new.json'
+    api_host: str = None  # Noren REST host, Shoonya if None
+    ws_endpoint: str = None  # Noren websocket endpoint, Shoonya if None
 
 
 class Diu_CreateConfig(Biu_CreateConfig):
@@ -84,6 +92,9 @@ class Tiu_CreateConfig(Biu_CreateConfig):
 
 
 class BaseIU (object):
+    # shared by TIU and DIU
+    sym_cache = SymbolCache()
+
     def __init__(self, bcc: Biu_CreateConfig):
         self.notifier = bcc.notifier
         self.cred_file = bcc.cred_file
@@ -96,7 +107,9 @@ class BaseIU (object):
         self.df = None
         usefile = True if bcc.dl_filepath else False
         dl_file = True if bcc.dl_filepath else False
-        self.fv = fv_api_extender.ShoonyaApiPy(dl_file=dl_file, use_file=usefile, dl_filepath=bcc.dl_filepath)
+        self.fv = fv_api_extender.ShoonyaApiPy(dl_file=dl_file, use_file=usefile, dl_filepath=bcc.dl_filepath,
+                                               host=bcc.api_host or fv_api_extender.ShoonyaApiPy.API_HOST,
+                                               websocket=bcc.ws_endpoint or fv_api_extender.ShoonyaApiPy.WS_ENDPOINT)
         fv = self.fv
 
         with open(bcc.cred_file) as f:
@@ -172,7 +185,22 @@ class BaseIU (object):
             ret = fv.set_session(userid=cred['userId'], password=cred['pwd'], usertoken=bcc.susertoken)
             logger.debug(f'ret: {ret}')
 
+    @staticmethod
+    def __is_no_data__(ret):
+        """reply of the broker for a symbol it does not have"""
+        return isinstance(ret, dict) and ret.get('stat') == 'Not_Ok' and 'no data' in str(ret.get('emsg', '')).lower()
+
     def __search_sym_token_tsym__(self, symbol, exchange='NSE'):
+        r = self.__lookup_sym_token_tsym__(symbol, exchange=exchange)
+        token, tsym = r if r is not None else (None, None)
+        return (str(token), tsym)
+
+    def __lookup_sym_token_tsym__(self, symbol, exchange='NSE'):
+        """
+        Returns:
+            tuple: (token, tsym), tsym None if the broker does not have the symbol,
+                None if the lookup failed (no reply, expired session, throttling)
+        """
         fv = self.fv
 
         if symbol == 'NIFTY':
@@ -184,21 +212,30 @@ class BaseIU (object):
             symbol = "".join(re.findall("[a-zA-Z0-9-_&]+", symbol)).upper()
             search_text = (symbol + '-EQ') if exchange == 'NSE' else symbol
 
-        ret = fv.searchscrip(exchange=exchange, searchtext=search_text)
+        ret = fv.searchscrip(exchange=exchange, searchtext=search_text, reply_on_miss=True)
 
         logger.debug(ret)
 
-        token = tsym = None
-        if ret is not None and ret['stat'] == 'Ok' and isinstance(ret['values'], list):
-            token = ret['values'][0]['token']
-            tsym = ret['values'][0]['tsym']
-        else:
-            logger.debug('Not found in -EQ, Trying in -BE')
-            ret = fv.searchscrip(exchange=exchange, searchtext=(symbol + '-BE'))
-            if ret is not None and isinstance(ret, list):
-                token = ret['values'][0]['token']
-                tsym = ret['values'][0]['tsym']
+        if isinstance(ret, dict) and ret.get('stat') == 'Ok' and isinstance(ret.get('values'), list):
+            return (ret['values'][0]['token'], ret['values'][0]['tsym'])
+        if not BaseIU.__is_no_data__(ret):
+            logger.info(f'Symbol lookup of {search_text} failed: {ret}')
+            return None
+
+        logger.debug('Not found in -EQ, Trying in -BE')
+        ret = fv.searchscrip(exchange=exchange, searchtext=(symbol + '-BE'), reply_on_miss=True)
+        if isinstance(ret, dict) and ret.get('stat') == 'Ok' and isinstance(ret.get('values'), list):
+            return (ret['values'][0]['token'], ret['values'][0]['tsym'])
+        if not BaseIU.__is_no_data__(ret):
+            logger.info(f'Symbol lookup of {symbol}-BE failed: {ret}')
+            return None
+        return (None, None)
 
+    def __cached_sym_token_tsym__(self, symbol, exchange='NSE'):
+        def resolver(exchange, symbol):
+            return self.__lookup_sym_token_tsym__(symbol, exchange=exchange)
+
+        token, tsym = BaseIU.sym_cache.resolve(exchange, symbol, resolver)
         return (str(token), tsym)
 
 
@@ -206,7 +243,7 @@ class Diu (BaseIU):
     def __init__(self, dcc: Diu_CreateConfig):
         super().__init__(dcc)
 
-        token, tsym = self.__search_sym_token_tsym__(symbol='NIFTY')
+        token, tsym = self.__cached_sym_token_tsym__(symbol='NIFTY')
         self._ul_symbol = {'symbol': 'NIFTY',
                            'token': token}
         logger.debug(f'{json.dumps(self._ul_symbol, indent=2)}')
@@ -225,13 +262,17 @@ class Diu (BaseIU):
     @ul_symbol.setter
     def ul_symbol(self, ul_symbol):
         self._ul_symbol['symbol'] = ul_symbol
-        token, _ = self.__search_sym_token_tsym__(symbol=ul_symbol)
+        token, _ = self.__cached_sym_token_tsym__(symbol=ul_symbol)
         self._ul_symbol['token'] = token
         logger.debug(f'{json.dumps(self._ul_symbol, indent=2)}')
 
     def get_latest_tick(self):
         return self.ws_wrap.get_latest_tick(self._ul_symbol['token']).c
 
+    def get_ul_token(self, ul_symbol):
+        token, _ = self.__cached_sym_token_tsym__(symbol=ul_symbol)
+        return token
+
     def disconnect_data_feed_servers(self):
         self.ws_wrap.disconnect_data_feed_servers()
 
@@ -239,16 +280,12 @@ class Diu (BaseIU):
         fv = self.fv
 
         for symbol in symbol_list:
-            symbol_row = self.df[self.df['Symbol'] == symbol.upper()]
             fname = os.path.join(output_directory, f'{symbol.upper()}.csv')
 
-            token = None
             use_alternate_server = False
 
-            if not symbol_row.empty:
-                # Accessing token based on the symbol
-                token = symbol_row['Token'].values[0]
-            if token is not None:
+            token, tsym = self.__cached_sym_token_tsym__(symbol.upper())
+            if tsym is not None:
                 lastBusDay = datetime.datetime.today()
                 lastBusDay = lastBusDay.replace(hour=0, minute=0, second=0, microsecond=0)
                 if datetime.date.weekday(lastBusDay) == 5:  # if it's Saturday
@@ -355,10 +392,10 @@ class Diu (BaseIU):
     def download_data_parallel(self, symbol_list, output_directory, tf):
         if self.use_pool:
             logger.info('Fetching data in parallel...')
-            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                futures = [executor.submit(self.fetch_data, [symbol], output_directory, tf) for symbol in symbol_list]
-                # Wait for all tasks to complete
-                concurrent.futures.wait(futures)
+            exec_service = app_utils.get_exec_service()
+            futures = [exec_service.submit(BG_IO, self.fetch_data, [symbol], output_directory, tf) for symbol in symbol_list]
+            # Wait for all tasks to complete
+            concurrent.futures.wait(futures)
         else:
             for symbol in symbol_list:
                 self.fetch_data([symbol], output_directory=output_directory, tf=tf)
@@ -367,13 +404,23 @@ class Diu (BaseIU):
 class Tiu (BaseIU):
     CONFIRM_COUNT = 10
     CONFIRM_SLEEP_PERIOD = 0.3
+    CONFIRM_EVENT_DEADLINE = 1.0  # secs, wait for the pushed order update before polling
     SQ_OFF_FAILURE_COUNT = 2
 
     def __init__(self, tcc: Tiu_CreateConfig):
         super().__init__(tcc)
+        # freeze qty, lot size and tick size do not change during the day
+        self.sec_info = SecurityInfoCache(tcc.dl_filepath)
+        self.margin_job = None
+        # set when the order updates of this account are on a websocket
+        self.order_events = None
+        # optional AsyncOrderEngine, orders are placed by the thread pools below if None
+        self.order_engine = None
         self.__post_init__()
 
     def __post_init__(self):
+        # data feed may be of another account, its order updates are filtered
+        self.margin = MarginState(actid=self.fv.shoonya_accountid)
         try:
             self.fv_amount_in_ac = self.fv_ac_balance()
         except ValueError:
@@ -388,16 +435,35 @@ class Tiu (BaseIU):
     def compact_search_file(self, symbol_expdate_pairs):
         self.fv.compact_search_file(symbol_expdate_pairs)
 
+    def create_option_chains(self, symbol_expdate_pairs):
+        for symbol, expdate in symbol_expdate_pairs:
+            chain = self.fv.get_option_chain_index(symbol, expdate)
+            logger.info(f'Option chain: {chain}')
+            grid = self.fv.get_strike_grid(symbol, expdate)
+            logger.info(f'Strike grid: {grid}')
+
+    def get_option_chain_index(self, symbol, expdate):
+        return self.fv.get_option_chain_index(symbol, expdate)
+
+    def get_strike_grid(self, symbol, expdate):
+        return self.fv.get_strike_grid(symbol, expdate)
+
     def get_security_info(self, exchange, symbol, token=None):
 
         if token is None:
             token, tsym = self.__search_sym_token_tsym__(exchange=exchange, symbol=symbol)
 
         if token:
-            return self.fv.get_security_info(exchange=exchange, token=str(token))
+            return self.fetch_security_info(exchange=exchange, token=str(token))
         else:
             return None
 
+    def fill_security_info(self, exchange, tokens):
+        return self.sec_info.fill(exchange, tokens, self.__fetch_security_info__)
+
+    def __fetch_security_info__(self, exchange, token):
+        return self.fv.get_security_info(exchange=exchange, token=token)
+
     def get_broker_obj(self):
         return self.fv
 
@@ -415,21 +481,39 @@ class Tiu (BaseIU):
                 raise ValueError
         logger.debug(json.dumps(acct_limits, indent=2))
 
-        self._amount_in_ac = locale.atof(acct_limits["cash"]) + locale.atof(acct_limits["payin"]) + locale.atof(acct_limits["unclearedcash"])
-        try:
-            self._used_margin = locale.atof(acct_limits['marginused'])
-        except Exception:
-            self._used_margin = float(0.0)
+        snapshot = self.margin.reconcile(acct_limits)
+        self._amount_in_ac = snapshot.cash
+        self._used_margin = snapshot.used
 
         return self._amount_in_ac
 
+    def __reconcile_margin__(self):
+        try:
+            acct_limits = self.fv.get_limits()
+            if isinstance(acct_limits, dict) and acct_limits.get('stat') == 'Ok':
+                self.margin.reconcile(acct_limits)
+            else:
+                logger.debug(f'get_limits failed: {acct_limits}')
+        except Exception as e:
+            logger.debug(f'Margin reconciliation failed: {e}')
+
+    def start_margin_refresh(self, interval: float = MarginState.REFRESH_INTERVAL):
+        """Reconciles the margin with get_limits every interval secs, on the background lane"""
+        self.margin_job = app_utils.get_scheduler().every(interval, self.__reconcile_margin__,
+                                                          name='MARGIN_REFRESH', lane=BG_IO)
+
+    def stop_margin_refresh(self):
+        if self.margin_job is not None:
+            self.margin_job.cancel()
+
     def get_usable_margin(self):
-        return (self._amount_in_ac - self._used_margin)
+        # margin state snapshot, no rest call on the order path
+        return self.margin.avlble_margin
 
     avlble_margin = property(get_usable_margin, None, None)
 
-    def get_strike_diff(self):
-        return (self.fv.get_strike_diff())
+    def get_strike_diff(self, symbol=None, expdate=None, price=None):
+        return (self.fv.get_strike_diff(symbol, expdate, price))
 
     strike_diff = property(get_strike_diff, None, None)
 
@@ -529,25 +613,9 @@ class Tiu (BaseIU):
             return None
 
     def search_scrip(self, exchange, symbol):
-        tsym = token = None
-
-        if self.df is not None:
-            try:
-                stock_row = self.df[self.df['Symbol'] == symbol.upper()]
-                if not stock_row.empty:
-                    # Accessing token based on the symbol
-                    token = stock_row['Token'].values[0]
-                    tsym = stock_row['Tsym'].values[0]
-            except Exception:
-                ...
-            else:
-                ...
-        if tsym is None and token is None:
-            logger.info(f'searching symbol in the file : {symbol} ')
-            token, tsym = self.__search_sym_token_tsym__(symbol, exchange=exchange)
-
-            logger.info(f'token: {token} tsym: {tsym}')
-        return (str(token), tsym)
+        token, tsym = self.__cached_sym_token_tsym__(symbol, exchange=exchange)
+        logger.debug(f'token: {token} tsym: {tsym} cache: {BaseIU.sym_cache.stats()}')
+        return (token, tsym)
 
     def create_sym_token_tsym_q_access(self, symbol_list=None, instruments=None):
         symbol_data = []
@@ -557,7 +625,7 @@ class Tiu (BaseIU):
         if symbol_list:
             # Iterate through the symbol list and get tsym and token for each symbol
             for symbol in symbol_list:
-                token, tsym = self.__search_sym_token_tsym__(symbol)
+                token, tsym = self.__cached_sym_token_tsym__(symbol)
                 tsym_data.append(tsym)
                 token_data.append(str(token))
                 symbol_data.append(symbol)
@@ -567,7 +635,7 @@ class Tiu (BaseIU):
                 logger.debug(f"Symbol: {symbol}")
                 symbol = info['SYMBOL']
                 if info['EXCHANGE'] == 'NSE':
-                    token, tsym = self.__search_sym_token_tsym__(symbol)
+                    token, tsym = self.__cached_sym_token_tsym__(symbol)
                     tsym_data.append(tsym)
                     token_data.append(str(token))
                     symbol_data.append(symbol)
@@ -591,9 +659,7 @@ class Tiu (BaseIU):
             return None, None, None
 
     def fetch_security_info(self, exchange, token):
-        fv = self.fv
-        r = fv.get_security_info(exchange=exchange, token=token)
-        return r
+        return self.sec_info.resolve(exchange, token, self.__fetch_security_info__)
 
     def get_enabled_gtts(self):
         return self.fv.get_enabled_gtts()
@@ -601,6 +667,22 @@ class Tiu (BaseIU):
     def get_pending_gtt_order(self):
         return self.fv.get_pending_gtt_order()
 
+    def __get_order_state__(self, order_id, check_cnt: int):
+        """Final state of the order if it is pushed on the websocket in time,
+        else the state polled from the order history."""
+        with app_utils.get_tracer().span('CONFIRM_POLL'):
+            if self.order_events is not None and self.order_events.live:
+                wait = Tiu.CONFIRM_EVENT_DEADLINE if check_cnt == 0 else Tiu.CONFIRM_SLEEP_PERIOD
+                r_os_dict = self.order_events.wait(order_id, wait)
+                if r_os_dict is not None:
+                    return r_os_dict
+            elif check_cnt:
+                time.sleep(Tiu.CONFIRM_SLEEP_PERIOD)
+
+            r_os_list = self.fv.single_order_history(order_id)
+            # Shoonya gives a list for all status of order, we are interested in first one
+            return r_os_list[0]
+
     def place_and_confirm_tez_order(self, orders: List[Union[shared_classes.I_B_MKT_Order, shared_classes.I_S_MKT_Order,
                                                              shared_classes.BO_B_MKT_Order,
                                                              shared_classes.Combi_Primary_B_MKT_And_OCO_S_MKT_I_Order_NSE,
@@ -608,6 +690,11 @@ class Tiu (BaseIU):
                                                              shared_classes.Combi_Primary_S_MKT_And_OCO_B_MKT_I_Order_NSE]],
                                     tag: str | None = None, use_gtt_oco=False):
 
+        if self.order_engine is not None:
+            return self.order_engine.place_and_confirm_tez_order(orders, tag=tag, use_gtt_oco=use_gtt_oco)
+
+        tracer = app_utils.get_tracer()
+
         def process_result(order, r):
             nonlocal self
             status = Tiu_OrderStatus.HARD_FAILURE
@@ -625,10 +712,7 @@ class Tiu (BaseIU):
                     reason2 = "margin"
                     reason3 = 'RMS: Auto Square Off Block'.lower()  # TO BE TESTED
                     for check_cnt in range(0, Tiu.CONFIRM_COUNT):
-                        r_os_list = self.fv.single_order_history(order_id)
-
-                        # Shoonya gives a list for all status of order, we are interested in first one
-                        r_os_dict = r_os_list[0]
+                        r_os_dict = self.__get_order_state__(order_id, check_cnt)
 
                         # Different stages of the order
                         # PENDING
@@ -643,7 +727,7 @@ class Tiu (BaseIU):
                         logger.info(f'{tag}: order_id: {order_id} order status: {r_os_dict["status"]}')
 
                         if r_os_dict['status'].lower() == 'rejected':
-                            rej_reason = r_os_dict['rejreason'].lower()
+                            rej_reason = r_os_dict.get('rejreason', '').lower()
                             if rej_reason.find(reason1) != -1:
                                 status = Tiu_OrderStatus.SOFT_FAILURE_REJRMS
                                 break
@@ -662,7 +746,7 @@ class Tiu (BaseIU):
                             if r_os_dict["status"].lower() == "complete":
                                 avg_price = float(r_os_dict['avgprc'])
                                 order_id = r_os_dict['norenordno']
-                                fill_timestamp = r_os_dict['exch_tm']
+                                fill_timestamp = r_os_dict.get('exch_tm')
                                 if filled_qty == qty:
                                     ord_status.avg_price = avg_price
                                     ord_status.trantype = order.buy_or_sell
@@ -680,8 +764,7 @@ class Tiu (BaseIU):
                                 ...
                             else:
                                 ...
-                            logger.debug(f'{tag}: {check_cnt}: {unfilled_qty} Sleeping for {Tiu.CONFIRM_SLEEP_PERIOD} secs')
-                        time.sleep(Tiu.CONFIRM_SLEEP_PERIOD)
+                            logger.debug(f'{tag}: {check_cnt}: {unfilled_qty} Waiting for {Tiu.CONFIRM_SLEEP_PERIOD} secs')
                     else:  # This else is included with the FOR statement above
                         # Not filled even after few secs.
                         cancel_r_dict = self.fv.cancel_order(order_id)
@@ -742,18 +825,19 @@ class Tiu (BaseIU):
                 order = order.primary_order
 
             logger.debug(f'placing {order.buy_or_sell} order {order}')
-            r = self.fv.place_order(buy_or_sell=order.buy_or_sell,
-                                    product_type=order.product_type,
-                                    exchange=order.exchange,
-                                    tradingsymbol=order.tradingsymbol,
-                                    quantity=order.quantity, discloseqty=0,
-                                    trigger_price=order.trigger_price,
-                                    price=order.price,
-                                    price_type=order.price_type,
-                                    bookloss_price=order.book_loss_price,
-                                    bookprofit_price=order.book_profit_price,
-                                    trail_price=0.0,  # trail_price should be 0 for finvasia.
-                                    retention=order.retention, remarks=order.remarks)
+            with tracer.span('PLACE_ORDER'):
+                r = self.fv.place_order(buy_or_sell=order.buy_or_sell,
+                                        product_type=order.product_type,
+                                        exchange=order.exchange,
+                                        tradingsymbol=order.tradingsymbol,
+                                        quantity=order.quantity, discloseqty=0,
+                                        trigger_price=order.trigger_price,
+                                        price=order.price,
+                                        price_type=order.price_type,
+                                        bookloss_price=order.book_loss_price,
+                                        bookprofit_price=order.book_profit_price,
+                                        trail_price=0.0,  # trail_price should be 0 for finvasia.
+                                        retention=order.retention, remarks=order.remarks)
 
             r_tuple = process_result(order=order, r=r)
             return r_tuple
@@ -773,18 +857,19 @@ class Tiu (BaseIU):
 
                 # logger.info(f'placing {f_order.buy_or_sell} order: {order} f_order order {f_order}')
 
-                r = self.fv.place_gtt_oco_order(buy_or_sell=f_order.buy_or_sell,
-                                                product_type=f_order.product_type,
-                                                exchange=f_order.exchange,
-                                                tradingsymbol=f_order.tradingsymbol,
-                                                book_loss_alert_price=f_order.book_loss_alert_price,
-                                                book_loss_price=f_order.book_loss_price,
-                                                book_loss_price_type=f_order.price_type,
-                                                book_profit_alert_price=f_order.book_profit_alert_price,
-                                                book_profit_price=f_order.book_profit_price,
-                                                book_profit_price_type=f_order.price_type,
-                                                quantity=quantity,
-                                                remarks=remarks)
+                with tracer.span('OCO_PLACE'):
+                    r = self.fv.place_gtt_oco_order(buy_or_sell=f_order.buy_or_sell,
+                                                    product_type=f_order.product_type,
+                                                    exchange=f_order.exchange,
+                                                    tradingsymbol=f_order.tradingsymbol,
+                                                    book_loss_alert_price=f_order.book_loss_alert_price,
+                                                    book_loss_price=f_order.book_loss_price,
+                                                    book_loss_price_type=f_order.price_type,
+                                                    book_profit_alert_price=f_order.book_profit_alert_price,
+                                                    book_profit_price=f_order.book_profit_price,
+                                                    book_profit_price_type=f_order.price_type,
+                                                    quantity=quantity,
+                                                    remarks=remarks)
                 ord_status = shared_classes.OrderStatus()
                 if r is not None:
                     if r['stat'] == 'Not_Ok':
@@ -799,18 +884,34 @@ class Tiu (BaseIU):
 
                 return status, ord_status
 
+        def place_leg(com_order):
+            """Primary order of the leg and, as soon as it is filled, its OCO.
+            A filled leg does not wait for the other legs to be protected."""
+            r_tuple = place_ind_order(com_order)
+            oco_r_tuple = None
+            status, ord_status = r_tuple
+            if use_gtt_oco and status == Tiu_OrderStatus.SUCCESS:
+                com_order.order_id = ord_status.order_id
+                try:
+                    oco_r_tuple = place_ind_oco_order((com_order, r_tuple))
+                except Exception as e:
+                    logger.error(f"OCO exception for item {com_order}: {e}")
+                    logger.error(traceback.format_exc())
+                    oco_r_tuple = e
+            return r_tuple, oco_r_tuple
+
         resp_exception = 0
         resp_ok = 0
         result = []
-        oco_tuple_list = []
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            futures = {executor.submit(place_ind_order, order): order for order in orders}
+        # long lived order lane, no threads are created on the click
+        exec_service = app_utils.get_exec_service()
+        futures = {exec_service.submit(ORDER, place_leg, order): order for order in orders}
 
         for future in concurrent.futures.as_completed(futures):
             order = futures[future]
             try:
-                r_tuple = future.result()
+                r_tuple, oco_r_tuple = future.result()
                 result.append(r_tuple)
             except Exception as e:
                 logger.error(f"Exception for item {order}: {e}")
@@ -821,212 +922,53 @@ class Tiu (BaseIU):
                 if status == Tiu_OrderStatus.SUCCESS:
                     resp_ok = resp_ok + 1
                     order.order_id = ord_status.order_id
-                    oco_order = (order, r_tuple)
                     logger.info(f'{ord_status}')
-                    oco_tuple_list.append(oco_order)
 
-        if use_gtt_oco:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                futures = {executor.submit(place_ind_oco_order, oco_tuple): oco_tuple for oco_tuple in oco_tuple_list}
-
-            for future in concurrent.futures.as_completed(futures):
-                oco_tuple = futures[future]
-                try:
-                    r_tuple = future.result()
-                except Exception as e:
-                    logger.error(f"Exception for item {oco_tuple}: {e}")
-                    logger.error(traceback.format_exc())
+                if isinstance(oco_r_tuple, Exception):
                     resp_exception = resp_exception + 1
-                else:
-                    status, ord_status = r_tuple
+                elif oco_r_tuple is not None:
+                    status, ord_status = oco_r_tuple
                     if status == Tiu_OrderStatus.SUCCESS:
                         resp_ok = resp_ok + 1
-                        order, r_tuple = oco_tuple
                         order.al_id = ord_status.al_id
 
         return resp_exception, resp_ok, result
 
-    def square_off_position(self, df: pd.DataFrame, symbol=None):
-        fv = self.fv
-
+    @staticmethod
+    def square_off_records(df: pd.DataFrame, symbol=None):
+        """Recorded orders to square off, None if there are none"""
         try:
             df_filtered = df[(df['Qty'] != 0) & (df['Status'] == 'SUCCESS')]
+            if symbol:
+                df_filtered = df_filtered[df_filtered['TradingSymbol_Token'].str.startswith(symbol)]
         except Exception:
             logger.info('No position to Square off')
-            return
-        else:
-            ...
-
-        if symbol:
-            try:
-                df_filtered = df_filtered[df_filtered['TradingSymbol_Token'].str.startswith(symbol)]
-            except Exception:
-                logger.info('No position to Square off')
-                return
-            else:
-                ...
-        try:
-            order_id_list = df_filtered['Order_ID'].tolist()
-        except TypeError:
+            return None
+        if not len(df_filtered):
             logger.info('No order to square off')
-            return
-
-        r = fv.get_order_book()
-        if r is not None and isinstance(r, list):
-            order_book_df = pd.DataFrame(r)
-            try:
-                filtered_df = order_book_df[order_book_df['norenordno'].isin(order_id_list)]
-                logger.debug(f'\n{filtered_df.to_string()}')
-            except Exception as e:
-                logger.debug(f'Exception : {e}')
-            else:
-                for index, row in filtered_df.iterrows():
-                    status = row['status'].lower()
-                    if status == 'open' or status == 'pending' or status == 'trigger_pending':
-                        fv.cancel_order(row['norenordno'])
-
-            # order_book_df remains intact even after filtered df, so can be reused.
-            try:
-                filtered_df = order_book_df[order_book_df['snonum'].isin(order_id_list)]
-                logger.debug(f'\n{filtered_df.to_string()}')
-            except Exception as e:
-                logger.debug(f'Exception : {e}')
-            else:
-                for index, row in filtered_df.iterrows():
-                    if '-EQ' in row['tsym']:
-                        status = row['status'].lower()
-                        if (status == 'open' or status == 'pending' or status == 'trigger_pending') and int(row['snoordt']) == 0:
-                            r = fv.exit_order(row['snonum'], 'B')
-                            if r is None:
-                                logger.info("Exit order result is None. Check Manually")
-                            if 'stat' in r and r['stat'] == 'Ok':
-                                logger.debug(f'child order of {row["norenordno"]} : {row["snonum"]}, status: {json.dumps (r, indent=2)}')
-                            else:
-                                logger.info('Exit order Failed, Check Manually')
-        else:
-            logger.info('get_order_book Failed, Check Manually')
-            return
-
-        r = self.fv.get_pending_gtt_order()
-
-        if r is not None and isinstance(r, list):
-            gtt_p_df = pd.DataFrame(r)
-            logger.debug(f'\n{gtt_p_df}')
-            try:
-                alert_id_list = df_filtered['OCO_Alert_ID'].tolist()
-            except Exception as e:
-                logger.debug(f'Exception : {e}')
-            else:
-                # Check oco order pending ..
-                # if there are orders still open ..cancel the orders
-                if gtt_p_df is not None and len(gtt_p_df):
-                    for alert_id in alert_id_list:
-                        if not pd.isna(alert_id) and alert_id in gtt_p_df['al_id'].values:
-                            logger.debug(f'cancelling al_id : {alert_id}')
-                            r = self.fv.cancel_gtt_order(al_id=str(alert_id))
-                            if r is not None and isinstance(r, dict):
-                                if 'emsg' in r:
-                                    logger.debug(f'alert_id: {alert_id} : {r["emsg"]}')
-                                if alert_id == r['al_id'] and r['stat'] == "OI deleted":
-                                    logger.debug(f'alert id {alert_id} cancellation success')
-
-        # Important
-        # if the gtt orders are triggered, there will be pending orders
-        # In this project, all OCO orders are triggered at market. So, there will not be any pending OCO triggered orders.
-        # But, to ensure OCO orders are complete or have hit a terminal state, need to do some thing.
-        # e.g, filter the orders that have remarks 'TEZ' parent order-id which is in the order_id_list, cancel those.
-
-        try:
-            sum_qty_by_symbol = df_filtered.groupby('TradingSymbol_Token')['Qty'].sum().reset_index()
-        except Exception as e:
-            logger.info(f'Not able to sum qty by symbol: {e}')
-            return
-
-        r = fv.get_positions()
-        if r is not None and isinstance(r, list):
-            posn_df = pd.DataFrame(r)
-            posn_df.loc[posn_df['prd'] == 'I', 'netqty'] = posn_df.loc[posn_df['prd'] == 'I', 'netqty'].apply(lambda x: int(x))
-            posn_df = posn_df.loc[(posn_df['prd'] == 'I')]
-
-        for index, row in sum_qty_by_symbol.iterrows():
-            symbol = row['TradingSymbol_Token']
-            token = symbol.split('_')[1]
-            tsym = symbol.split('_')[0]
-            rec_qty = row['Qty']
-            if len(posn_df):
-                try:
-                    posn_qty = posn_df.loc[posn_df['token'] == str(token), 'netqty'].values[0]
-                except IndexError:
-                    posn_qty = 0
-                else:
-                    ...
-            else:
-                posn_qty = 0
-            net_qty = abs(posn_qty)
-
-            # It is possible that manually, user could do following:
-            # case 1: nothing
-            #         System finds the net quantity is equal to the recorded qty and proceeds
-            #         if rec_qty is +ve, it should sell else buy
-            # case 2: square off partially
-            #         Recorded qty > net_qty,   so, in this case square off remaining qty.
-            #         rem_qty = min(abs(rec_qty), net_qty)
-            #         example1 : rec_qty = 8,  net_qty = 6  exit_qty = 6
-            #         example2 : rec_qty = -8,  net_qty = -6  exit_qty = 6
-            # case 3: square off fully
-            #         net_qty is 0, so nothing should be done.
-            # case 4: Taken additional qty.
-            #         Now, it is user's responsibility to manually exit the extra position.
-            #         System would square off only those, which it has triggered.
-            #         rem_qty = min(abs(rec_qty), net_qty)
-            #         example1 : rec_qty = 8,  net_qty = 10   exit_qty = 8
-            #         example2 : rec_qty = -8,  net_qty = -10  exit_qty = 8
-            #         example3 : rec_qty = 8,   net_qty = -10, exit_qty = 8 sell
-            #         example4 : rec_qty = -8,   net_qty = +10, exit_qty = 8 buy
-
-            if net_qty > 0:
-                # exit the position
-                # important, rec_qty and net_qty should be both +ve values.
-                exit_qty = min(abs(rec_qty), net_qty)
-                logger.info(f'exit qty:{exit_qty}')
-                exch = 'NSE' if '-EQ' in tsym else 'NFO'
-                # Very Important:  Following should use frz_qty for breaking order into slices
-                r = self.fv.get_security_info(exchange=exch, token=token)
-                logger.debug(f'{json.dumps(r, indent=2)}')
-
-                frz_qty = None
-                if isinstance(r, dict) and 'frzqty' in r:
-                    frz_qty = int(r['frzqty'])
-                else:
-                    frz_qty = exit_qty+1
-
-                if isinstance(r, dict) and 'ls' in r:
-                    ls = int(r['ls'])  # lot size
-                else:
-                    ls = 1
-
-                failure_cnt = 0
-                buy_or_sell = 'S' if rec_qty > 0 else 'B'
-                while (exit_qty and failure_cnt <= Tiu.SQ_OFF_FAILURE_COUNT):
-                    per_leg_exit_qty = frz_qty if exit_qty > frz_qty else exit_qty
-                    per_leg_exit_qty = int(per_leg_exit_qty / ls) * ls
-                    r = self.fv.place_order(buy_or_sell, product_type='I', exchange=exch, tradingsymbol=tsym,
-                                            quantity=per_leg_exit_qty, price_type='MKT', discloseqty=0.0)
-
-                    if r is None or r['stat'] == 'Not_Ok':
-                        logger.info(f'Exit order Failed:  {r["emsg"]}')
-                        failure_cnt += 1
-                    else:
-                        logger.info(f'Exit Order Attempt success:: order id  : {r["norenordno"]}')
-                        order_id = r["norenordno"]
-                        r_os_list = self.fv.single_order_history(order_id)
-                        # Shoonya gives a list for all status of order, we are interested in first one
-                        r_os_dict = r_os_list[0]
-                        if r_os_dict["status"].lower() == "complete":
-                            logger.info(f'Exit order Complete: order_id: {order_id}')
-                        else:
-                            logger.info(f'Exit order InComplete: order_id: {order_id} Check Manually')
-                        exit_qty -= per_leg_exit_qty
+            return None
+        return df_filtered
+
+    def prepare_square_off(self, records: pd.DataFrame):
+        """Snapshot and exit legs of the square off of the records, nothing is sent"""
+        with rate_limiter.priority(rate_limiter.SQ_OFF):
+            return SquareOffEngine(self, failure_count=Tiu.SQ_OFF_FAILURE_COUNT).prepare(records)
+
+    def fire_square_off(self, prepared, deadline: float = SquareOffEngine.DEADLINE, final_read: bool = False):
+        with rate_limiter.priority(rate_limiter.SQ_OFF):
+            return SquareOffEngine(self, deadline=deadline,
+                                   failure_count=Tiu.SQ_OFF_FAILURE_COUNT).fire(prepared, final_read=final_read)
+
+    def square_off_position(self, df: pd.DataFrame, symbol=None, deadline: float = SquareOffEngine.DEADLINE):
+        """Squares off the positions of the recorded orders.
+
+        Returns:
+            SquareOffReport: done, failed and unfinished items, None if there is nothing to square off
+        """
+        df_filtered = Tiu.square_off_records(df, symbol)
+        if df_filtered is None:
+            return None
 
-                if failure_cnt > 2 or exit_qty:
-                    logger.info(f'Exit order InComplete: order_id: {order_id} Check Manually')
+        # broker calls of the square off are served ahead of the background queries
+        with rate_limiter.priority(rate_limiter.SQ_OFF):
+            return SquareOffEngine(self, deadline=deadline, failure_count=Tiu.SQ_OFF_FAILURE_COUNT).run(df_filtered)
@@ -31,10 +31,9 @@ logger = app_utils.get_logger(__name__)
 
 try:
     import json
-    from datetime import datetime
     from sre_constants import FAILURE, SUCCESS
     from threading import Lock
-    from time import mktime
+    from time import mktime, monotonic
 
     import pyotp
     import yaml
@@ -57,6 +56,7 @@ class WS_WrapU(object):
     NIFTY_TOKEN = None
     NIFTY_BANK_TOKEN = None
     DEBUG = False
+    MAX_TICK_AGE = 5.0  # secs, an older ltp is not used
 
     def __init__(self,
                  port_cfg: SimpleDataPort = None,
@@ -67,7 +67,8 @@ class WS_WrapU(object):
                  sec: str = None,
                  mo: str = "09:15", mc: str = "15:30",
                  tr: None = None,
-                 notifier=None):
+                 notifier=None,
+                 max_tick_age: float = MAX_TICK_AGE):
         logger.debug("WebSocket Wrapper Unit initialization ...")
 
         self.lock = Lock()
@@ -79,19 +80,7 @@ class WS_WrapU(object):
         self._fv_connected = False
 
         self.port: SimpleDataPort = port_cfg
-        mo_hr = datetime.strptime(mo, "%H:%M").hour
-        mo_min = datetime.strptime(mo, "%H:%M").minute
-        mc_hr = datetime.strptime(mc, "%H:%M").hour
-        mc_min = datetime.strptime(mc, "%H:%M").minute
-
-        mo_today = datetime.now().replace(hour=mo_hr, minute=mo_min, second=0, microsecond=0)
-        mc_today = datetime.now().replace(hour=mc_hr, minute=mc_min, second=0, microsecond=0)
-
-        mo_epoch = int(mktime(mo_today.timetuple()))
-        mc_epoch = int(mktime(mc_today.timetuple()))
-
-        self.mo_epoch = mo_epoch
-        self.mc_epoch = mc_epoch
+        self.calendar = app_utils.MarketCalendar(mo, mc)
 
         self.primary = primary
         self.sec = sec
@@ -180,6 +169,9 @@ class WS_WrapU(object):
 
         self.com_ohlc_data = list()
         self.fv_token_port_map: dict = dict()
+        self.max_tick_age = max_tick_age
+        self.tick_at = dict()        # token -> monotonic time of its last tick
+        self.stale_tokens = set()    # tokens warned about, until their next tick
 
         if fv is not None:
             self.fv_ws_tokens = list()
@@ -210,8 +202,72 @@ class WS_WrapU(object):
         self.tr = tr
         self.notifier = notifier
 
+        self.tick_listeners = list()
+        self.order_update_listeners = list()
+
         return
 
+    @property
+    def mo_epoch(self):
+        return int(mktime(self.calendar.open_at().timetuple()))
+
+    @property
+    def mc_epoch(self):
+        return int(mktime(self.calendar.close_at().timetuple()))
+
+    def add_tick_listener(self, listener):
+        """listener(token: str, ltp: float) is called on the feed thread for every tick"""
+        self.tick_listeners.append(listener)
+
+    def add_order_update_listener(self, listener):
+        """listener(msg: dict) is called on the feed thread for every order update"""
+        self.order_update_listeners.append(listener)
+
+    def subscribe_tokens(self, exch: str, tokens: list):
+        """Adds tokens to the feed, new ones are subscribed if the feed is connected"""
+        new_ws_tokens = list()
+        with self.lock:
+            for token in tokens:
+                token = str(token)
+                if token in self.fv_token_port_map:
+                    continue
+                live_data: TickData = TickData()
+                live_data.tk = int(token)
+                self.fv_token_port_map[token] = live_data
+                self.fv_dyn_tokens.append(token)
+                self.fv_dyn_ws_tokens.append(f'{exch}|{token}')
+                new_ws_tokens.append(f'{exch}|{token}')
+            # subscribed on the next connect
+            self.fv_ws_tokens.extend(new_ws_tokens)
+        if new_ws_tokens and self._fv_connected:
+            logger.debug(f'subscribing {new_ws_tokens}')
+            # kept in the subscription of a reconnect of the feed monitor
+            self.fv.add_streamingdata(new_ws_tokens)
+            self.fv.subscribe(new_ws_tokens)
+
+    def unsubscribe_tokens(self, exch: str, tokens: list):
+        """Removes tokens added by subscribe_tokens, the base feed is kept"""
+        old_ws_tokens = list()
+        with self.lock:
+            for token in tokens:
+                token = str(token)
+                if token not in self.fv_dyn_tokens:
+                    continue
+                ws_token = f'{exch}|{token}'
+                self.fv_dyn_tokens.remove(token)
+                if ws_token in self.fv_dyn_ws_tokens:
+                    self.fv_dyn_ws_tokens.remove(ws_token)
+                if ws_token in self.fv_ws_tokens:
+                    self.fv_ws_tokens.remove(ws_token)
+                self.fv_token_port_map.pop(token, None)
+                self.tick_at.pop(token, None)
+                self.stale_tokens.discard(token)
+                old_ws_tokens.append(ws_token)
+        if old_ws_tokens and self._fv_connected:
+            logger.debug(f'unsubscribing {old_ws_tokens}')
+            self.fv.remove_streamingdata(old_ws_tokens)
+            self.fv.unsubscribe(old_ws_tokens)
+
     # getter
     def __get_send_data__(self):
         logger.debug("Getting Data Send")
@@ -243,20 +299,31 @@ class WS_WrapU(object):
             logger.debug("Connected")
             self.fv_socket_opened = True
 
-        def app_close():  # Socket open callback function
+        def app_close():  # Socket close callback function
             logger.debug("closing")
             self.fv_socket_opened = False
 
+        def app_error(error):  # Socket error callback function
+            # no updates are expected till the socket is open again, a message received says it is
+            logger.debug(f"error: {error}")
+            self.fv_socket_opened = False
+
         def app_event_handler_quote_update(msg):
             # print (msg)
+            self.fv_socket_opened = True
             tick_data = msg
             if 'lp' in tick_data and 'tk' in tick_data:
                 fv_token = tick_data['tk']
                 if WS_WrapU.DEBUG:
                     fv_token = '26000'
-                ohlc_obj: TickData = self.fv_token_port_map[fv_token]
+                ohlc_obj: TickData = self.fv_token_port_map.get(fv_token)
+                if ohlc_obj is None:
+                    # unsubscribed, tick in flight
+                    return
                 c = float(tick_data['lp'])
                 with self.lock:
+                    self.tick_at[fv_token] = monotonic()
+                    self.stale_tokens.discard(fv_token)
                     if 'o' in tick_data:
                         logger.debug(f'msg: {msg}')
                         o = float(tick_data['o'])
@@ -286,17 +353,30 @@ class WS_WrapU(object):
 
                     ohlc_obj.ft = tick_data['ft']
 
+                for listener in self.tick_listeners:
+                    try:
+                        listener(fv_token, c)
+                    except Exception as e:
+                        logger.error(f'tick listener failed: {e}')
+
             return
 
         def app_event_handler_order_update(msg):
+            self.fv_socket_opened = True
             if self.port is not None:
                 self.port.send_data(msg)
+            for listener in self.order_update_listeners:
+                try:
+                    listener(msg)
+                except Exception as e:
+                    logger.error(f'order update listener failed: {e}')
             return
 
         retval = self.fv.connect_to_datafeed_server(on_message=app_event_handler_quote_update,
                                                     on_order_update=app_event_handler_order_update,
                                                     on_open=app_open,
-                                                    on_close=app_close)
+                                                    on_close=app_close,
+                                                    on_error=app_error)
         return retval
 
     def fv_disconnect_wsfeed(self):
@@ -330,3 +410,19 @@ class WS_WrapU(object):
             token_str = token
         ohlc_obj: TickData = self.fv_token_port_map[token_str]
         return ohlc_obj
+
+    def get_ltp(self, token):
+        """ltp of a subscribed token, None if no tick is received yet or the
+        last tick is older than max_tick_age, the caller falls back to a quote"""
+        token = str(token)
+        ohlc_obj: TickData = self.fv_token_port_map.get(token)
+        if ohlc_obj is None or not ohlc_obj.c:
+            return None
+        tick_at = self.tick_at.get(token)
+        if self.max_tick_age is not None and (tick_at is None or monotonic() - tick_at > self.max_tick_age):
+            if token not in self.stale_tokens:
+                self.stale_tokens.add(token)
+                age = 'no tick' if tick_at is None else f'{monotonic() - tick_at:.1f} secs'
+                logger.warning(f'ltp of {token} is stale ({age}), not used')
+            return None
+        return ohlc_obj.c
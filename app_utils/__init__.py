@@ -3,3 +3,7 @@ from .timer_extn import RepeatTimer
 from .q_extn import (ExtSimpleQueue, ExtQueue)
 from .gen_utils import (convert_to_tv_symbol, round_stock_prec, custom_sleep)
 from .gen_utils import (delete_files_in_folder, create_datafiles_parallel, create_live_data_file, calcRemainingDuration)
+from .dl_cache import ArtifactCache
+from .exec_service import (ExecService, get_exec_service, set_exec_service)
+from .scheduler import (Scheduler, MarketCalendar, FakeClock, get_scheduler, set_scheduler)
+from .tracing import (Tracer, get_tracer, set_tracer)
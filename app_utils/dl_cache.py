@@ -0,0 +1,182 @@
+"""
+File: dl_cache.py
+Author: [Tarakeshwar NC]
+Date: April 4, 2024
+Description: This script provides a local cache for downloaded artifacts such as the
+scrip master zip files. A copy is valid for one trading day. Once the day changes,
+the server is asked conditionally (ETag / Last-Modified) and the content hash decides
+whether the extracted file needs to be written again.
+References:
+https://developer.mozilla.org/en-US/docs/Web/HTTP/Conditional_requests
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/4"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+from . import app_logger
+
+logger = app_logger.get_logger(__name__)
+
+try:
+    import hashlib
+    import json
+    import os
+    import shutil
+    import zipfile
+    from datetime import datetime, timedelta
+
+    import requests
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+
+class ArtifactCache(object):
+    CACHE_FOLDER = 'dl_cache'
+    CHUNK_SIZE = 1 << 20
+    TIMEOUT = (10.0, 60.0)  # connect, read
+
+    def __init__(self, folder: str, refresh_time: str = "08:45"):
+        """
+        Args:
+            folder (str): folder where the final files are kept.
+            refresh_time (str): files published by the broker before this time belong to the previous trading day.
+        """
+        self.folder = folder
+        self.cache_folder = os.path.join(folder, ArtifactCache.CACHE_FOLDER)
+        os.makedirs(self.cache_folder, exist_ok=True)
+        self.refresh_time = datetime.strptime(refresh_time, "%H:%M").time()
+
+    def trading_day(self, ts: datetime = None):
+        if ts is None:
+            ts = datetime.now()
+        day = ts.date()
+        if ts.time() < self.refresh_time:
+            day = day - timedelta(days=1)
+        return day.strftime('%Y%m%d')
+
+    def __meta_file__(self, url):
+        return os.path.join(self.cache_folder, f'{os.path.basename(url)}.json')
+
+    def __artifact_file__(self, url, day):
+        return os.path.join(self.cache_folder, f'{day}_{os.path.basename(url)}')
+
+    def __load_meta__(self, url):
+        try:
+            with open(self.__meta_file__(url), 'r') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def __save_meta__(self, url, meta):
+        with open(self.__meta_file__(url), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    def __extract__(self, artifact, dst_file, member=None):
+        # member is decompressed straight into the final file, no extract and rename.
+        with zipfile.ZipFile(artifact) as zip_ref:
+            if member is None:
+                member = zip_ref.namelist()[0]
+            with zip_ref.open(member) as src, open(dst_file, 'wb') as dst:
+                shutil.copyfileobj(src, dst, ArtifactCache.CHUNK_SIZE)
+        logger.debug(f'{artifact}:{member} -> {dst_file}')
+
+    def is_valid(self, url, dst_file):
+        meta = self.__load_meta__(url)
+        day = self.trading_day()
+        return (meta.get('trading_day') == day and os.path.exists(dst_file) and
+                os.path.exists(self.__artifact_file__(url, day)))
+
+    def fetch(self, url: str, dst_file: str, member: str = None):
+        """Makes dst_file available for the current trading day.
+
+        Args:
+            url (str): url of the zip file
+            dst_file (str): final file name of the extracted member
+            member (str, optional): member of the zip file. Defaults to the first member.
+
+        Returns:
+            bool: True if dst_file is available
+        """
+        day = self.trading_day()
+        if self.is_valid(url, dst_file):
+            logger.debug(f'cache hit: {url} -> {dst_file}')
+            return True
+
+        meta = self.__load_meta__(url)
+        prev_artifact = meta.get('artifact')
+        if prev_artifact is not None:
+            prev_artifact = os.path.join(self.cache_folder, prev_artifact)
+
+        headers = {}
+        if prev_artifact is not None and os.path.exists(prev_artifact):
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        artifact = self.__artifact_file__(url, day)
+        try:
+            with requests.get(url, headers=headers, stream=True, timeout=ArtifactCache.TIMEOUT) as resp:
+                if resp.status_code == 304:
+                    logger.info(f'Not modified: {url}')
+                    if prev_artifact != artifact:
+                        os.replace(prev_artifact, artifact)
+                    if not os.path.exists(dst_file):
+                        self.__extract__(artifact, dst_file, member)
+                else:
+                    resp.raise_for_status()
+                    sha256 = hashlib.sha256()
+                    with open(artifact, 'wb') as f:
+                        for chunk in resp.iter_content(chunk_size=ArtifactCache.CHUNK_SIZE):
+                            sha256.update(chunk)
+                            f.write(chunk)
+                    digest = sha256.hexdigest()
+                    if digest == meta.get('sha256') and os.path.exists(dst_file):
+                        logger.info(f'Content unchanged: {url}')
+                    else:
+                        self.__extract__(artifact, dst_file, member)
+                    meta['sha256'] = digest
+                    meta['etag'] = resp.headers.get('ETag')
+                    meta['last_modified'] = resp.headers.get('Last-Modified')
+        except requests.exceptions.Timeout:
+            logger.debug('requests Timeout exception occured')
+            return False
+        except Exception as e:
+            logger.debug(f'Exception occured: {str(e)}')
+            return False
+
+        meta['url'] = url
+        meta['trading_day'] = day
+        meta['artifact'] = os.path.basename(artifact)
+        meta['fetched_at'] = datetime.now().isoformat(timespec='seconds')
+        self.__save_meta__(url, meta)
+        return True
+
+    def evict(self):
+        """Removes artifacts that do not belong to the current trading day"""
+        day = self.trading_day()
+        for file_name in os.listdir(self.cache_folder):
+            if file_name.endswith('.json'):
+                continue
+            if not file_name.startswith(f'{day}_'):
+                logger.debug(f'Evicting {file_name}')
+                try:
+                    os.remove(os.path.join(self.cache_folder, file_name))
+                except OSError as e:
+                    logger.debug(f'Unable to evict {file_name}: {e}')
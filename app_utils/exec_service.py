@@ -0,0 +1,163 @@
+"""
+File: exec_service.py
+Author: [Tarakeshwar NC]
+Date: April 16, 2024
+Description:  This script provides the application wide executor service. Work is run
+on long lived thread pools, one per lane, so that a click does not pay for creating
+and tearing down threads. Order placement and background I/O have their own lanes,
+background work never queues in front of an order. Threads can be started ahead of
+market open, and queue depth and latency of each lane are recorded.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/16"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+from . import app_logger
+
+logger = app_logger.get_logger(__name__)
+
+try:
+    import concurrent.futures
+    import contextvars
+    import statistics
+    import threading
+    import time
+    from collections import deque
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+ORDER = 'ORDER'
+BG_IO = 'BG_IO'
+LANES = {ORDER: 10, BG_IO: 4}  # lane -> threads
+
+
+class Lane(object):
+    N_SAMPLES = 1000
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.started = 0
+        self.completed = 0
+        self.max_depth = 0
+        self.queue_wait = deque(maxlen=Lane.N_SAMPLES)  # secs from submit to start
+        self.run_time = deque(maxlen=Lane.N_SAMPLES)    # secs from start to end
+
+    @property
+    def depth(self):
+        """tasks waiting for a thread"""
+        return self.submitted - self.started
+
+    def submit(self, fn, *args, **kwargs):
+        submit_time = time.perf_counter()
+        # the task runs in the context of the caller, the trace of the click goes with it
+        ctx = contextvars.copy_context()
+
+        def task():
+            start = time.perf_counter()
+            with self.lock:
+                self.started += 1
+                self.queue_wait.append(start - submit_time)
+            try:
+                return ctx.run(fn, *args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                with self.lock:
+                    self.completed += 1
+                    self.run_time.append(end - start)
+
+        with self.lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self.depth)
+        return self.executor.submit(task)
+
+    def warm(self, timeout: float = 5.0):
+        """Starts all the threads of the lane, idle threads are reused by the pool"""
+        barrier = threading.Barrier(self.max_workers + 1)
+        futures = [self.executor.submit(barrier.wait, timeout) for _ in range(self.max_workers)]
+        barrier.wait(timeout)
+        concurrent.futures.wait(futures)
+
+    def metrics(self):
+        def ms(samples, q):
+            if not samples:
+                return None
+            if q == 'max':
+                return round(max(samples) * 1000, 3)
+            return round(statistics.median(samples) * 1000, 3)
+
+        with self.lock:
+            queue_wait, run_time = list(self.queue_wait), list(self.run_time)
+            return {'submitted': self.submitted, 'completed': self.completed,
+                    'depth': self.depth, 'max_depth': self.max_depth,
+                    'queue_wait_p50_ms': ms(queue_wait, 'p50'), 'queue_wait_max_ms': ms(queue_wait, 'max'),
+                    'run_time_p50_ms': ms(run_time, 'p50'), 'run_time_max_ms': ms(run_time, 'max')}
+
+
+class ExecService(object):
+    def __init__(self, lanes: dict = None):
+        """
+        Args:
+            lanes (dict): lane name -> number of threads
+        """
+        self.lanes = {name: Lane(name, n) for name, n in (lanes or LANES).items()}
+        self.shut_down = False
+
+    def submit(self, lane: str, fn, *args, **kwargs):
+        if self.shut_down:
+            raise RuntimeError('executor service is shut down')
+        return self.lanes[lane].submit(fn, *args, **kwargs)
+
+    def warm(self):
+        for lane in self.lanes.values():
+            lane.warm()
+        logger.info(f'Executor lanes warmed: { {name: lane.max_workers for name, lane in self.lanes.items()} }')
+
+    def metrics(self):
+        return {name: lane.metrics() for name, lane in self.lanes.items()}
+
+    def shutdown(self, wait: bool = True):
+        """No new work, queued background work is dropped, running work is waited for"""
+        self.shut_down = True
+        for name, lane in self.lanes.items():
+            lane.executor.shutdown(wait=wait, cancel_futures=(name != ORDER))
+        logger.info(f'Executor service shut down: {self.metrics()}')
+
+
+_exec_service = None
+_lock = threading.Lock()
+
+
+def get_exec_service():
+    """Application executor service, created on first use if the app has not set one"""
+    global _exec_service
+    with _lock:
+        if _exec_service is None:
+            _exec_service = ExecService()
+        return _exec_service
+
+
+def set_exec_service(exec_service: ExecService):
+    global _exec_service
+    with _lock:
+        _exec_service = exec_service
@@ -35,6 +35,9 @@ try:
     from datetime import datetime
 
     import pandas as pd
+
+    from .exec_service import BG_IO, get_exec_service
+    from .scheduler import sleep_until
 except Exception as e:
     logger.debug(traceback.format_exc())
     logger.error(("Import Error " + str(e)))
@@ -59,19 +62,19 @@ def delete_files_in_folder(folder_path):
     # List all files in the folder
     files = [os.path.join(folder_path, filename) for filename in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, filename))]
 
-    # Use a ThreadPoolExecutor for concurrent file deletion
+    # concurrent file deletion on the background I/O lane
     if len(files):
-        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-            # Create a list of submitted tasks for file deletion
-            tasks = [executor.submit(os.remove, file) for file in files]
+        exec_service = get_exec_service()
+        # Create a list of submitted tasks for file deletion
+        tasks = [exec_service.submit(BG_IO, os.remove, file) for file in files]
 
-            # Wait for all tasks to complete
-            concurrent.futures.wait(tasks)
+        # Wait for all tasks to complete
+        concurrent.futures.wait(tasks)
 
-            # Check for exceptions and handle them if needed
-            for task in tasks:
-                if task.exception():
-                    print(f"Error deleting file: {task.exception()}")
+        # Check for exceptions and handle them if needed
+        for task in tasks:
+            if task.exception():
+                print(f"Error deleting file: {task.exception()}")
 
 
 def create_live_data_file(file, output_directory, nline):
@@ -83,16 +86,17 @@ def create_live_data_file(file, output_directory, nline):
 
 
 def create_datafiles_parallel(file_list, output_directory, nline):
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        tasks = [executor.submit(create_live_data_file, file, output_directory, nline) for file in file_list]
+    exec_service = get_exec_service()
+    tasks = [exec_service.submit(BG_IO, create_live_data_file, file, output_directory, nline)
+             for file in file_list]
 
-        # Wait for all tasks to complete
-        concurrent.futures.wait(tasks)
+    # Wait for all tasks to complete
+    concurrent.futures.wait(tasks)
 
-        # Check for exceptions and handle them if needed
-        for task in tasks:
-            if task.exception():
-                print(f"Error deleting file: {task.exception()}")
+    # Check for exceptions and handle them if needed
+    for task in tasks:
+        if task.exception():
+            print(f"Error deleting file: {task.exception()}")
 
 
 def calcRemainingDuration(hour, minute, second=0):
@@ -109,6 +113,8 @@ def calcRemainingDuration(hour, minute, second=0):
 
 
 def custom_sleep(fut_time, num_chunks=16):
+    """Sleeps till the time of the day, on the monotonic clock. num_chunks is not used anymore,
+    the last ms are spun instead of halving the sleep"""
     now = datetime.now()
 
     if isinstance(fut_time, str):
@@ -119,19 +125,12 @@ def custom_sleep(fut_time, num_chunks=16):
     fut_time = now.replace(hour=l_time.hour, minute=l_time.minute, second=l_time.second, microsecond=0)
 
     logger.debug(f'now : {now} fut_time:{fut_time}')
-    start_time = datetime.now()
-    if fut_time <= start_time:
-        logger.debug(f"endtime:{fut_time} start_time:{start_time}")
+    remaining = (fut_time - now).total_seconds()
+    if remaining <= 0:
+        logger.debug(f"endtime:{fut_time} start_time:{now}")
         return
-    for i in range(num_chunks):
-        remaining_duration = (fut_time - datetime.now()).total_seconds()
-        if remaining_duration <= 0.010:
-            break
-        else:
-            chunk_duration = remaining_duration / 2
-            logger.debug(f'sleeping for chunk_duration : {chunk_duration} secs')
-            time.sleep(chunk_duration)
+    sleep_until(time.monotonic() + remaining)
 
-    logger.debug(f'now : {now} fut_time:{fut_time}')
+    logger.debug(f'now : {datetime.now()} fut_time:{fut_time}')
 # # Usage
 # custom_sleep('09:15:05', 8)  # Sleep until 09:15:05, divided into 8 chunks
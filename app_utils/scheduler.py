@@ -0,0 +1,359 @@
+"""
+File: scheduler.py
+Author: [Tarakeshwar NC]
+Date: April 22, 2024
+Description:  This script provides the application wide scheduler of the time triggered
+actions (market open and close, square off, periodic refreshes). One thread keeps the
+jobs in a heap ordered on the monotonic clock, wall clock changes do not move a job.
+Work that blocks is handed to a lane of the executor service, the scheduler thread is
+free for the next job. The last part of the wait of a precise job is spun, as a sleep
+wakes up late. The delay from the due time to the start of each job is recorded.
+The clock can be replaced with a FakeClock, tests step the jobs without sleeping.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/22"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+from . import app_logger
+
+logger = app_logger.get_logger(__name__)
+
+try:
+    import heapq
+    import itertools
+    import math
+    import statistics
+    import threading
+    import time
+    from collections import deque
+    from datetime import date, datetime, timedelta
+
+    from .exec_service import get_exec_service
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+SPIN_SECS = 0.002  # last part of a precise wait is spun
+
+
+def sleep_until(deadline: float):
+    """Sleeps till the monotonic deadline, the last SPIN_SECS are spun"""
+    remaining = deadline - time.monotonic() - SPIN_SECS
+    if remaining > 0:
+        time.sleep(remaining)
+    while time.monotonic() < deadline:
+        pass
+
+
+class MonotonicClock(object):
+    def now(self):
+        """secs on the monotonic clock"""
+        return time.monotonic()
+
+    def wall(self):
+        return datetime.now()
+
+    def at(self, when: datetime):
+        """monotonic time of the wall clock time"""
+        return self.now() + (when - self.wall()).total_seconds()
+
+
+class FakeClock(MonotonicClock):
+    """Clock of the tests, time moves only with advance()"""
+    def __init__(self, wall: datetime = None):
+        self.t = 0.0
+        self.wall_at_zero = wall if wall is not None else datetime(2024, 4, 22, 9, 0)
+
+    def now(self):
+        return self.t
+
+    def wall(self):
+        return self.wall_at_zero + timedelta(seconds=self.t)
+
+    def advance(self, secs: float):
+        self.t += secs
+
+
+class MarketCalendar(object):
+    def __init__(self, mo: str = "09:15", mc: str = "15:30", holidays=None):
+        """
+        Args:
+            mo (str): market open, HH:MM
+            mc (str): market close, HH:MM
+            holidays (list): trading holidays, date or YYYY-MM-DD
+        """
+        self.mo = datetime.strptime(mo, "%H:%M").time()
+        self.mc = datetime.strptime(mc, "%H:%M").time()
+        self.holidays = {day if isinstance(day, date) else datetime.strptime(str(day), "%Y-%m-%d").date()
+                         for day in (holidays or [])}
+
+    def is_trading_day(self, day: date = None):
+        day = day if day is not None else date.today()
+        return day.weekday() < 5 and day not in self.holidays
+
+    def open_at(self, day: date = None):
+        return datetime.combine(day if day is not None else date.today(), self.mo)
+
+    def close_at(self, day: date = None):
+        return datetime.combine(day if day is not None else date.today(), self.mc)
+
+    def is_open(self, when: datetime = None):
+        when = when if when is not None else datetime.now()
+        return self.is_trading_day(when.date()) and self.open_at(when.date()) <= when < self.close_at(when.date())
+
+    def next_open(self, when: datetime = None):
+        """market open of today if it is ahead, else of the next trading day"""
+        when = when if when is not None else datetime.now()
+        day = when.date()
+        if not self.is_trading_day(day) or when >= self.open_at(day):
+            day += timedelta(days=1)
+            while not self.is_trading_day(day):
+                day += timedelta(days=1)
+        return self.open_at(day)
+
+
+class Job(object):
+    def __init__(self, scheduler, name: str, fn, args, due: float, interval: float = None, until: float = None,
+                 lane: str = None, precise: bool = False, market_hours: bool = False):
+        self.scheduler = scheduler
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.due = due
+        self.interval = interval
+        self.until = until
+        self.lane = lane
+        self.precise = precise
+        self.market_hours = market_hours
+        self.cancelled = False
+        self.runs = 0
+        self.skipped = 0
+        self.lag = None     # secs, start of the last run - its due time
+        self.future = None  # last run handed to the lane
+
+    @property
+    def pending(self):
+        return not self.cancelled and self.due is not None
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+    def __run__(self):
+        try:
+            return self.fn(*self.args)
+        except Exception as e:
+            logger.error(f'Scheduled job {self.name} failed: {e}')
+            logger.debug(traceback.format_exc())
+
+
+class Scheduler(object):
+    N_SAMPLES = 1000
+
+    def __init__(self, clock: MonotonicClock = None, calendar: MarketCalendar = None, exec_service=None):
+        """
+        Args:
+            clock (MonotonicClock): FakeClock in the tests
+            calendar (MarketCalendar): market hours of the market_hours jobs
+            exec_service (ExecService): lanes of the jobs that block, the application service if None
+        """
+        self.clock = clock if clock is not None else MonotonicClock()
+        self.calendar = calendar if calendar is not None else MarketCalendar()
+        self.exec_service = exec_service
+        self.heap = []
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.shut_down = False
+        self.th = None
+        self.jitter = deque(maxlen=Scheduler.N_SAMPLES)  # secs from the due time to the start
+        self.runs = 0
+        self.skipped = 0
+
+    def start(self):
+        self.th = threading.Thread(target=self.__run__, name='SCHEDULER', daemon=True)
+        self.th.start()
+
+    def stop(self):
+        with self.cond:
+            self.shut_down = True
+            self.cond.notify()
+        if self.th is not None and self.th is not threading.current_thread():
+            self.th.join(timeout=1.0)
+        logger.info(f'Scheduler stopped: {self.metrics()}')
+
+    def __push__(self, job: Job):
+        with self.cond:
+            heapq.heappush(self.heap, (job.due, next(self.seq), job))
+            self.cond.notify()
+        return job
+
+    def call_at(self, due: float, fn, *args, name: str = None, lane: str = None, precise: bool = False):
+        """Runs fn once at the monotonic time due"""
+        return self.__push__(Job(self, name or fn.__name__, fn, args, due, lane=lane, precise=precise))
+
+    def call_later(self, delay: float, fn, *args, **kwargs):
+        return self.call_at(self.clock.now() + delay, fn, *args, **kwargs)
+
+    def call_at_time(self, when: datetime, fn, *args, **kwargs):
+        """Runs fn once at the wall clock time, right away if it has elapsed"""
+        return self.call_at(self.clock.at(when), fn, *args, **kwargs)
+
+    def every(self, interval: float, fn, *args, start: float = None, until: float = None, name: str = None,
+              lane: str = None, market_hours: bool = False):
+        """
+        Runs fn every interval secs from the monotonic time start (now + interval if None)
+        till until. A run that is missed is skipped, runs are not bunched up to catch up.
+        A run is skipped as well while the previous run is still on the lane, and outside
+        the market hours of the calendar for market_hours jobs.
+        """
+        due = start if start is not None else self.clock.now() + interval
+        return self.__push__(Job(self, name or fn.__name__, fn, args, due, interval=interval, until=until,
+                                 lane=lane, market_hours=market_hours))
+
+    def cancel(self, job: Job):
+        with self.cond:
+            job.cancelled = True
+            self.cond.notify()
+
+    def __peek__(self):
+        """earliest job, cancelled jobs are dropped on the way"""
+        while self.heap and self.heap[0][2].cancelled:
+            heapq.heappop(self.heap)
+        return self.heap[0] if self.heap else None
+
+    def next_due(self):
+        with self.cond:
+            entry = self.__peek__()
+            return None if entry is None else entry[0]
+
+    def __len__(self):
+        with self.cond:
+            return sum(not job.cancelled for _, _, job in self.heap)
+
+    def __dispatch__(self, job: Job, due: float):
+        now = self.clock.now()
+        if job.market_hours and not self.calendar.is_open(self.clock.wall()):
+            pass
+        elif job.lane is not None and job.future is not None and not job.future.done():
+            job.skipped += 1
+            self.skipped += 1
+        else:
+            job.lag = now - due
+            job.runs += 1
+            self.runs += 1
+            self.jitter.append(job.lag)
+            if job.lane is not None:
+                exec_service = self.exec_service if self.exec_service is not None else get_exec_service()
+                try:
+                    job.future = exec_service.submit(job.lane, job.__run__)
+                except RuntimeError as e:
+                    logger.debug(f'Scheduled job {job.name} is not run: {e}')
+            else:
+                job.__run__()
+
+        if job.interval is None:
+            job.due = None
+            return
+        n_missed = max(0, math.floor((now - due) / job.interval))
+        job.skipped += n_missed
+        self.skipped += n_missed
+        job.due = due + (n_missed + 1) * job.interval
+        if job.until is not None and job.due > job.until:
+            job.due = None
+        elif not job.cancelled:
+            self.__push__(job)
+
+    def run_pending(self):
+        """Runs the jobs that are due on the clock, returns the number of jobs"""
+        n_jobs = 0
+        now = self.clock.now()
+        while True:
+            with self.cond:
+                entry = self.__peek__()
+                if entry is None or entry[0] > now:
+                    break
+                heapq.heappop(self.heap)
+            self.__dispatch__(entry[2], entry[0])
+            n_jobs += 1
+        return n_jobs
+
+    def run_for(self, secs: float):
+        """FakeClock: moves the clock to each due job in turn and runs it, for secs in all"""
+        end = self.clock.now() + secs
+        while True:
+            due = self.next_due()
+            if due is None or due > end:
+                break
+            self.clock.advance(max(0.0, due - self.clock.now()))
+            self.run_pending()
+        self.clock.advance(end - self.clock.now())
+
+    def __run__(self):
+        while True:
+            with self.cond:
+                if self.shut_down:
+                    return
+                entry = self.__peek__()
+                if entry is None:
+                    self.cond.wait()
+                    continue
+                due, _, job = entry
+                wait = due - self.clock.now() - (SPIN_SECS if job.precise else 0.0)
+                if wait > 0:
+                    # a new job or a cancel wakes the thread up
+                    self.cond.wait(wait)
+                    continue
+            if job.precise:
+                while self.clock.now() < due:
+                    pass
+            self.run_pending()
+
+    def metrics(self):
+        def ms(samples, q):
+            if not samples:
+                return None
+            if q == 'max':
+                return round(max(samples) * 1000, 3)
+            if q == 'p99':
+                return round(sorted(samples)[int(0.99 * (len(samples) - 1))] * 1000, 3)
+            return round(statistics.median(samples) * 1000, 3)
+
+        jitter = list(self.jitter)
+        return {'runs': self.runs, 'skipped': self.skipped, 'pending': len(self),
+                'jitter_p50_ms': ms(jitter, 'p50'), 'jitter_p99_ms': ms(jitter, 'p99'),
+                'jitter_max_ms': ms(jitter, 'max')}
+
+
+_scheduler = None
+_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Application scheduler, created and started on first use if the app has not set one"""
+    global _scheduler
+    with _lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+            _scheduler.start()
+        return _scheduler
+
+
+def set_scheduler(scheduler: Scheduler):
+    global _scheduler
+    with _lock:
+        _scheduler = scheduler
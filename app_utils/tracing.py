@@ -0,0 +1,209 @@
+"""
+File: tracing.py
+Author: [Tarakeshwar NC]
+Date: April 23, 2024
+Description:  This script provides the per action latency tracing of the application.
+A click starts a trace, each stage of it (config lookup, symbol resolve, quote, order
+placement, confirm polls, OCO placement, book keeping) records a span with monotonic
+start and end times. Spans are written to a fixed size ring buffer, the slot is taken
+from an atomic counter and no lock is held by the writers, old spans are overwritten.
+The trace id is carried in a context variable, so the spans of the legs run on the
+executor lanes and on the order engine loop belong to the click that started them.
+At shutdown the p50/p95/p99 and the histogram of each stage are logged and exported.
+"""
+# Copyright (c) [2024] [Tarakeshwar N.C]
+# This file is part of the Tiny_TeZ project.
+# It is subject to the terms and conditions of the MIT License.
+# See the file LICENSE in the top-level directory of this distribution
+# for the full text of the license.
+
+__author__ = "Tarakeshwar N.C"
+__copyright__ = "2024"
+__date__ = "2024/4/23"
+__deprecated__ = False
+__email__ = "tarakesh.nc_at_google_mail_dot_com"
+__license__ = "MIT"
+__maintainer__ = "Tarak"
+__status__ = "Development"
+
+import sys
+import traceback
+
+from . import app_logger
+
+logger = app_logger.get_logger(__name__)
+
+try:
+    import bisect
+    import contextlib
+    import contextvars
+    import itertools
+    import json
+    import math
+    import os
+    import threading
+    import time
+    from typing import NamedTuple
+
+except Exception as e:
+    logger.debug(traceback.format_exc())
+    logger.error(("Import Error " + str(e)))
+    sys.exit(1)
+
+# trace of the action the current code runs for, 0 outside of an action
+_trace_id = contextvars.ContextVar('trace_id', default=0)
+
+
+class Span(NamedTuple):
+    seq: int         # order of recording, the ring slot is seq % capacity
+    trace_id: int
+    name: str
+    start: float     # time.monotonic() secs
+    end: float
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+class _SpanCtx(object):
+    __slots__ = ('tracer', 'name', 'new_trace', 'start', 'token')
+
+    def __init__(self, tracer, name, new_trace):
+        self.tracer = tracer
+        self.name = name
+        self.new_trace = new_trace
+        self.token = None
+
+    def __enter__(self):
+        if self.new_trace:
+            self.token = _trace_id.set(next(self.tracer.trace_ids))
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.record(self.name, self.start, time.monotonic())
+        if self.token is not None:
+            _trace_id.reset(self.token)
+        return False
+
+
+class Tracer(object):
+    CAPACITY = 8192
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)  # upper bounds, the last bucket is open
+    BUCKET_LABELS = tuple(f'<={ub}ms' for ub in BUCKETS_MS) + (f'>{BUCKETS_MS[-1]}ms',)
+
+    def __init__(self, capacity: int = CAPACITY, enabled: bool = True):
+        """
+        Args:
+            capacity (int): spans kept, the oldest are overwritten
+            enabled (bool): spans are not recorded if False, the calls cost next to nothing
+        """
+        self.capacity = capacity
+        self.enabled = enabled
+        self.ring = [None] * capacity
+        # next() of a count is atomic, writers share the ring without a lock
+        self.seq = itertools.count()
+        self.trace_ids = itertools.count(1)
+
+    def trace(self, name: str):
+        """Span of a new action, the spans within it carry its trace id
+
+        with tracer.trace('CLICK_BUY'):
+            with tracer.span('QUOTE'):
+                ...
+        """
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return _SpanCtx(self, name, True)
+
+    def span(self, name: str):
+        """Span of a stage of the current action, not recorded outside of an action
+        (background refreshes, armed tickets rebuilt on the ticks)"""
+        if not self.enabled or not _trace_id.get():
+            return contextlib.nullcontext()
+        return _SpanCtx(self, name, False)
+
+    def record(self, name: str, start: float, end: float, trace_id: int = None):
+        """Span with the monotonic start and end taken by the caller"""
+        if trace_id is None:
+            trace_id = _trace_id.get()
+        if not self.enabled or not trace_id:
+            return
+        seq = next(self.seq)
+        self.ring[seq % self.capacity] = Span(seq, trace_id, name, start, end)
+
+    @staticmethod
+    def current_trace():
+        return _trace_id.get()
+
+    def spans(self, trace_id: int = None):
+        """Spans in the ring, oldest first"""
+        spans = sorted((s for s in list(self.ring) if s is not None), key=lambda s: s.seq)
+        if trace_id is not None:
+            spans = [s for s in spans if s.trace_id == trace_id]
+        return spans
+
+    @staticmethod
+    def __percentile__(sorted_ms, q):
+        """nearest rank percentile"""
+        return sorted_ms[max(0, math.ceil(q / 100 * len(sorted_ms)) - 1)]
+
+    def summary(self):
+        """name -> count, p50/p95/p99/max ms and the histogram of the durations"""
+        durations = dict()
+        for s in self.spans():
+            durations.setdefault(s.name, []).append(s.duration * 1000)
+
+        summary = dict()
+        for name, ms in durations.items():
+            ms.sort()
+            hist = [0] * (len(Tracer.BUCKETS_MS) + 1)
+            for d in ms:
+                hist[bisect.bisect_left(Tracer.BUCKETS_MS, d)] += 1
+            summary[name] = {'count': len(ms),
+                             'p50_ms': round(Tracer.__percentile__(ms, 50), 3),
+                             'p95_ms': round(Tracer.__percentile__(ms, 95), 3),
+                             'p99_ms': round(Tracer.__percentile__(ms, 99), 3),
+                             'max_ms': round(ms[-1], 3),
+                             'histogram': {label: n for label, n in zip(Tracer.BUCKET_LABELS, hist) if n}}
+        return summary
+
+    def export(self, file_path: str = None):
+        """Logs the summary and writes it to the json file, if given"""
+        summary = self.summary()
+        recorded = max((s.seq for s in self.ring if s is not None), default=-1) + 1
+        for name, stats in summary.items():
+            logger.info(f'trace {name}: count: {stats["count"]} p50: {stats["p50_ms"]} ms '
+                        f'p95: {stats["p95_ms"]} ms p99: {stats["p99_ms"]} ms max: {stats["max_ms"]} ms')
+        if file_path:
+            try:
+                folder = os.path.dirname(file_path)
+                if folder:
+                    os.makedirs(folder, exist_ok=True)
+                with open(file_path, 'w') as f:
+                    json.dump({'recorded': recorded, 'overwritten': max(0, recorded - self.capacity),
+                               'spans': summary}, f, indent=2)
+                logger.info(f'Trace summary written to {file_path}')
+            except OSError as e:
+                logger.error(f'Trace summary not written to {file_path}: {e}')
+        return summary
+
+
+_tracer = None
+_lock = threading.Lock()
+
+
+def get_tracer():
+    """Application tracer, created on first use if the app has not set one"""
+    global _tracer
+    with _lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
+
+
+def set_tracer(tracer: Tracer):
+    global _tracer
+    with _lock:
+        _tracer = tracer
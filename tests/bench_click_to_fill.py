@@ -0,0 +1,80 @@
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app_mods
+from app_mods import rate_limiter, shared_classes
+from sim_broker import SimBroker, SimConfig
+from test_sim_broker import wait_for
+
+CONFIG = SimConfig(rest_latency=0.01, ack_latency=0.001, fill_latency=0.005)
+N_CLICKS = 20
+N_LEGS = 10
+ORDER_RATE = rate_limiter.BUCKETS[rate_limiter.ORDER][0]  # orders/s of the broker limit
+
+
+def new_tiu(fv, order_events=None):
+    tiu = object.__new__(app_mods.Tiu)
+    tiu.fv = fv
+    tiu.order_events = order_events
+    tiu.order_engine = None
+    tiu.notifier = None
+    return tiu
+
+
+def new_order(qty=50):
+    return shared_classes.Combi_Primary_B_MKT_And_OCO_S_MKT_I_Order_NFO(
+        tradingsymbol='NIFTY28MAR24C22000', quantity=qty, bl_alert_p=96.5, bp_alert_p=111.5, remarks='TeZ_1')
+
+
+def click_to_fill(tiu, n_legs=1, n_clicks=N_CLICKS, paced=True):
+    """secs from the call to the confirmed fill of all the legs. Paced clicks
+    stay within the order rate limit, the limiter does not hold them up."""
+    lat = []
+    for _ in range(n_clicks):
+        if paced:
+            time.sleep(n_legs / ORDER_RATE)
+        orders = [new_order() for _ in range(n_legs)]
+        start = time.perf_counter()
+        resp_exception, resp_ok, _ = tiu.place_and_confirm_tez_order(orders)
+        lat.append(time.perf_counter() - start)
+        assert resp_exception == 0 and resp_ok == n_legs
+    return lat
+
+
+def ms(lat, q):
+    return statistics.quantiles(lat, n=100)[q - 1] * 1000
+
+
+def main():
+    broker = SimBroker(CONFIG).start()
+    ws_wrap = None
+    try:
+        fv = broker.session()
+        polled = click_to_fill(new_tiu(fv))
+
+        ws_wrap = app_mods.WS_WrapU(fv=fv)
+        router = app_mods.OrderEventRouter(ws_wrap)
+        ws_wrap.connect_to_data_feed_servers()
+        assert wait_for(lambda: router.live)
+        pushed = click_to_fill(new_tiu(fv, router))
+        legs = click_to_fill(new_tiu(fv, router), n_legs=N_LEGS)
+        burst = click_to_fill(new_tiu(fv, router), n_legs=N_LEGS, n_clicks=5, paced=False)
+    finally:
+        if ws_wrap is not None:
+            ws_wrap.disconnect_data_feed_servers()
+        broker.stop()
+
+    print(f'simulated broker, rest {CONFIG.rest_latency * 1000:.0f} ms, '
+          f'ack {CONFIG.ack_latency * 1000:.0f} ms, fill {CONFIG.fill_latency * 1000:.0f} ms')
+    print(f'click to fill, polled order history   p50: {ms(polled, 50):.2f} ms  p95: {ms(polled, 95):.2f} ms')
+    print(f'click to fill, pushed order update    p50: {ms(pushed, 50):.2f} ms  p95: {ms(pushed, 95):.2f} ms')
+    print(f'click to fill, {N_LEGS} legs               p50: {ms(legs, 50):.2f} ms  p95: {ms(legs, 95):.2f} ms')
+    print(f'throughput, back to back clicks of {N_LEGS} legs: {N_LEGS * len(burst) / sum(burst):.1f} orders/s '
+          f'(order rate limit {ORDER_RATE}/s)')
+
+
+if __name__ == "__main__":
+    main()
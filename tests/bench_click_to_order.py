@@ -0,0 +1,111 @@
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app_mods
+from test_strike_ladder import LocalFeed, LocalTiu, wait_for
+from test_symbol_index import NFO_TXT, write_file
+
+REST_LATENCY = 0.03  # secs, simulated round trip of the broker rest calls
+N_CLICKS = 10
+
+
+class BenchTiu(LocalTiu):
+    """LocalTiu with rest latency, records the time of the first order request"""
+    avlble_margin = 10000000.0
+
+    def __init__(self, sym_index):
+        super().__init__(sym_index)
+        self.first_req = None
+
+    def get_security_info(self, exchange, symbol, token=None):
+        time.sleep(REST_LATENCY)
+        return super().get_security_info(exchange, symbol, token)
+
+    def search_scrip(self, exchange, symbol):
+        time.sleep(REST_LATENCY)
+        return super().search_scrip(exchange, symbol)
+
+    def fetch_ltp(self, exchange, token):
+        time.sleep(REST_LATENCY)
+        return 101.5, 0.05, 50
+
+    def get_strike_grid(self, symbol, expdate):
+        return None
+
+    def place_and_confirm_tez_order(self, orders, use_gtt_oco=False):
+        self.first_req = time.perf_counter()
+        return False, True, []
+
+
+class BenchDiu(object):
+    def get_latest_tick(self):
+        return 22010.0
+
+
+class BenchBku(object):
+    def save_order(self, *args):
+        pass
+
+    def show(self):
+        pass
+
+
+def inst_info():
+    return app_mods.OcpuInstrumentInfo(symbol='NIFTY', ul_instrument='NIFTY', exchange='NFO',
+                                       expiry_date='28-MAR-2024', strike_diff=50,
+                                       ce_strike_offset=0, pe_strike_offset=0,
+                                       profit_per=10.0, stoploss_per=10.0,
+                                       profit_points=10.0, stoploss_points=5.0,
+                                       use_gtt_oco=True, qty=2, n_legs=1)
+
+
+def bench_regular(tiu):
+    ocpu = app_mods.OCPU(app_mods.Ocpu_CreateConfig(tiu=tiu, bku=BenchBku(), diu=BenchDiu()))
+    lat = []
+    for _ in range(N_CLICKS):
+        click = time.perf_counter()
+        ocpu.crete_and_place_order('Buy', inst_info())
+        lat.append(tiu.first_req - click)
+    return lat
+
+
+def bench_armed(tiu):
+    feed = LocalFeed()
+    ladder = app_mods.StrikeLadderPrefetcher(tiu, feed, n_strikes=1)
+    ladder.add_instrument('26000', 'NFO', 'NIFTY', '28-MAR-2024')
+    ladder.start()
+    ocpu = app_mods.OCPU(app_mods.Ocpu_CreateConfig(tiu=tiu, bku=BenchBku(), diu=BenchDiu(), ladder=ladder))
+    armed = app_mods.ArmedTicketUnit(ocpu, feed)
+    armed.start()
+    armed.arm(inst_info(), '26000')
+    lat = []
+    for _ in range(N_CLICKS):
+        feed.tick('26000', 22010.0)
+        assert wait_for(lambda: 'Buy' in armed.tickets)
+        click = time.perf_counter()
+        batch = armed.take('Buy')
+        assert batch is not None
+        ocpu.dispatch(batch)
+        lat.append(tiu.first_req - click)
+    armed.stop()
+    ladder.stop()
+    return lat
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        nfo_file = write_file(folder, 'FV_NFO_symbols.txt', NFO_TXT)
+        sym_index = app_mods.SymbolIndex.load(nfo_file, 'NFO')
+        regular = bench_regular(BenchTiu(sym_index))
+        armed = bench_armed(BenchTiu(sym_index))
+    print(f'click to first order request, rest latency {REST_LATENCY * 1000:.0f} ms')
+    print(f'regular path p50: {statistics.median(regular) * 1000:.3f} ms')
+    print(f'armed ticket p50: {statistics.median(armed) * 1000:.3f} ms')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from test_fuzzy_search import nfo_names, scan
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app_mods import fuzzy_search
+
+N_RUNS = 1000
+TEXT = 'BANKNIFTY04APR24P470000'
+
+
+def main():
+    names = nfo_names()
+    fs = fuzzy_search.FuzzySymbolSearch(names)
+    indexed = timeit.timeit(lambda: fs.match(TEXT), number=N_RUNS)
+    scanned = timeit.timeit(lambda: scan(names, TEXT), number=10)
+
+    print(f'symbols        : {len(names)}')
+    print(f'file scan      : {scanned / 10 * 1e6:.1f} us per search')
+    print(f'trigram index  : {indexed / N_RUNS * 1e6:.1f} us per search')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import json
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app_mods
+
+N_RUNS = 20000
+ARGS = dict(buy_or_sell='S', exchange='NFO', tradingsymbol='NIFTY28MAR24C22000', quantity=1750, product_type='I',
+            book_loss_alert_price=96.5, book_loss_price=0.0, book_loss_price_type='MKT',
+            book_profit_alert_price=111.5, book_profit_price=0.0, book_profit_price_type='MKT',
+            remarks='TeZ_1_Qty_1750_of_3500')
+
+
+def main():
+    fv = app_mods.ShoonyaApiPy(dl_file=False, use_file=False)
+    fv.shoonya_userid = fv.shoonya_accountid = 'FA0001'
+    fv.shoonya_susertoken = 'c28e22b367d84fb32ecf6b96043ea1fc0766a7cabd9d564454912d94a2a53049'
+
+    def rebuilt():
+        # nested dicts, quote_plus and json.dumps of the whole request on every call
+        return 'jData=' + json.dumps(fv.__gtt_oco_values__(**ARGS)) + f'&jKey={fv.shoonya_susertoken}'
+
+    def rebuilt_modify():
+        return 'jData=' + json.dumps(fv.__modify_gtt_oco_values__(**ARGS, al_id='24041500000101')) + \
+            f'&jKey={fv.shoonya_susertoken}'
+
+    assert rebuilt() == fv.gtt_oco_order_request(**ARGS)[1]
+    assert rebuilt_modify() == fv.modify_gtt_oco_order_request(**ARGS, al_id='24041500000101')[1]
+
+    def us(fn):
+        return timeit.timeit(fn, number=N_RUNS) / N_RUNS * 1e6
+
+    print(f'place oco, rebuilt  : {us(rebuilt):.2f} us')
+    print(f'place oco, template : {us(lambda: fv.gtt_oco_order_request(**ARGS)):.2f} us')
+    print(f'modify oco, rebuilt : {us(rebuilt_modify):.2f} us')
+    print(f'modify oco, template: {us(lambda: fv.modify_gtt_oco_order_request(**ARGS, al_id="24041500000101")):.2f} us')
+
+
+if __name__ == "__main__":
+    main()
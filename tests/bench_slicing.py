@@ -0,0 +1,47 @@
+import math
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app_mods import slicing
+
+N_RUNS = 100000
+
+
+def inline_slicing(qty, ls, frz_qty, given_nlegs):
+    """leg split that was inlined in OCPU, float arithmetic on every click"""
+    def lcm(x, y):
+        return x * y // math.gcd(x, y)
+
+    if (qty / given_nlegs) < frz_qty:
+        nearest_lcm_qty = qty
+    else:
+        nearest_lcm_qty = (qty // lcm(ls, frz_qty - 1)) * lcm(ls, frz_qty - 1)
+    res_qty1 = qty - nearest_lcm_qty
+    min_legs = nearest_lcm_qty // (frz_qty - 1)
+    max_legs = nearest_lcm_qty // ls
+    nlegs = min_legs if given_nlegs < min_legs else max_legs if given_nlegs > max_legs else given_nlegs
+    per_leg_qty = ((nearest_lcm_qty / nlegs) // ls) * ls
+    res_qty2 = nearest_lcm_qty - (per_leg_qty * nlegs)
+    return [per_leg_qty] * nlegs + [res_qty1 + res_qty2]
+
+
+def main():
+    args = (5000, 50, 1801, 2)
+    inline = timeit.timeit(lambda: inline_slicing(*args), number=N_RUNS)
+    slicing.plan_legs.cache_clear()
+    planned = timeit.timeit(lambda: slicing.plan_legs(*args), number=N_RUNS)
+    slicing.plan_legs.cache_clear()
+    uncached = timeit.timeit(lambda: slicing.plan_legs.__wrapped__(*args), number=N_RUNS)
+
+    def us(secs):
+        return secs / N_RUNS * 1e6
+
+    print(f'inline slicing     : {us(inline):.3f} us per click')
+    print(f'planner (uncached) : {us(uncached):.3f} us per click')
+    print(f'planner (memoized) : {us(planned):.3f} us per click')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,537 @@
+"""
+Simulated Noren broker for the offline end to end tests and benchmarks.
+
+A REST server and a websocket server speak the part of the Noren protocol that TeZ
+uses. A matching engine behind them acks and fills the orders after a configurable
+latency, with partial fills and rejects, and triggers the OCO alerts on the price.
+ShoonyaApiPy is pointed to it with host=broker.host, websocket=broker.websocket.
+
+    python tests/sim_broker.py [port]   # websocket on port + 1
+"""
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import websockets
+
+from app_utils.scheduler import Scheduler
+
+FINAL_STATES = ('COMPLETE', 'REJECTED', 'CANCELED')
+NO_DATA = {'stat': 'Not_Ok', 'emsg': 'Error Occurred : 5 "no data"'}
+
+
+class SimInstrument(NamedTuple):
+    exch: str
+    token: str
+    tsym: str
+    ltp: float
+    ls: int = 1
+    frzqty: int = None
+    ti: float = 0.05
+
+
+INSTRUMENTS = [SimInstrument('NSE', '26000', 'Nifty 50', 22010.0),
+               SimInstrument('NSE', '26009', 'Nifty Bank', 46500.0),
+               SimInstrument('NSE', '10576', 'NIFTYBEES-EQ', 240.5, ti=0.01),
+               SimInstrument('NFO', '43210', 'NIFTY28MAR24C22000', 101.5, 50, 1801),
+               SimInstrument('NFO', '43211', 'NIFTY28MAR24P22000', 98.0, 50, 1801)]
+
+SEARCH_TEXT = {'NIFTY INDEX': '26000', 'NIFTY BANK': '26009'}
+
+
+class SimConfig(NamedTuple):
+    rest_latency: float = 0.0    # secs, every REST call
+    ack_latency: float = 0.001   # secs, order to its ack by the exchange
+    fill_latency: float = 0.005  # secs, ack to the fill of a marketable order
+    partial_fill: float = 0.0    # probability that a marketable order is filled in two parts
+    reject_rate: float = 0.0     # probability that an order is rejected
+    reject_reason: str = 'RMS:Margin Exceeds,Cash Available:0.00,Margin Used:0.00'
+    cash: float = 1000000.0
+    seed: int = 0
+
+
+def now_tm():
+    return datetime.now().strftime('%d-%m-%Y %H:%M:%S')
+
+
+class MatchingEngine(object):
+    def __init__(self, config: SimConfig = SimConfig(), instruments: list = INSTRUMENTS):
+        self.config = config
+        self.rnd = random.Random(config.seed)
+        self.instruments = {inst.token: inst for inst in instruments}
+        self.by_tsym = {inst.tsym: inst for inst in instruments}
+        self.ltp = {inst.token: inst.ltp for inst in instruments}
+        self.lock = threading.RLock()
+        self.orders = dict()     # norenordno -> states, newest first
+        self.alerts = dict()     # al_id -> pending OCO
+        self.positions = dict()  # (prd, token) -> [buy qty, buy value, sell qty, sell value]
+        self.matching = set()    # orders with their fills scheduled
+        self.order_ids = itertools.count(24041500000001)
+        self.alert_ids = itertools.count(24041500100001)
+        self.listeners = list()  # listener(msg) of the order updates and the ticks
+        self.scheduler = Scheduler()
+        self.scheduler.start()
+
+    def stop(self):
+        self.scheduler.stop()
+
+    def publish(self, msg):
+        for listener in self.listeners:
+            listener(msg)
+
+    # orders
+    def __new_state__(self, norenordno, **changes):
+        with self.lock:
+            state = dict(self.orders[norenordno][0], **changes)
+            state['norentm'] = datetime.now().strftime('%H:%M:%S %d-%m-%Y')
+            self.orders[norenordno].insert(0, state)
+        self.publish(dict(state, t='om'))
+        return state
+
+    def place_order(self, values: dict):
+        inst = self.by_tsym.get(urllib.parse.unquote_plus(values.get('tsym', '')))
+        if inst is None or inst.exch != values.get('exch'):
+            return {'stat': 'Not_Ok', 'emsg': 'Invalid Trading Symbol'}
+        try:
+            qty = int(values['qty'])
+            prc = float(values.get('prc') or 0.0)
+            trgprc = float(values['trgprc']) if values.get('trgprc') not in (None, 'None', '') else 0.0
+        except (KeyError, ValueError):
+            return {'stat': 'Not_Ok', 'emsg': 'Invalid Input : qty or price'}
+        if qty <= 0 or qty % inst.ls:
+            return {'stat': 'Not_Ok', 'emsg': f'Invalid Input : qty should be multiple of lot size {inst.ls}'}
+
+        with self.lock:
+            norenordno = str(next(self.order_ids))
+            self.orders[norenordno] = [{
+                'stat': 'Ok', 'norenordno': norenordno, 'uid': values.get('uid'), 'actid': values.get('actid'),
+                'exch': inst.exch, 'tsym': inst.tsym, 'token': inst.token, 'trantype': values['trantype'],
+                'prd': values['prd'], 'prctyp': values['prctyp'], 'qty': str(qty), 'prc': f'{prc:.2f}',
+                'trgprc': f'{trgprc:.2f}', 'ret': values.get('ret', 'DAY'), 'remarks': values.get('remarks') or '',
+                'ls': str(inst.ls), 'ti': f'{inst.ti:.2f}', 'status': 'PENDING', 'reporttype': 'NewAck',
+                'fillshares': '0', 'avgprc': '0.00', 'exch_tm': now_tm()}]
+        self.scheduler.call_later(self.config.ack_latency, self.__ack__, norenordno)
+        return {'stat': 'Ok', 'norenordno': norenordno, 'request_time': now_tm()}
+
+    def __ack__(self, norenordno):
+        with self.lock:
+            order = self.orders[norenordno][0]
+            if order['status'] != 'PENDING':
+                return
+            inst = self.instruments[order['token']]
+            if inst.frzqty is not None and int(order['qty']) >= inst.frzqty:
+                self.__new_state__(norenordno, status='REJECTED', reporttype='Rejected',
+                                   rejreason=f'Order quantity exceeds the freeze quantity {inst.frzqty - 1}')
+                return
+            if self.rnd.random() < self.config.reject_rate:
+                self.__new_state__(norenordno, status='REJECTED', reporttype='Rejected',
+                                   rejreason=self.config.reject_reason)
+                return
+            triggered = order['prctyp'] not in ('SL-MKT', 'SL-LMT')
+            self.__new_state__(norenordno, status='OPEN' if triggered else 'TRIGGER_PENDING',
+                               reporttype='NewAck', exch_tm=now_tm())
+            self.__match__(norenordno)
+
+    def __match__(self, norenordno):
+        """Schedules the fill of the order if it is marketable at the ltp"""
+        order = self.orders[norenordno][0]
+        ltp = self.ltp[order['token']]
+        buy = order['trantype'] == 'B'
+        if order['status'] == 'TRIGGER_PENDING':
+            trgprc = float(order['trgprc'])
+            if (buy and ltp < trgprc) or (not buy and ltp > trgprc):
+                return
+            order = self.__new_state__(norenordno, status='OPEN', reporttype='Triggered')
+        if order['status'] != 'OPEN' or norenordno in self.matching:
+            return
+        if order['prctyp'] in ('LMT', 'SL-LMT'):
+            prc = float(order['prc'])
+            if (buy and ltp > prc) or (not buy and ltp < prc):
+                return
+        self.matching.add(norenordno)
+        qty = int(order['qty'])
+        ls = int(order['ls'])
+        if qty >= 2 * ls and self.rnd.random() < self.config.partial_fill:
+            first = (qty // ls // 2) * ls
+            self.scheduler.call_later(self.config.fill_latency, self.__fill__, norenordno, first)
+            self.scheduler.call_later(2 * self.config.fill_latency, self.__fill__, norenordno, qty - first)
+        else:
+            self.scheduler.call_later(self.config.fill_latency, self.__fill__, norenordno, qty)
+
+    def __fill__(self, norenordno, qty):
+        with self.lock:
+            order = self.orders[norenordno][0]
+            if order['status'] != 'OPEN':
+                return
+            price = self.ltp[order['token']]
+            if order['prctyp'] in ('LMT', 'SL-LMT'):
+                prc = float(order['prc'])
+                price = min(price, prc) if order['trantype'] == 'B' else max(price, prc)
+            filled = int(order['fillshares'])
+            avgprc = (float(order['avgprc']) * filled + price * qty) / (filled + qty)
+            filled += qty
+            position = self.positions.setdefault((order['prd'], order['token']), [0, 0.0, 0, 0.0])
+            side = 0 if order['trantype'] == 'B' else 2
+            position[side] += qty
+            position[side + 1] += price * qty
+            complete = filled == int(order['qty'])
+            self.__new_state__(norenordno, status='COMPLETE' if complete else 'OPEN', reporttype='Fill',
+                               fillshares=str(filled), avgprc=f'{avgprc:.2f}', flqty=str(qty),
+                               flprc=f'{price:.2f}', exch_tm=now_tm())
+
+    def cancel_order(self, norenordno):
+        with self.lock:
+            states = self.orders.get(norenordno)
+            if states is None or states[0]['status'] in FINAL_STATES:
+                return {'stat': 'Not_Ok', 'emsg': 'Rejected : ORA:Order not found to Cancel'}
+            self.__new_state__(norenordno, status='CANCELED', reporttype='Canceled')
+        return {'stat': 'Ok', 'result': norenordno, 'request_time': now_tm()}
+
+    def single_order_history(self, norenordno):
+        with self.lock:
+            states = self.orders.get(norenordno)
+            return [dict(state) for state in states] if states else NO_DATA
+
+    def order_book(self):
+        with self.lock:
+            book = [dict(states[0]) for states in reversed(self.orders.values())]
+        return book if book else NO_DATA
+
+    def position_book(self, values: dict):
+        book = []
+        with self.lock:
+            for (prd, token), (buy_qty, buy_value, sell_qty, sell_value) in self.positions.items():
+                inst = self.instruments[token]
+                net_qty = buy_qty - sell_qty
+                lp = self.ltp[token]
+                closed = min(buy_qty, sell_qty)
+                buy_avg = buy_value / buy_qty if buy_qty else 0.0
+                sell_avg = sell_value / sell_qty if sell_qty else 0.0
+                net_avg = buy_avg if net_qty > 0 else sell_avg if net_qty < 0 else 0.0
+                book.append({'stat': 'Ok', 'uid': values.get('uid'), 'actid': values.get('actid'),
+                             'exch': inst.exch, 'tsym': inst.tsym, 'token': token, 'prd': prd,
+                             'netqty': str(net_qty), 'netavgprc': f'{net_avg:.2f}',
+                             'daybuyqty': str(buy_qty), 'daysellqty': str(sell_qty),
+                             'daybuyavgprc': f'{buy_avg:.2f}', 'daysellavgprc': f'{sell_avg:.2f}',
+                             'lp': f'{lp:.2f}', 'rpnl': f'{closed * (sell_avg - buy_avg):.2f}',
+                             'urmtom': f'{net_qty * (lp - net_avg):.2f}', 'ls': str(inst.ls)})
+        return book if book else NO_DATA
+
+    def limits(self, values: dict):
+        with self.lock:
+            used = sum(abs(buy_qty - sell_qty) * self.ltp[token]
+                       for (_, token), (buy_qty, _, sell_qty, _) in self.positions.items())
+        return {'stat': 'Ok', 'prfname': 'SIM', 'cash': f'{self.config.cash:.2f}', 'payin': '0.00',
+                'unclearedcash': '0.00', 'marginused': f'{used:.2f}', 'request_time': now_tm()}
+
+    # scrips
+    def __instrument__(self, values: dict):
+        inst = self.instruments.get(str(values.get('token')))
+        return inst if inst is not None and inst.exch == values.get('exch') else None
+
+    def get_quotes(self, values: dict):
+        inst = self.__instrument__(values)
+        if inst is None:
+            return NO_DATA
+        lp = self.ltp[inst.token]
+        return {'stat': 'Ok', 'exch': inst.exch, 'tsym': inst.tsym, 'token': inst.token, 'lp': f'{lp:.2f}',
+                'c': f'{inst.ltp:.2f}', 'o': f'{inst.ltp:.2f}', 'h': f'{max(lp, inst.ltp):.2f}',
+                'l': f'{min(lp, inst.ltp):.2f}', 'bp1': f'{lp - inst.ti:.2f}', 'sp1': f'{lp + inst.ti:.2f}',
+                'bq1': '1000', 'sq1': '1000', 'ls': str(inst.ls), 'ti': f'{inst.ti:.2f}'}
+
+    def get_security_info(self, values: dict):
+        inst = self.__instrument__(values)
+        if inst is None:
+            return NO_DATA
+        info = {'stat': 'Ok', 'exch': inst.exch, 'tsym': inst.tsym, 'token': inst.token, 'ls': str(inst.ls),
+                'ti': f'{inst.ti:.2f}', 'mult': '1', 'prcftr': '1.000000', 'pp': '2'}
+        if inst.frzqty is not None:
+            info['frzqty'] = str(inst.frzqty)
+        return info
+
+    def search_scrip(self, values: dict):
+        stext = urllib.parse.unquote_plus(values.get('stext', '')).upper()
+        token = SEARCH_TEXT.get(stext)
+        found = [self.instruments[token]] if token is not None else \
+            [inst for inst in self.instruments.values() if inst.tsym.upper().startswith(stext)]
+        found = [inst for inst in found if inst.exch == values.get('exch')]
+        if not found:
+            return NO_DATA
+        return {'stat': 'Ok', 'values': [{'exch': inst.exch, 'token': inst.token, 'tsym': inst.tsym,
+                                          'ls': str(inst.ls), 'ti': f'{inst.ti:.2f}'} for inst in found]}
+
+    # GTT / OCO
+    def place_oco(self, values: dict):
+        inst = self.by_tsym.get(urllib.parse.unquote_plus(values.get('tsym', '')))
+        if inst is None or inst.exch != values.get('exch'):
+            return {'stat': 'Not_Ok', 'emsg': 'Invalid Trading Symbol'}
+        with self.lock:
+            al_id = str(next(self.alert_ids))
+            self.alerts[al_id] = dict(values, al_id=al_id, token=inst.token, tsym=inst.tsym)
+        return {'stat': 'OI created', 'al_id': al_id, 'request_time': now_tm()}
+
+    def modify_oco(self, values: dict):
+        with self.lock:
+            al_id = values.get('al_id')
+            if al_id not in self.alerts:
+                return {'stat': 'Not_Ok', 'emsg': 'Invalid al_id'}
+            self.alerts[al_id] = dict(values, token=self.alerts[al_id]['token'], tsym=self.alerts[al_id]['tsym'])
+        return {'stat': 'OI replaced', 'al_id': al_id, 'request_time': now_tm()}
+
+    def cancel_gtt(self, values: dict):
+        with self.lock:
+            if self.alerts.pop(values.get('al_id'), None) is None:
+                return {'stat': 'Not_Ok', 'emsg': 'Invalid al_id'}
+        return {'stat': 'OI deleted', 'al_id': values['al_id'], 'request_time': now_tm()}
+
+    def pending_gtts(self):
+        with self.lock:
+            alerts = [dict(alert, stat='Ok') for alert in self.alerts.values()]
+        return alerts if alerts else NO_DATA
+
+    def __check_alerts__(self, token, ltp):
+        """OCO of an exit, the profit leg at x and the loss leg at y"""
+        triggered = []
+        with self.lock:
+            for al_id, alert in list(self.alerts.items()):
+                if alert['token'] != token:
+                    continue
+                var = {v['var_name']: float(v['d']) for v in alert['oivariable']}
+                sell = alert['place_order_params']['trantype'] == 'S'
+                if (sell and ltp >= var['x']) or (not sell and ltp <= var['x']):
+                    triggered.append(alert['place_order_params'])
+                elif (sell and ltp <= var['y']) or (not sell and ltp >= var['y']):
+                    triggered.append(alert['place_order_params_leg2'])
+                else:
+                    continue
+                del self.alerts[al_id]
+        for params in triggered:
+            self.place_order(dict(params, remarks=f'OCO {params.get("remarks", "")}'.strip()))
+
+    # market
+    def set_ltp(self, token: str, ltp: float):
+        """New price of the token, resting orders and alerts are matched and the tick is pushed"""
+        token = str(token)
+        inst = self.instruments[token]
+        with self.lock:
+            self.ltp[token] = ltp
+            for norenordno, states in self.orders.items():
+                if states[0]['token'] == token and states[0]['status'] in ('OPEN', 'TRIGGER_PENDING'):
+                    self.__match__(norenordno)
+        self.__check_alerts__(token, ltp)
+        self.publish({'t': 'tf', 'e': inst.exch, 'tk': token, 'lp': f'{ltp:.2f}', 'ft': str(int(time.time()))})
+
+    def touchline(self, token: str):
+        inst = self.instruments[token]
+        lp = self.ltp[token]
+        return {'t': 'tk', 'e': inst.exch, 'tk': token, 'ts': inst.tsym, 'ls': str(inst.ls), 'ti': f'{inst.ti:.2f}',
+                'lp': f'{lp:.2f}', 'o': f'{inst.ltp:.2f}', 'h': f'{max(lp, inst.ltp):.2f}',
+                'l': f'{min(lp, inst.ltp):.2f}', 'c': f'{inst.ltp:.2f}', 'v': '0', 'ft': str(int(time.time()))}
+
+
+class RestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, the pooled connections of the transport are reused
+    disable_nagle_algorithm = True  # headers and body are separate writes
+    broker = None
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8', errors='replace')
+        endpoint = self.path.rstrip('/').rsplit('/', 1)[-1]
+        data = json.dumps(self.broker.handle(endpoint, body)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WsConnection(object):
+    def __init__(self, ws):
+        self.ws = ws
+        self.uid = None
+        self.tokens = set()
+        self.queue = asyncio.Queue()  # sends of a connection are kept in order
+
+
+class SimBroker(object):
+    def __init__(self, config: SimConfig = SimConfig(), port: int = 0, ws_port: int = 0,
+                 instruments: list = INSTRUMENTS):
+        """
+        Args:
+            config (SimConfig): latencies, partial fills and rejects
+            port, ws_port (int): REST and websocket ports, any free port if 0
+        """
+        self.config = config
+        self.engine = MatchingEngine(config, instruments)
+        self.engine.listeners.append(self.__publish__)
+        handler = type('SimRestHandler', (RestHandler,), {'broker': self})
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.httpd.daemon_threads = True
+        self.ws_port = ws_port
+        self.loop = None
+        self.ws_server = None
+        self.connections = set()
+        self.requests = dict()  # endpoint -> number of calls
+        self.lock = threading.Lock()
+        self.sessions = itertools.count(1)
+        self.routes = {
+            'QuickAuth': self.__login__,
+            'UserDetails': lambda v: {'stat': 'Ok', 'actid': v.get('uid'), 'uname': 'SIM USER',
+                                      'request_time': now_tm()},
+            'Limits': self.engine.limits,
+            'PlaceOrder': self.engine.place_order,
+            'CancelOrder': lambda v: self.engine.cancel_order(v.get('norenordno')),
+            'SingleOrdHist': lambda v: self.engine.single_order_history(v.get('norenordno')),
+            'OrderBook': lambda v: self.engine.order_book(),
+            'PositionBook': self.engine.position_book,
+            'GetQuotes': self.engine.get_quotes,
+            'GetSecurityInfo': self.engine.get_security_info,
+            'SearchScrip': self.engine.search_scrip,
+            'PlaceOCOOrder': self.engine.place_oco,
+            'ModifyOCOOrder': self.engine.modify_oco,
+            'CancelGTTOrder': self.engine.cancel_gtt,
+            'GetPendingGTTOrder': lambda v: self.engine.pending_gtts(),
+        }
+
+    @property
+    def host(self):
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}/NorenWClientTP/'
+
+    @property
+    def websocket(self):
+        return f'ws://127.0.0.1:{self.ws_port}/NorenWSTP/'
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name='SIM_BROKER_REST', daemon=True).start()
+        ready = threading.Event()
+        threading.Thread(target=self.__ws_main__, args=(ready,), name='SIM_BROKER_WS', daemon=True).start()
+        ready.wait(5.0)
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.ws_server.close)
+        self.engine.stop()
+
+    def drop_connections(self):
+        """Closes the websocket connections from the server side, as a network drop"""
+        if self.loop is not None:
+            for conn in list(self.connections):
+                self.connections.discard(conn)
+                asyncio.run_coroutine_threadsafe(conn.ws.close(), self.loop)
+
+    def session(self, userid: str = 'SIM001', **kwargs):
+        """ShoonyaApiPy with a session on the simulated broker"""
+        import app_mods
+        fv = app_mods.ShoonyaApiPy(dl_file=False, use_file=False, host=self.host, websocket=self.websocket, **kwargs)
+        fv.set_session(userid=userid, password='', usertoken=f'sim{next(self.sessions)}')
+        return fv
+
+    # REST
+    def handle(self, endpoint: str, body: str):
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        if self.config.rest_latency:
+            time.sleep(self.config.rest_latency)
+        jdata, _, jkey = body.partition('&jKey=')
+        try:
+            values = json.loads(jdata[len('jData='):])
+        except ValueError:
+            return {'stat': 'Not_Ok', 'emsg': 'Invalid Input : jData'}
+        if not jkey and endpoint != 'QuickAuth':
+            return {'stat': 'Not_Ok', 'emsg': 'Session Expired :  Invalid Session Key'}
+        route = self.routes.get(endpoint)
+        if route is None:
+            return {'stat': 'Not_Ok', 'emsg': f'{endpoint} is not supported by the simulated broker'}
+        return route(values)
+
+    def __login__(self, values):
+        uid = values.get('uid')
+        return {'stat': 'Ok', 'susertoken': f'sim{next(self.sessions)}', 'actid': uid, 'uname': 'SIM USER',
+                'request_time': now_tm()}
+
+    # websocket
+    def __ws_main__(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.ws_server = self.loop.run_until_complete(websockets.serve(self.__ws_session__, '127.0.0.1',
+                                                                       self.ws_port))
+        self.ws_port = self.ws_server.sockets[0].getsockname()[1]
+        ready.set()
+        self.loop.run_until_complete(self.ws_server.wait_closed())
+
+    async def __ws_writer__(self, conn: WsConnection):
+        while True:
+            await conn.ws.send(await conn.queue.get())
+
+    async def __ws_session__(self, ws, path=None):
+        conn = WsConnection(ws)
+        writer = asyncio.ensure_future(self.__ws_writer__(conn))
+        try:
+            async for message in ws:
+                msg = json.loads(message)
+                kind = msg.get('t')
+                if kind == 'c':
+                    conn.uid = msg.get('uid')
+                    self.connections.add(conn)
+                    conn.queue.put_nowait(json.dumps({'t': 'ck', 's': 'OK', 'uid': conn.uid}))
+                elif kind == 't':
+                    for key in msg.get('k', '').split('#'):
+                        token = key.split('|')[-1]
+                        if token in self.engine.instruments:
+                            conn.tokens.add(token)
+                            conn.queue.put_nowait(json.dumps(self.engine.touchline(token)))
+                elif kind == 'u':
+                    conn.tokens -= {key.split('|')[-1] for key in msg.get('k', '').split('#')}
+                    conn.queue.put_nowait(json.dumps({'t': 'uk'}))
+                elif kind == 'o':
+                    conn.queue.put_nowait(json.dumps({'t': 'ok'}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.connections.discard(conn)
+            writer.cancel()
+
+    def __publish__(self, msg):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.__broadcast__, msg)
+
+    def __broadcast__(self, msg):
+        data = json.dumps(msg)
+        for conn in list(self.connections):
+            if (msg['t'] == 'om' and conn.uid == msg.get('actid')) or (msg['t'] == 'tf' and msg['tk'] in conn.tokens):
+                conn.queue.put_nowait(data)
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8700
+    broker = SimBroker(port=port, ws_port=port + 1).start()
+    print(f'simulated broker, host: {broker.host} websocket: {broker.websocket}')
+    rnd = random.Random()
+    try:
+        while True:
+            time.sleep(0.5)
+            for inst in INSTRUMENTS:
+                ltp = broker.engine.ltp[inst.token]
+                broker.engine.set_ltp(inst.token, round(ltp + rnd.choice((-1, 1)) * inst.ti * rnd.randint(0, 10), 2))
+    except KeyboardInterrupt:
+        broker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import os
+import sys
+import threading
+from typing import NamedTuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app_mods
+from app_utils import FakeClock
+
+
+class Leg(NamedTuple):
+    token: str
+    tsym: str
+
+
+class LocalOcpu(object):
+    """Ladder of one strike per action, the ATM strike moves with move_atm()"""
+    def __init__(self):
+        self.legs = {'Buy': Leg('43210', 'NIFTY28MAR24C22000'), 'Short': Leg('43211', 'NIFTY28MAR24P22000')}
+        self.n_builds = 0
+        self.building = threading.Event()
+        self.release = None  # build waits on it, if set
+
+    def move_atm(self):
+        self.legs = {'Buy': Leg('43212', 'NIFTY28MAR24C22050'), 'Short': Leg('43213', 'NIFTY28MAR24P22050')}
+
+    def prepared_leg(self, action, inst_info, ltp=None):
+        return self.legs.get(action)
+
+    def prepare_orders(self, action, inst_info, prepared_only=False):
+        assert prepared_only
+        leg = self.legs[action]
+        self.n_builds += 1
+        self.building.set()
+        if self.release is not None:
+            self.release.wait()
+        return app_mods.OrderBatch(action, inst_info.symbol, leg.tsym, leg.token, inst_info.qty, 101.5,
+                                   [('order', leg.tsym, inst_info.qty)], True)
+
+
+def inst_info(qty=50):
+    return app_mods.OcpuInstrumentInfo(symbol='NIFTY', ul_instrument='NIFTY', exchange='NFO',
+                                       expiry_date='28-MAR-2024', strike_diff=50,
+                                       ce_strike_offset=0, pe_strike_offset=0,
+                                       profit_per=10.0, stoploss_per=10.0,
+                                       profit_points=10.0, stoploss_points=5.0,
+                                       use_gtt_oco=True, qty=qty, n_legs=1)
+
+
+def new_unit():
+    clock = FakeClock()
+    ocpu = LocalOcpu()
+    # no background thread, the tests build the tickets
+    return app_mods.ArmedTicketUnit(ocpu, clock=clock), ocpu, clock
+
+
+def test_stale():
+    armed, ocpu, clock = new_unit()
+    armed.arm(inst_info(), '26000')
+    armed.__build__()
+    clock.advance(app_mods.ArmedTicketUnit.MAX_AGE)
+    assert armed.take('Buy').token == '43210'
+
+    # ticket aged out, the click takes the regular path
+    armed.__build__()
+    clock.advance(app_mods.ArmedTicketUnit.MAX_AGE + 0.01)
+    assert armed.take('Short') is None
+    assert armed.take('Buy') is None
+    assert (armed.hits, armed.misses) == (1, 2)
+
+    # consumed on use
+    armed.__build__()
+    assert armed.take('Buy') is not None and armed.take('Buy') is None
+
+    # not armed
+    armed.__build__()
+    armed.disarm()
+    assert armed.take('Buy') is None
+
+
+def test_mismatch():
+    armed, ocpu, clock = new_unit()
+    armed.arm(inst_info(), '26000')
+    armed.__build__()
+    # ATM strike moved after the build
+    ocpu.move_atm()
+    assert armed.take('Buy') is None
+    armed.__build__()
+    assert armed.take('Buy').token == '43212'
+
+    # slider locked and unlocked with another quantity, the tickets of the old one are not used
+    armed.__build__()
+    armed.disarm()
+    armed.arm(inst_info(qty=100), '26000')
+    assert armed.take('Buy') is None
+    armed.__build__()
+    batch = armed.take('Buy')
+    assert batch.qty == 100 and batch.orders == [('order', 'NIFTY28MAR24C22050', 100)]
+
+    # re-armed with another quantity while a build of the old one is in progress
+    ocpu.release = threading.Event()
+    ocpu.building.clear()
+    th = threading.Thread(target=armed.__build__)
+    th.start()
+    assert ocpu.building.wait(1.0)
+    armed.arm(inst_info(qty=150), '26000')
+    ocpu.release.set()
+    th.join()
+    assert armed.tickets == dict() and armed.take('Short') is None
+    armed.__build__()
+    assert armed.take('Short').qty == 150
+
+
+def test_disarm_race():
+    armed, ocpu, clock = new_unit()
+    info = inst_info()
+    armed.arm(info, '26000')
+    ocpu.release = threading.Event()
+    th = threading.Thread(target=armed.__build__)
+    th.start()
+    assert ocpu.building.wait(1.0)
+    # disarmed and armed again for the same instrument while the build runs
+    armed.disarm()
+    ocpu.move_atm()
+    armed.arm(info, '26000')
+    ocpu.release.set()
+    th.join()
+    assert armed.tickets == dict() and armed.take('Buy') is None
+
+    armed.__build__()
+    assert armed.take('Buy').token == '43212'
+
+
+def main():
+    test_stale()
+    test_mismatch()
+    test_disarm_race()
+    print('armed ticket: ok')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app_mods
+from app_mods import shared_classes
+
+
+class Broker(object):
+    """Fills market orders right away, rejects the quantity 99. The quantity 75 stays open with
+    25 filled and 65 with none, till they are cancelled"""
+    OPEN_FILLS = {'75': '25', '65': '0'}
+
+    def __init__(self, latency: float = 0.0):
+        self.lock = threading.Lock()
+        self.latency = latency
+        self.orders = dict()
+        self.n_history = 0
+        self.n_oco = 0
+        self.oco_qty = []
+        self.n_open = 0  # orders not final
+        self.max_open = 0
+
+    def handle(self, route, values):
+        time.sleep(self.latency)
+        with self.lock:
+            if route == 'PlaceOrder':
+                norenordno = str(24041500000001 + len(self.orders))
+                qty = values['qty']
+                rejected = qty == '99'
+                status = 'REJECTED' if rejected else 'COMPLETE'
+                fillshares = '0' if rejected else qty
+                if qty in Broker.OPEN_FILLS:
+                    status, fillshares = 'OPEN', Broker.OPEN_FILLS[qty]
+                    self.n_open += 1
+                    self.max_open = max(self.max_open, self.n_open)
+                self.orders[norenordno] = {'norenordno': norenordno, 'status': status,
+                                           'rejreason': 'RMS:Margin Exceeds' if rejected else '',
+                                           'fillshares': fillshares,
+                                           'avgprc': '101.50', 'exch_tm': '15-04-2024 10:00:00'}
+                return {'stat': 'Ok', 'norenordno': norenordno}
+            if route == 'SingleOrdHist':
+                self.n_history += 1
+                return [self.orders[values['norenordno']]]
+            if route == 'CancelOrder':
+                order = self.orders[values['norenordno']]
+                if order['status'] != 'OPEN':
+                    return {'stat': 'Not_Ok', 'emsg': 'Rejected : ORA:Order not found to cancel'}
+                order['status'] = 'CANCELED'
+                self.n_open -= 1
+                return {'stat': 'Ok', 'result': values['norenordno']}
+            if route == 'PlaceOCOOrder':
+                self.n_oco += 1
+                self.oco_qty.append(values['place_order_params']['qty'])
+                return {'stat': 'OI created', 'al_id': str(24041500000100 + self.n_oco)}
+            return {'stat': 'Not_Ok', 'emsg': f'no route {route}'}
+
+
+def start_server(broker):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+            jdata = body.split('&jKey=')[0][len('jData='):]
+            reply = json.dumps(broker.handle(self.path.rsplit('/', 1)[-1], json.loads(jdata))).encode()
+            try:
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+            except (BrokenPipeError, ConnectionResetError):
+                # request of a leg cut off by its deadline
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def new_session(server):
+    fv = app_mods.ShoonyaApiPy(dl_file=False, use_file=False)
+    fv.set_session(userid='FA0001', password='pwd', usertoken='token')
+    fv.shoonya_api_host = f'http://127.0.0.1:{server.server_port}/'
+    return fv
+
+
+def new_orders(quantities):
+    return [shared_classes.Combi_Primary_B_MKT_And_OCO_S_MKT_I_Order_NFO(
+            tradingsymbol='NIFTY28MAR24C22000', quantity=qty, bl_alert_p=96.5, bp_alert_p=111.5,
+            remarks=f'TeZ_{i+1}') for i, qty in enumerate(quantities)]
+
+
+def test_async_order_engine():
+    broker = Broker()
+    server = start_server(broker)
+    engine = app_mods.AsyncOrderEngine(new_session(server))
+    engine.start()
+    try:
+        orders = new_orders((50, 50, 99))
+        resp_exception, resp_ok, result = engine.place_and_confirm_tez_order(orders, use_gtt_oco=True)
+
+        # 2 fills and their OCOs, the rejected leg has no OCO
+        assert resp_exception == 0 and resp_ok == 4 and len(result) == 3
+        statuses = sorted(status.name for status, _ in result)
+        assert statuses == ['SOFT_FAILURE_REJRMS', 'SUCCESS', 'SUCCESS']
+        assert all(order.al_id is not None for order in orders[:2]) and orders[2].al_id is None
+        assert all(os.fillshares == 50 for status, os in result if status.name == 'SUCCESS')
+        assert orders[0].order_id in broker.orders
+    finally:
+        engine.stop()
+        server.shutdown()
+
+
+def test_deadline():
+    # slow broker, two legs at a time, the orders of the last legs are sent after the deadline of the first
+    broker = Broker(latency=0.05)
+    server = start_server(broker)
+    engine = app_mods.AsyncOrderEngine(new_session(server), max_concurrency=2, leg_deadline=0.5)
+    engine.start()
+    try:
+        orders = new_orders((75, 65, 75, 50))
+        start = time.monotonic()
+        resp_exception, resp_ok, result = engine.place_and_confirm_tez_order(orders, use_gtt_oco=True)
+        assert time.monotonic() - start > 2 * 0.5
+        assert broker.max_open == 2 and broker.n_open == 0
+
+        # every leg is placed, the open orders are cancelled at the deadline and returned with their fill
+        assert resp_exception == 0 and len(result) == 4
+        by_id = {os.order_id: (status.name, os.fillshares) for status, os in result}
+        assert sorted(by_id.values()) == [('HARD_FAILURE', 0), ('SOFT_FAILURE_QTY', 25), ('SOFT_FAILURE_QTY', 25),
+                                          ('SUCCESS', 50)]
+        assert all(broker.orders[order_id]['status'] in ('CANCELED', 'COMPLETE') for order_id in by_id)
+        # the part fills are protected by their OCO
+        assert sorted(broker.oco_qty) == ['25', '25', '50'] and resp_ok == 4
+        assert orders[1].al_id is None and all(orders[i].al_id is not None for i in (0, 2, 3))
+    finally:
+        engine.stop()
+        server.shutdown()
+
+
+def main():
+    test_async_order_engine()
+    test_deadline()
+    print('async order engine: ok')
+
+
+if __name__ == "__main__":
+    main()
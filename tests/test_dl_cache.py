@@ -0,0 +1,101 @@
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app_utils
+
+CONTENT = b'Exchange,Token,LotSize,Symbol,TradingSymbol,Instrument,TickSize,\nNSE,10576,1,NIFTYBEES,NIFTYBEES-EQ,EQ,0.01,\n'
+
+
+def make_zip(content):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('NSE_symbols.txt', content)
+    return buf.getvalue()
+
+
+class ScripMasterHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the broker's scrip master download"""
+    body = make_zip(CONTENT)
+    hits = {'200': 0, '304': 0}
+
+    def do_GET(self):
+        if self.path.endswith('/missing.zip'):
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = '"' + hashlib.md5(self.body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            ScripMasterHandler.hits['304'] += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        ScripMasterHandler.hits['200'] += 1
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        ...
+
+
+def test_artifact_cache():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ScripMasterHandler)
+    th = threading.Thread(target=server.serve_forever, daemon=True)
+    th.start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/NSE_symbols.txt.zip'
+
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            dst = os.path.join(folder, 'FV_NSE_symbols.txt')
+            cache = app_utils.ArtifactCache(folder)
+
+            assert cache.fetch(url, dst)
+            with open(dst, 'rb') as f:
+                assert f.read() == CONTENT
+            assert ScripMasterHandler.hits['200'] == 1
+
+            # restart within the same trading day: no network at all
+            assert app_utils.ArtifactCache(folder).fetch(url, dst)
+            assert ScripMasterHandler.hits == {'200': 1, '304': 0}
+
+            # next trading day: conditional request, server says not modified
+            cache.trading_day = lambda ts=None: '20990101'
+            mtime = os.path.getmtime(dst)
+            assert cache.fetch(url, dst)
+            assert ScripMasterHandler.hits['304'] == 1
+            assert os.path.getmtime(dst) == mtime
+            cache.evict()
+            assert sorted(os.listdir(cache.cache_folder)) == ['20990101_NSE_symbols.txt.zip', 'NSE_symbols.txt.zip.json']
+
+            # content changed on the server
+            ScripMasterHandler.body = make_zip(CONTENT + b'NSE,2885,1,RELIANCE,RELIANCE-EQ,EQ,0.05,\n')
+            cache.trading_day = lambda ts=None: '20990102'
+            assert cache.fetch(url, dst)
+            with open(dst, 'rb') as f:
+                assert f.read().endswith(b'RELIANCE-EQ,EQ,0.05,\n')
+            cache.evict()
+            assert sorted(os.listdir(cache.cache_folder)) == ['20990102_NSE_symbols.txt.zip', 'NSE_symbols.txt.zip.json']
+
+            # failed download
+            assert not cache.fetch(url.replace('NSE_symbols.txt.zip', 'missing.zip'), dst + '.missing')
+            assert not os.path.exists(dst + '.missing')
+    finally:
+        server.shutdown()
+
+
+def main():
+    test_artifact_cache()
+    print('artifact cache: ok')
+
+
+if __name__ == "__main__":
+    main()
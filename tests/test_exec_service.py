@@ -0,0 +1,51 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app_utils.exec_service import BG_IO, ORDER, ExecService
+
+
+def lane_threads(name):
+    return [th for th in threading.enumerate() if th.name.startswith(name)]
+
+
+def test_exec_service():
+    svc = ExecService({ORDER: 4, BG_IO: 2})
+    svc.warm()
+    assert len(lane_threads(ORDER)) == 4 and len(lane_threads(BG_IO)) == 2
+
+    # busy background lane does not hold up the order lane
+    bg = [svc.submit(BG_IO, time.sleep, 0.3) for _ in range(4)]
+    start = time.perf_counter()
+    assert svc.submit(ORDER, lambda x: x * 2, 21).result() == 42
+    assert (time.perf_counter() - start) < 0.1
+
+    # warm threads are reused, no new threads for the click
+    n_threads = len(lane_threads(ORDER))
+    for future in [svc.submit(ORDER, time.sleep, 0.01) for _ in range(4)]:
+        future.result()
+    assert len(lane_threads(ORDER)) == n_threads
+
+    metrics = svc.metrics()
+    assert metrics[BG_IO]['max_depth'] >= 2
+    assert metrics[ORDER]['completed'] == 5 and metrics[ORDER]['depth'] == 0
+
+    # queued background work is dropped, running work completes
+    svc.shutdown()
+    assert bg[0].result() is None and bg[-1].cancelled()
+    try:
+        svc.submit(ORDER, time.sleep, 0)
+        assert False
+    except RuntimeError:
+        pass
+
+
+def main():
+    test_exec_service()
+    print('exec service: ok')
+
+
+if __name__ == "__main__":
+    main()
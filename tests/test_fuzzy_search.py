@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app_mods import fuzzy_search
+
+
+def nfo_names():
+    names = []
+    for sym, base, step in (('NIFTY', 20000, 50), ('BANKNIFTY', 45000, 100), ('FINNIFTY', 20000, 50)):
+        for exp in ('28MAR24', '04APR24', '25APR24'):
+            for i in range(200):
+                for optt in ('C', 'P'):
+                    names.append(f'{sym}{exp}{optt}{base + i * step}')
+    return names
+
+
+def scan(names, text):
+    # earlier file scan: first line passing the similarity rule
+    for i, name in enumerate(names):
+        if fuzzy_search.is_similar(name, text):
+            return i
+    return None
+
+
+def test_fuzzy_search():
+    names = nfo_names()
+    fs = fuzzy_search.FuzzySymbolSearch(names)
+
+    assert names[fs.match('NIFTY28MAR24C22000')] == 'NIFTY28MAR24C22000'
+    assert names[fs.match('BANKNIFTY04APR24P47000')] == 'BANKNIFTY04APR24P47000'
+    # typo in the strike still resolves
+    assert names[fs.match('BANKNIFTY04APR24P470000')] == 'BANKNIFTY04APR24P47000'
+    # beginning must match
+    assert fs.match('XNIFTY28MAR24C22000') is None
+    assert fs.match('NIFTY28MAR24C2') is None
+
+    # match() takes the best ratio among the top trigram candidates, the scan took the first
+    # similar line. Both resolve these texts to the same symbol.
+    for text in ('BANKNIFTY04APR24P470000', 'FINNIFTY25APR24C2105', 'NIFTY04APR24P2915', 'NIFTY28MAR24C'):
+        i = scan(names, text)
+        j = fs.match(text)
+        assert i == j, text
+        if j is not None:
+            assert fuzzy_search.is_similar(names[j], text)
+
+    prefix = fs.starts_with('FINNIFTY25APR24C')
+    assert len(prefix) == 200 and all(names[i].startswith('FINNIFTY25APR24C') for i in prefix)
+
+
+def main():
+    test_fuzzy_search()
+    print('fuzzy search: ok')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import requests
+import NorenRestApiPy.NorenApi as noren_api_module
+from NorenRestApiPy.NorenApi import NorenApi
+from app_mods import http_transport
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    connections = set()
+
+    def do_POST(self):
+        Handler.connections.add(self.client_address)
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.endswith('/Slow'):
+            time.sleep(0.5)
+        body = b'{"stat": "Ok", "lp": "101.50"}'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_http_transport():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f'http://127.0.0.1:{server.server_port}/'
+    try:
+        transport = http_transport.get_transport()
+        assert http_transport.get_transport() is transport
+        # not paced unless the rate limiter is opted in
+        assert transport.limiter is None
+
+        # requests of a session reuse the connection
+        for _ in range(5):
+            assert transport.post(f'{host}/PlaceOrder', data='jData={}').json()['stat'] == 'Ok'
+        assert len(Handler.connections) == 1
+
+        # NorenApi calls of the pooled subclass go over the same pool
+        api = http_transport.PooledNorenApi(host=host, websocket='ws://127.0.0.1/')
+        api.set_session(userid='FA0001', password='pwd', usertoken='token')
+        n_requests = transport.n_requests
+        assert api.get_quotes('NSE', '26000')['lp'] == '101.50'
+        assert transport.n_requests == n_requests + 1
+        assert len(Handler.connections) == 1
+
+        # NorenApi itself is left as it is
+        assert noren_api_module.requests is requests and isinstance(api, NorenApi)
+        api = NorenApi(host=host, websocket='ws://127.0.0.1/')
+        api.set_session(userid='FA0001', password='pwd', usertoken='token')
+        assert api.get_quotes('NSE', '26000')['lp'] == '101.50'
+        assert transport.n_requests == n_requests + 1
+
+        # per endpoint timeout
+        assert transport.timeout_for(f'{host}/PlaceOrder') == http_transport.ENDPOINT_TIMEOUTS['PlaceOrder']
+        assert transport.timeout_for(f'{host}/Unknown') == http_transport.DEFAULT_TIMEOUT
+        transport.timeouts['Slow'] = (1.0, 0.1)
+        try:
+            transport.post(f'{host}/Slow')
+            assert False
+        except requests.exceptions.Timeout:
+            pass
+    finally:
+        server.shutdown()
+
+
+def main():
+    test_http_transport()
+    print('http transport: ok')
+
+
+if __name__ == "__main__":
+    main()
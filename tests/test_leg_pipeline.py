@@ -0,0 +1,75 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app_mods
+from app_mods import shared_classes
+
+
+class LocalFv(object):
+    """Order of the quantity 100 stays open for a few polls, others fill right away"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = []
+        self.orders = dict()
+
+    def log(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    def place_order(self, **kwargs):
+        with self.lock:
+            norenordno = str(len(self.orders) + 1)
+            self.orders[norenordno] = {'qty': kwargs['quantity'], 'polls': 0}
+        return {'stat': 'Ok', 'norenordno': norenordno}
+
+    def single_order_history(self, norenordno):
+        order = self.orders[norenordno]
+        order['polls'] += 1
+        if order['qty'] == 100 and order['polls'] < 4:
+            return [{'norenordno': norenordno, 'status': 'OPEN', 'fillshares': '0'}]
+        self.log(('fill', norenordno))
+        return [{'norenordno': norenordno, 'status': 'COMPLETE', 'fillshares': str(order['qty']),
+                 'avgprc': '101.5', 'exch_tm': '15-04-2024 10:00:00'}]
+
+    def place_gtt_oco_order(self, **kwargs):
+        self.log(('oco', kwargs['remarks'].rsplit('_', 1)[-1]))
+        return {'stat': 'OI created', 'al_id': f'al_{kwargs["remarks"]}'}
+
+
+def test_leg_pipeline():
+    # only the order placement of Tiu is used, no login
+    tiu = object.__new__(app_mods.Tiu)
+    tiu.fv = LocalFv()
+    tiu.order_events = None
+    tiu.order_engine = None
+    tiu.notifier = None
+    sleep_period, app_mods.Tiu.CONFIRM_SLEEP_PERIOD = app_mods.Tiu.CONFIRM_SLEEP_PERIOD, 0.05
+    try:
+        orders = [shared_classes.Combi_Primary_B_MKT_And_OCO_S_MKT_I_Order_NFO(
+                    tradingsymbol='NIFTY28MAR24C22000', quantity=qty, bl_alert_p=96.5, bp_alert_p=111.5,
+                    remarks=f'TeZ_{i+1}') for i, qty in enumerate((50, 100))]
+        start = time.perf_counter()
+        resp_exception, resp_ok, result = tiu.place_and_confirm_tez_order(orders, use_gtt_oco=True)
+        assert (time.perf_counter() - start) < 1.0
+    finally:
+        app_mods.Tiu.CONFIRM_SLEEP_PERIOD = sleep_period
+
+    assert resp_exception == 0 and resp_ok == 4 and len(result) == 2
+    assert all(order.al_id is not None for order in orders)
+
+    # fast leg is protected before the slow leg is filled
+    events = tiu.fv.events
+    fast_id, slow_id = orders[0].order_id, orders[1].order_id
+    assert events.index(('oco', fast_id)) < events.index(('fill', slow_id)) < events.index(('oco', slow_id))
+
+
+def main():
+    test_leg_pipeline()
+    print('leg pipeline: ok')
+
+
+if __name__ == "__main__":
+    main()
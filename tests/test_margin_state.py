@@ -0,0 +1,54 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app_mods.margin_state import MarginState
+
+LIMITS = {'stat': 'Ok', 'cash': '100000.00', 'payin': '0.00', 'unclearedcash': '0.00', 'marginused': '10000.00'}
+
+
+def order_update(norenordno, trantype, fillshares, avgprc, token='43210'):
+    return {'t': 'om', 'norenordno': norenordno, 'trantype': trantype, 'token': token,
+            'fillshares': str(fillshares), 'avgprc': str(avgprc), 'status': 'COMPLETE'}
+
+
+def test_margin_state():
+    margin = MarginState(actid='FA0001')
+    margin.reconcile(LIMITS)
+    assert margin.avlble_margin == 90000.0
+
+    # buy fill blocks the premium, repeated updates of the same order are applied once
+    margin.on_order_update(order_update('1', 'B', 100, 100.0))
+    margin.on_order_update(order_update('1', 'B', 100, 100.0))
+    assert margin.avlble_margin == 80000.0
+
+    # partial fills of an order add up to the cumulative fill qty
+    margin.on_order_update(order_update('2', 'B', 50, 100.0))
+    margin.on_order_update(order_update('2', 'B', 100, 100.0))
+    assert margin.avlble_margin == 70000.0
+
+    # exit releases the entry amount, not the exit value
+    margin.on_order_update(order_update('3', 'S', 200, 120.0))
+    assert margin.avlble_margin == 90000.0
+    assert margin.positions['43210'] == (0, 0.0)
+
+    # order updates without a fill are ignored
+    margin.on_order_update({'t': 'om', 'norenordno': '4', 'status': 'OPEN', 'trantype': 'B', 'token': '1'})
+    assert margin.n_fills == 4
+
+    # fills of another account are ignored
+    margin.on_order_update(dict(order_update('5', 'B', 10, 100.0), actid='FA0002'))
+    assert margin.avlble_margin == 90000.0
+
+    # reconciliation takes the broker numbers as the new base
+    margin.reconcile(dict(LIMITS, cash='110000.00', marginused='0.00'))
+    assert margin.avlble_margin == 110000.0
+
+
+def main():
+    test_margin_state()
+    print('margin state: ok')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app_mods
+
+
+class LocalFeed(object):
+    def __init__(self):
+        self.listeners = []
+        self.fv_socket_opened = True
+
+    def add_order_update_listener(self, listener):
+        self.listeners.append(listener)
+
+    def push(self, msg):
+        for listener in self.listeners:
+            listener(msg)
+
+
+class LocalFv(object):
+    def __init__(self):
+        self.history_calls = 0
+
+    def single_order_history(self, order_id):
+        self.history_calls += 1
+        return [{'norenordno': order_id, 'status': 'COMPLETE', 'fillshares': '50', 'avgprc': '101.5'}]
+
+
+def om(norenordno, status, fillshares=0):
+    return {'t': 'om', 'norenordno': norenordno, 'status': status, 'fillshares': str(fillshares), 'avgprc': '101.5'}
+
+
+def test_order_event_router():
+    feed = LocalFeed()
+    router = app_mods.OrderEventRouter(feed)
+
+    # update pushed before the wait starts is not missed
+    feed.push(om('1', 'COMPLETE', 50))
+    assert router.wait('1', 0.1)['fillshares'] == '50'
+
+    # waiter is woken up by the push, partial fills do not end the wait
+    def push_later():
+        time.sleep(0.05)
+        feed.push(om('2', 'OPEN', 25))
+        time.sleep(0.05)
+        feed.push(om('2', 'COMPLETE', 50))
+    threading.Thread(target=push_later).start()
+    start = time.time()
+    msg = router.wait('2', 2.0)
+    assert msg['status'] == 'COMPLETE' and (time.time() - start) < 1.0
+
+    feed.push(om('3', 'REJECTED'))
+    assert router.wait('3', 0.1)['status'] == 'REJECTED'
+    assert router.wait('4', 0.05) is None
+    assert router.n_events == 4
+
+
+def test_confirm_with_fallback():
+    # only the order state lookup of Tiu is used, no login
+    tiu = object.__new__(app_mods.Tiu)
+    tiu.fv = LocalFv()
+    feed = LocalFeed()
+    tiu.order_events = app_mods.OrderEventRouter(feed)
+
+    feed.push(om('10', 'COMPLETE', 50))
+    assert tiu.__get_order_state__('10', 0)['status'] == 'COMPLETE'
+    assert tiu.fv.history_calls == 0
+
+    # no update within the deadline, polled
+    app_mods.Tiu.CONFIRM_EVENT_DEADLINE, deadline = 0.05, app_mods.Tiu.CONFIRM_EVENT_DEADLINE
+    try:
+        assert tiu.__get_order_state__('11', 0)['norenordno'] == '11'
+        assert tiu.fv.history_calls == 1
+
+        # feed is down, polled right away
+        feed.fv_socket_opened = False
+        start = time.time()
+        tiu.__get_order_state__('12', 0)
+        assert tiu.fv.history_calls == 2 and (time.time() - start) < 0.05
+    finally:
+        app_mods.Tiu.CONFIRM_EVENT_DEADLINE = deadline
+
+
+def main():
+    test_order_event_router()
+    test_confirm_with_fallback()
+    print('order events: ok')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import json
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app_mods
+from app_mods import payload_templates
+
+
+def new_fv(userid='FA0001', usertoken='token'):
+    fv = app_mods.ShoonyaApiPy(dl_file=False, use_file=False)
+    fv.shoonya_userid = fv.shoonya_accountid = userid
+    fv.shoonya_susertoken = usertoken
+    return fv
+
+
+def serialized(fv, values):
+    """payload as the builders made it before the templates"""
+    return 'jData=' + json.dumps(values) + f'&jKey={fv.shoonya_susertoken}'
+
+
+def random_args(rnd):
+    return dict(buy_or_sell=rnd.choice('BS'), exchange=rnd.choice(('NSE', 'NFO')),
+                tradingsymbol=rnd.choice(('NIFTYBEES-EQ', 'NIFTY28MAR24C22000', 'M&M-EQ')),
+                quantity=rnd.choice((1, 50, 1750, 50.0)), product_type=rnd.choice('IC'),
+                book_loss_alert_price=round(rnd.uniform(90, 100), 2), book_loss_price=round(rnd.uniform(90, 100), 2),
+                book_loss_price_type=rnd.choice(('MKT', 'LMT')),
+                book_profit_alert_price=round(rnd.uniform(100, 110), 2),
+                book_profit_price=round(rnd.uniform(100, 110), 2),
+                book_profit_price_type=rnd.choice(('MKT', 'LMT')),
+                remarks=rnd.choice((None, 'TeZ_1_Qty_50_of_100', 'quote " and \\ slash', 'ünïcode')))
+
+
+def test_oco_templates():
+    rnd = random.Random(11)
+    fv = new_fv()
+    for _ in range(500):
+        args = random_args(rnd)
+        url, payload = fv.gtt_oco_order_request(**args)
+        assert url.endswith('/PlaceOCOOrder')
+        values = fv.__gtt_oco_values__(**args)
+        assert payload == serialized(fv, values), (payload, args)
+
+        al_id = str(rnd.randint(24041500000000, 24041599999999))
+        url, payload = fv.modify_gtt_oco_order_request(**args, al_id=al_id)
+        assert url.endswith('/ModifyOCOOrder')
+        values = fv.__modify_gtt_oco_values__(**args, al_id=al_id)
+        assert payload == serialized(fv, values), (payload, args)
+
+    # one template per request, account, symbol, product, side and price types
+    assert 0 < len(fv.payload_templates) <= 2 * 2 * 3 * 2 * 2 * 2 * 2
+
+
+def test_session_change():
+    fv = new_fv()
+    args = random_args(random.Random(3))
+    _, payload = fv.gtt_oco_order_request(**args)
+    assert payload.endswith('&jKey=token')
+
+    # new token of the same account reuses the template, another account gets its own
+    fv.shoonya_susertoken = 'token2'
+    n_templates = len(fv.payload_templates)
+    _, payload = fv.gtt_oco_order_request(**args)
+    assert payload.endswith('&jKey=token2') and len(fv.payload_templates) == n_templates
+    fv.shoonya_userid = fv.shoonya_accountid = 'FA0002'
+    _, payload = fv.gtt_oco_order_request(**args)
+    assert '"FA0002"' in payload and '"FA0001"' not in payload
+    assert len(fv.payload_templates) == n_templates + 1
+
+
+def test_template():
+    template = payload_templates.PayloadTemplate({'uid': 'FA0001', 'qty': payload_templates.placeholder('qty'),
+                                                  'legs': [{'qty': payload_templates.placeholder('qty')}]})
+    assert template.fields == ['qty', 'qty']
+    assert template.fill('k', qty=25) == 'jData={"uid": "FA0001", "qty": "25", "legs": [{"qty": "25"}]}&jKey=k'
+
+
+def main():
+    test_template()
+    test_oco_templates()
+    test_session_change()
+    print('payload templates: ok')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app_mods import http_transport, rate_limiter
+from app_mods.rate_limiter import GTT, ORDER, QUERY, RateLimiter
+
+
+class Broker(object):
+    """Pushes back with a throttling reply when more than 3 requests are in flight"""
+    MAX_INFLIGHT = 3
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.n_rejected = 0
+
+    def handle(self):
+        with self.lock:
+            self.inflight += 1
+            throttled = self.inflight > Broker.MAX_INFLIGHT
+            if throttled:
+                self.n_rejected += 1
+        time.sleep(0.02)
+        with self.lock:
+            self.inflight -= 1
+        if throttled:
+            return b'{"stat": "Not_Ok", "emsg": "Too many requests, try after some time"}'
+        return b'{"stat": "Ok", "lp": "101.50"}'
+
+
+@pytest.fixture(scope='module')
+def broker():
+    return Broker()
+
+
+@pytest.fixture(scope='module')
+def host(broker):
+    server = start_server(broker)
+    yield f'http://127.0.0.1:{server.server_port}/'
+    server.shutdown()
+
+
+def start_server(broker):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            body = broker.handle()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_token_bucket(host):
+    limiter = RateLimiter(buckets={ORDER: (20.0, 2), GTT: (5.0, 5), QUERY: (100.0, 100)})
+    transport = http_transport.HttpTransport(limiter=limiter)
+    start = time.perf_counter()
+    for _ in range(10):
+        transport.post(f'{host}PlaceOrder', data='jData={}')
+    # burst of 2, then 20 per sec
+    assert (time.perf_counter() - start) >= 0.35
+    assert limiter.metrics()['granted'] == 10
+
+
+def burst(transport, host, n_threads=12, n_calls=5):
+    def client():
+        for _ in range(n_calls):
+            transport.post(f'{host}GetQuotes', data='jData={}')
+
+    threads = [threading.Thread(target=client) for _ in range(n_threads)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+
+def test_aimd(host, broker):
+    burst(http_transport.HttpTransport(), host)
+    n_unpaced = broker.n_rejected
+
+    broker.n_rejected = 0
+    limiter = RateLimiter(initial_limit=8)
+    limiter.DECREASE_WINDOW = 0.05
+    transport = http_transport.HttpTransport(limiter=limiter)
+    burst(transport, host)
+    metrics = limiter.metrics()
+    assert 0 < broker.n_rejected < n_unpaced / 2 and metrics['throttled'] == broker.n_rejected
+    assert metrics['decreases'] > 0 and metrics['inflight'] == 0
+
+    # good replies grow the limit again
+    limit = limiter.limit
+    for _ in range(10):
+        transport.post(f'{host}GetQuotes', data='jData={}')
+    assert limiter.limit > limit
+
+    # slow orders are congestion too
+    permit = limiter.acquire(f'{host}PlaceOrder')
+    limiter.last_decrease = 0.0
+    limit = limiter.limit
+    limiter.release(permit, latency=2.0)
+    assert limiter.limit < limit
+
+
+def test_priority(host):
+    limiter = RateLimiter(initial_limit=1, max_limit=1)
+    held = limiter.acquire(f'{host}GetQuotes')
+    granted = []
+
+    def call(name, url, prio=None):
+        with rate_limiter.priority(prio):
+            permit = limiter.acquire(url)
+        granted.append(name)
+        limiter.release(permit, latency=0.01)
+
+    threads = [threading.Thread(target=call, args=(f'query_{i}', f'{host}GetQuotes')) for i in range(3)]
+    threads.append(threading.Thread(target=call, args=('sq_off', f'{host}PlaceOrder', rate_limiter.SQ_OFF)))
+    for th in threads:
+        th.start()
+        time.sleep(0.01)
+    while limiter.metrics()['waiting'] < 4:
+        time.sleep(0.01)
+    limiter.release(held, latency=0.01)
+    for th in threads:
+        th.join()
+    assert granted[0] == 'sq_off' and sorted(granted[1:]) == ['query_0', 'query_1', 'query_2']
+
+    # timeout when no slot is given
+    held = limiter.acquire(f'{host}GetQuotes')
+    try:
+        limiter.acquire(f'{host}GetQuotes', timeout=0.05)
+        assert False
+    except requests.exceptions.RequestException as e:
+        # handled where the broker call failures are handled
+        assert isinstance(e, rate_limiter.RateLimitTimeout)
+    limiter.release(held)
+
+
+def test_is_throttled():
+    assert rate_limiter.is_throttled(429)
+    assert rate_limiter.is_throttled(200, '{"stat":"Not_Ok","emsg":"Too many requests"}')
+    assert not rate_limiter.is_throttled(200, '{"stat":"Not_Ok","emsg":"RMS:Margin Exceeds"}')
+    assert rate_limiter.endpoint_class('https://api/NorenWClientTP/PlaceOCOOrder') == GTT
+    assert rate_limiter.endpoint_class('https://api/NorenWClientTP/Limits') == QUERY
+
+
+def main():
+    broker = Broker()
+    server = start_server(broker)
+    host = f'http://127.0.0.1:{server.server_port}/'
+    try:
+        test_is_throttled()
+        test_token_bucket(host)
+        test_aimd(host, broker)
+        test_priority(host)
+    finally:
+        server.shutdown()
+    print('rate limiter: ok')
+
+
+if __name__ == "__main__":
+    main()
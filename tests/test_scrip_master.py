@@ -0,0 +1,105 @@
+import io
+import os
+import sys
+import tempfile
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app_mods
+from app_mods.scrip_master import ScripMasterPrep
+
+NSE_TXT = b'''Exchange,Token,LotSize,Symbol,TradingSymbol,Instrument,TickSize,
+NSE,26000,1,Nifty 50,NIFTY INDEX,INDEX,0.05,
+NSE,10576,1,NIFTYBEES,NIFTYBEES-EQ,EQ,0.01,
+'''
+
+NFO_TXT = b'''Exchange,Token,LotSize,Symbol,TradingSymbol,Expiry,Instrument,OptionType,StrikePrice,TickSize,
+NFO,43210,50,NIFTY,NIFTY28MAR24C22000,28-MAR-2024,OPTIDX,CE,22000,0.05,
+NFO,43211,50,NIFTY,NIFTY28MAR24P22000,28-MAR-2024,OPTIDX,PE,22000,0.05,
+NFO,53001,15,BANKNIFTY,BANKNIFTY27MAR24C47000,27-MAR-2024,OPTIDX,CE,47000,0.05,
+'''
+
+
+def make_zip(name, content):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr(name, content)
+    return buf.getvalue()
+
+
+class ScripMasterHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the broker's scrip master downloads, held until release is set"""
+    files = {'/NSE_symbols.txt.zip': make_zip('NSE_symbols.txt', NSE_TXT),
+             '/NFO_symbols.txt.zip': make_zip('NFO_symbols.txt', NFO_TXT)}
+    release = threading.Event()
+
+    def do_GET(self):
+        ScripMasterHandler.release.wait(5.0)
+        body = ScripMasterHandler.files.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        ...
+
+
+def test_scrip_master_prep():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ScripMasterHandler)
+    th = threading.Thread(target=server.serve_forever, daemon=True)
+    th.start()
+    host = f'http://127.0.0.1:{server.server_address[1]}'
+    urls = (ScripMasterPrep.NSE_URL, ScripMasterPrep.NFO_URL)
+    ScripMasterPrep.NSE_URL = f'{host}/NSE_symbols.txt.zip'
+    ScripMasterPrep.NFO_URL = f'{host}/NFO_symbols.txt.zip'
+
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            pairs = [('NIFTY', '28-MAR-2024')]
+            ScripMasterHandler.release.clear()
+            prep = app_mods.start_scrip_master_prep(folder, pairs)
+            # one preparation per folder
+            assert app_mods.start_scrip_master_prep(os.path.join(folder, '.'), pairs) is prep
+
+            # prepared on its own thread, users wait only if they need it
+            assert prep.th.name == 'SCRIP_MASTER_PREP' and prep.th is not threading.current_thread()
+            assert not prep.is_ready() and not prep.wait(0.05)
+            ScripMasterHandler.release.set()
+            assert prep.wait(5.0) and prep.is_ready()
+
+            assert prep.sym_indices['NSE'].by_name('NIFTYBEES-EQ').token == 10576
+            assert 'NFO' in prep.fuzzy_indices
+            assert prep.nfo_df['TradingSymbol'].tolist() == ['NIFTY28MAR24C22000', 'NIFTY28MAR24P22000']
+
+        # failed preparation still releases the waiting users
+        ScripMasterHandler.files['/NFO_symbols.txt.zip'] = make_zip('NFO_symbols.txt', b'Exchange,Token,\nNFO,1,\n')
+        with tempfile.TemporaryDirectory() as folder:
+            prep = app_mods.start_scrip_master_prep(folder, [('NIFTY', '28-MAR-2024')])
+            assert prep.wait(5.0)
+            assert prep.nfo_df is None and 'NFO' not in prep.sym_indices
+
+        # download failure
+        ScripMasterPrep.NFO_URL = f'{host}/missing.zip'
+        with tempfile.TemporaryDirectory() as folder:
+            prep = app_mods.start_scrip_master_prep(folder)
+            assert prep.wait(5.0)
+            assert 'NSE' in prep.sym_indices and 'NFO' not in prep.sym_indices
+    finally:
+        ScripMasterPrep.NSE_URL, ScripMasterPrep.NFO_URL = urls
+        server.shutdown()
+
+
+def main():
+    test_scrip_master_prep()
+    print('scrip master prep: ok')
+
+
+if __name__ == "__main__":
+    main()
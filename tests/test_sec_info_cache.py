@@ -0,0 +1,66 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app_mods.sec_info_cache import SecurityInfoCache
+
+
+def test_sec_info_cache():
+    calls = []
+
+    def fetcher(exchange, token):
+        calls.append((exchange, token))
+        if token == '0':
+            return {'stat': 'Not_Ok', 'emsg': 'Invalid token'}
+        return {'stat': 'Ok', 'exch': exchange, 'token': token, 'frzqty': '1801', 'ls': '50', 'ti': '0.05'}
+
+    with tempfile.TemporaryDirectory() as folder:
+        cache = SecurityInfoCache(folder)
+        assert cache.resolve('NFO', '43210', fetcher)['frzqty'] == '1801'
+        assert cache.resolve('nfo', 43210, fetcher)['ls'] == '50'
+        assert len(calls) == 1
+        # saved in the background
+        end = time.monotonic() + 2.0
+        while not os.path.exists(cache.file_name) and time.monotonic() < end:
+            time.sleep(0.01)
+        assert len(SecurityInfoCache(folder)) == 1
+
+        # failures are not cached
+        assert cache.resolve('NFO', '0', fetcher)['stat'] == 'Not_Ok'
+        cache.resolve('NFO', '0', fetcher)
+        assert len(calls) == 3
+
+        # bulk fill only fetches the missing tokens
+        assert cache.fill('NFO', ['43210', '43211', '43212', '43211'], fetcher) == 2
+        assert len(calls) == 5 and len(cache) == 3
+
+        # a fetch that raises does not lose the other replies
+        def failing_fetcher(exchange, token):
+            if token == '43214':
+                raise ConnectionError('no reply')
+            return fetcher(exchange, token)
+        assert cache.fill('NFO', ['43213', '43214'], failing_fetcher) == 1
+        assert len(cache) == 4
+
+        # restart on the same trading day is served from the saved cache
+        cache = SecurityInfoCache(folder)
+        assert len(cache) == 4
+        assert cache.resolve('NFO', '43212', fetcher)['token'] == '43212'
+        assert len(calls) == 6
+
+        # cache of an older trading day is not used
+        cache.day = '2000-01-01'
+        cache.save()
+        assert len(SecurityInfoCache(folder)) == 0
+        assert cache.stats()['hits'] == 1
+
+
+def main():
+    test_sec_info_cache()
+    print('security info cache: ok')
+
+
+if __name__ == "__main__":
+    main()
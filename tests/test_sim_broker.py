@@ -0,0 +1,226 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+
+import app_mods
+from app_mods import shared_classes
+from app_mods.sec_info_cache import SecurityInfoCache
+from sim_broker import SimBroker, SimConfig
+
+
+def wait_for(cond, timeout=2.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if cond():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def final_state(fv, order_id):
+    states = []
+
+    def is_final():
+        states[:] = fv.single_order_history(order_id)
+        return states[0]['status'] in ('COMPLETE', 'REJECTED', 'CANCELED')
+    assert wait_for(is_final)
+    return states
+
+
+def place_mkt(fv, tsym, qty, buy_or_sell='B', exchange='NFO'):
+    r = fv.place_order(buy_or_sell=buy_or_sell, product_type='I', exchange=exchange, tradingsymbol=tsym,
+                       quantity=qty, discloseqty=0, price_type='MKT', price=0.0)
+    assert r['stat'] == 'Ok'
+    return r['norenordno']
+
+
+def test_rest():
+    broker = SimBroker().start()
+    try:
+        fv = broker.session()
+        assert fv.searchscrip(exchange='NSE', searchtext='NIFTY INDEX')['values'][0]['token'] == '26000'
+        assert fv.get_security_info(exchange='NFO', token='43210')['frzqty'] == '1801'
+        assert fv.get_quotes(exchange='NFO', token='43210')['lp'] == '101.50'
+        assert fv.get_order_book() is None and fv.get_positions() is None
+
+        order_id = place_mkt(fv, 'NIFTY28MAR24C22000', 100)
+        states = final_state(fv, order_id)
+        assert [s['status'] for s in states] == ['COMPLETE', 'OPEN', 'PENDING']
+        assert states[0]['fillshares'] == '100' and states[0]['avgprc'] == '101.50'
+        assert fv.get_order_book()[0]['norenordno'] == order_id
+        posn = fv.get_positions()
+        assert [(p['token'], p['prd'], p['netqty']) for p in posn] == [('43210', 'I', '100')]
+
+        # freeze qty and lot size
+        states = final_state(fv, place_mkt(fv, 'NIFTY28MAR24C22000', 1850))
+        assert states[0]['status'] == 'REJECTED' and 'freeze' in states[0]['rejreason']
+        assert fv.place_order(buy_or_sell='B', product_type='I', exchange='NFO', tradingsymbol='NIFTY28MAR24C22000',
+                              quantity=25, discloseqty=0, price_type='MKT') is None
+
+        # resting limit order fills when the price comes to it, cancel of a final order fails
+        r = fv.place_order(buy_or_sell='S', product_type='I', exchange='NFO', tradingsymbol='NIFTY28MAR24C22000',
+                           quantity=100, discloseqty=0, price_type='LMT', price=105.0)
+        assert wait_for(lambda: fv.single_order_history(r['norenordno'])[0]['status'] == 'OPEN')
+        broker.engine.set_ltp('43210', 105.5)
+        assert final_state(fv, r['norenordno'])[0]['avgprc'] == '105.50'
+        assert fv.cancel_order(r['norenordno']) is None
+        posn = fv.get_positions()[0]
+        assert posn['netqty'] == '0' and posn['rpnl'] == '400.00'
+        assert broker.requests['PlaceOrder'] == 4
+    finally:
+        broker.stop()
+
+
+def test_partial_fills_and_rejects():
+    broker = SimBroker(SimConfig(partial_fill=1.0)).start()
+    try:
+        fv = broker.session()
+        states = final_state(fv, place_mkt(fv, 'NIFTY28MAR24C22000', 250))
+        assert [(s['status'], s['fillshares']) for s in states][:2] == [('COMPLETE', '250'), ('OPEN', '100')]
+    finally:
+        broker.stop()
+
+    broker = SimBroker(SimConfig(reject_rate=1.0)).start()
+    try:
+        fv = broker.session()
+        states = final_state(fv, place_mkt(fv, 'NIFTYBEES-EQ', 1, exchange='NSE'))
+        assert states[0]['status'] == 'REJECTED' and 'margin' in states[0]['rejreason'].lower()
+        assert fv.get_positions() is None
+    finally:
+        broker.stop()
+
+
+def test_oco():
+    broker = SimBroker().start()
+    try:
+        fv = broker.session()
+        final_state(fv, place_mkt(fv, 'NIFTY28MAR24C22000', 50))
+        args = dict(buy_or_sell='S', exchange='NFO', tradingsymbol='NIFTY28MAR24C22000', quantity=50,
+                    product_type='I', book_loss_alert_price=96.5, book_loss_price=0.0, book_loss_price_type='MKT',
+                    book_profit_alert_price=111.5, book_profit_price=0.0, book_profit_price_type='MKT')
+        r1 = fv.place_gtt_oco_order(**args, remarks='TeZ_1')
+        r2 = fv.place_gtt_oco_order(**args, remarks='TeZ_2')
+        assert r1['stat'] == 'OI created' and r2['stat'] == 'OI created'
+        assert sorted(alert['al_id'] for alert in fv.get_pending_gtt_order()) == sorted([r1['al_id'], r2['al_id']])
+        assert fv.modify_gtt_oco_order(**args, al_id=r2['al_id'])['stat'] == 'OI replaced'
+        assert fv.cancel_gtt_order(r2['al_id'])['stat'] == 'OI deleted'
+        assert fv.cancel_gtt_order(r2['al_id']) is None
+
+        # the loss leg goes to the market and closes the position
+        broker.engine.set_ltp('43210', 96.0)
+        assert wait_for(lambda: fv.get_pending_gtt_order() is None)
+        assert wait_for(lambda: fv.get_positions()[0]['netqty'] == '0')
+        assert fv.get_order_book()[0]['trantype'] == 'S'
+    finally:
+        broker.stop()
+
+
+def test_end_to_end():
+    broker = SimBroker().start()
+    ws_wrap = None
+    try:
+        fv = broker.session()
+        ws_wrap = app_mods.WS_WrapU(fv=fv)
+        ticks = []
+        ws_wrap.add_tick_listener(lambda token, ltp: ticks.append((token, ltp)))
+        router = app_mods.OrderEventRouter(ws_wrap)
+        ws_wrap.connect_to_data_feed_servers()
+        assert wait_for(lambda: ('26000', 22010.0) in ticks)
+        broker.engine.set_ltp('26000', 22015.0)
+        assert wait_for(lambda: ws_wrap.get_ltp('26000') == 22015.0)
+
+        # order confirmed on the pushed update, its OCO placed at the broker
+        tiu = object.__new__(app_mods.Tiu)
+        tiu.fv = fv
+        tiu.order_events = router
+        tiu.order_engine = None
+        tiu.notifier = None
+        tiu.sec_info = SecurityInfoCache()
+        order = shared_classes.Combi_Primary_B_MKT_And_OCO_S_MKT_I_Order_NFO(
+            tradingsymbol='NIFTY28MAR24C22000', quantity=100, bl_alert_p=96.5, bp_alert_p=111.5, remarks='TeZ_1')
+        start = time.perf_counter()
+        resp_exception, resp_ok, _ = tiu.place_and_confirm_tez_order([order], use_gtt_oco=True)
+        assert resp_exception == 0 and resp_ok == 2 and order.al_id is not None
+        assert (time.perf_counter() - start) < 0.5 and 'SingleOrdHist' not in broker.requests
+        assert router.get(order.order_id)['status'] == 'COMPLETE'
+
+        # square off cancels the OCO and exits the position
+        records = pd.DataFrame({'Order_ID': [order.order_id], 'TradingSymbol_Token': ['NIFTY28MAR24C22000_43210'],
+                                'Qty': [100], 'Status': ['SUCCESS'], 'OCO_Alert_ID': [order.al_id]})
+        report = tiu.square_off_position(records)
+        assert report.complete and fv.get_pending_gtt_order() is None
+        assert wait_for(lambda: fv.get_positions()[0]['netqty'] == '0')
+    finally:
+        if ws_wrap is not None:
+            ws_wrap.disconnect_data_feed_servers()
+        broker.stop()
+
+
+def test_feed_tokens():
+    broker = SimBroker().start()
+    ws_wrap = None
+    try:
+        fv = broker.session()
+        ws_wrap = app_mods.WS_WrapU(fv=fv, max_tick_age=0.3)
+        ws_wrap.connect_to_data_feed_servers()
+        ws_wrap.subscribe_tokens('NFO', ['43210', '43211'])
+        assert wait_for(lambda: ws_wrap.get_ltp('43210') == 101.5)
+        assert {'NFO|43210', 'NFO|43211'} <= set(fv.streamingdata)
+        # no tick for longer than max_tick_age, the ltp is not used
+        time.sleep(0.4)
+        assert ws_wrap.get_ltp('43210') is None
+        broker.engine.set_ltp('43210', 101.0)
+        assert wait_for(lambda: ws_wrap.get_ltp('43210') == 101.0)
+
+        # ladder strike out of the window
+        ws_wrap.unsubscribe_tokens('NFO', ['43211'])
+        assert 'NFO|43211' not in fv.streamingdata and ws_wrap.get_ltp('43211') is None
+
+        # the websocket reconnects, the ladder strike keeps ticking
+        broker.drop_connections()
+        assert wait_for(lambda: len(broker.connections) == 1, timeout=5.0)
+        broker.engine.set_ltp('43210', 102.0)
+        assert wait_for(lambda: ws_wrap.get_ltp('43210') == 102.0)
+        assert all('43210' in conn.tokens and '43211' not in conn.tokens for conn in broker.connections)
+    finally:
+        if ws_wrap is not None:
+            ws_wrap.disconnect_data_feed_servers()
+        broker.stop()
+
+
+def test_order_events_live():
+    broker = SimBroker().start()
+    ws_wrap = None
+    try:
+        fv = broker.session()
+        ws_wrap = app_mods.WS_WrapU(fv=fv)
+        router = app_mods.OrderEventRouter(ws_wrap)
+        ws_wrap.connect_to_data_feed_servers()
+        assert wait_for(lambda: router.live)
+
+        # feed dropped, orders are confirmed by polling till the websocket is open again
+        broker.drop_connections()
+        assert wait_for(lambda: not router.live)
+        assert wait_for(lambda: router.live and fv.ws_connected, timeout=5.0)
+        assert wait_for(lambda: len(broker.connections) == 1)
+    finally:
+        if ws_wrap is not None:
+            ws_wrap.disconnect_data_feed_servers()
+        broker.stop()
+
+
+def main():
+    test_rest()
+    test_partial_fills_and_rejects()
+    test_oco()
+    test_end_to_end()
+    test_feed_tokens()
+    test_order_events_live()
+    print('sim broker: ok')
+
+
+if __name__ == "__main__":
+    main()
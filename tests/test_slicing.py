@@ -0,0 +1,74 @@
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app_mods import slicing
+
+N_CASES = 5000
+
+
+def random_case(rnd):
+    lot_size = rnd.choice((1, 15, 25, 40, 50, 75, 100, 900))
+    frz_qty = rnd.choice((None, 1801, 901, 1201, 36001, rnd.randint(1, 5000)))
+    qty = rnd.randint(0, 300) * lot_size + rnd.choice((0, 0, 0, rnd.randint(0, lot_size)))
+    n_legs = rnd.randint(1, 40)
+    return qty, lot_size, frz_qty, n_legs
+
+
+def test_plan_properties():
+    rnd = random.Random(7)
+    for _ in range(N_CASES):
+        qty, lot_size, frz_qty, n_legs = random_case(rnd)
+        plan = slicing.plan_legs(qty, lot_size, frz_qty, n_legs)
+        case = (qty, lot_size, frz_qty, n_legs, plan)
+        leg_limit = slicing.max_leg_qty(lot_size, frz_qty)
+
+        if leg_limit == 0 or qty < lot_size:
+            assert plan.legs == () and plan.qty == 0, case
+            continue
+        # whole lots only, nothing more than asked
+        assert plan.qty == (qty // lot_size) * lot_size and sum(plan.legs) == plan.qty, case
+        assert all(isinstance(leg, int) and leg > 0 and leg % lot_size == 0 for leg in plan.legs), case
+        # every leg below the freeze qty
+        assert frz_qty is None or max(plan.legs) < frz_qty, case
+        # legs asked for, unless the freeze qty needs more or there are fewer lots
+        min_legs = -(-plan.qty // leg_limit) if leg_limit else 1
+        assert plan.n_legs == min(max(n_legs, min_legs), plan.qty // lot_size), case
+        # even split, larger legs first
+        assert max(plan.legs) - min(plan.legs) <= lot_size, case
+        assert list(plan.legs) == sorted(plan.legs, reverse=True), case
+
+
+def test_plan_examples():
+    # nifty, freeze qty 1801 is exclusive
+    assert slicing.plan_legs(1800, 50, 1801, 1).legs == (1800,)
+    assert slicing.plan_legs(5000, 50, 1801, 1).legs == (1700, 1650, 1650)
+    assert slicing.plan_legs(100, 50, 1801, 4).legs == (50, 50)
+    assert slicing.plan_legs(500, 1, None, 3).legs == (167, 167, 166)
+    assert slicing.plan_legs(40, 50, 1801, 1).legs == ()
+
+    # memoized per inputs
+    slicing.plan_legs.cache_clear()
+    plan = slicing.plan_legs(5000, 50, 1801, 2)
+    assert slicing.plan_legs(5000, 50, 1801, 2) is plan
+    assert slicing.plan_legs.cache_info().hits == 1
+
+
+def test_affordable_qty():
+    assert slicing.affordable_qty(500, 50, 100.0, 1e9) == 500
+    # 10% buffer: 20000 / 110 -> 181 -> 150
+    assert slicing.affordable_qty(500, 50, 100.0, 20000.0) == 150
+    assert slicing.affordable_qty(500, 50, 100.0, 0.0) == 0
+    assert slicing.affordable_qty(500, 50, None, 0.0) == 500
+
+
+def main():
+    test_plan_properties()
+    test_plan_examples()
+    test_affordable_qty()
+    print('slicing: ok')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+
+import app_mods
+from app_mods import sq_off
+from app_mods.sec_info_cache import SecurityInfoCache
+
+REST_LATENCY = 0.05  # secs
+
+
+class LocalFv(object):
+    """Broker of the square off, every call takes REST_LATENCY"""
+    def __init__(self, slow_gtt=None, triggered=None):
+        """
+        Args:
+            triggered (dict): alert id -> (token, qty) closed by the GTT before its cancel
+        """
+        self.lock = threading.Lock()
+        self.calls = []
+        self.times = []
+        self.events = []
+        self.slow_gtt = slow_gtt
+        self.triggered = triggered or dict()
+        self.netqty = {'43210': 2500, '10576': -5, '43211': 50}
+        self.positions_ok = True
+        self.n_orders = 0
+
+    def call(self, name, *args):
+        with self.lock:
+            self.times.append((name, datetime.now()))
+            self.events.append(('start', name, *args))
+        time.sleep(REST_LATENCY)
+        with self.lock:
+            self.calls.append((name, *args))
+            self.events.append(('end', name, *args))
+
+    def get_order_book(self):
+        self.call('order_book')
+        return [{'norenordno': '101', 'status': 'COMPLETE', 'tsym': 'NIFTY28MAR24C22000', 'snonum': '', 'snoordt': ''},
+                {'norenordno': '102', 'status': 'OPEN', 'tsym': 'NIFTY28MAR24C22000', 'snonum': '', 'snoordt': ''},
+                {'norenordno': '201', 'status': 'TRIGGER_PENDING', 'tsym': 'NIFTYBEES-EQ', 'snonum': '103',
+                 'snoordt': '0'},
+                {'norenordno': '999', 'status': 'OPEN', 'tsym': 'SBIN-EQ', 'snonum': '', 'snoordt': ''}]
+
+    def get_pending_gtt_order(self):
+        self.call('gtts')
+        return [{'al_id': 'A1'}, {'al_id': 'A2'}, {'al_id': 'OTHER'}]
+
+    def get_positions(self):
+        self.call('positions')
+        if not self.positions_ok:
+            return None
+        with self.lock:
+            return [{'prd': 'I', 'token': token, 'netqty': str(qty)} for token, qty in self.netqty.items()] + \
+                   [{'prd': 'C', 'token': '43210', 'netqty': '100'}]
+
+    def get_security_info(self, exchange, token):
+        self.call('sec_info', token)
+        if exchange == 'NFO':
+            return {'stat': 'Ok', 'frzqty': '1801', 'ls': '50'}
+        return {'stat': 'Ok', 'ls': '1'}
+
+    def cancel_order(self, order_id):
+        self.call('cancel', order_id)
+        return {'stat': 'Ok'}
+
+    def exit_order(self, snonum, product):
+        self.call('exit_bo', snonum)
+        return {'stat': 'Ok'}
+
+    def cancel_gtt_order(self, al_id):
+        if al_id == self.slow_gtt:
+            time.sleep(1.0)
+        self.call('cancel_gtt', al_id)
+        if al_id in self.triggered:
+            return {'stat': 'Not_Ok', 'emsg': 'alert already triggered'}
+        return {'stat': 'OI deleted', 'al_id': al_id}
+
+    def trigger(self):
+        """GTTs fire after the snapshot"""
+        with self.lock:
+            for token, qty in self.triggered.values():
+                self.netqty[token] -= qty
+
+    def place_order(self, buy_or_sell, product_type, exchange, tradingsymbol, quantity, price_type, discloseqty):
+        self.call('place', buy_or_sell, tradingsymbol, quantity)
+        with self.lock:
+            self.n_orders += 1
+            return {'stat': 'Ok', 'norenordno': str(500 + self.n_orders)}
+
+    def single_order_history(self, order_id):
+        self.call('history', order_id)
+        return [{'norenordno': order_id, 'status': 'COMPLETE'}]
+
+
+def records():
+    return pd.DataFrame({'Order_ID': ['101', '102', '103', '104'],
+                         'TradingSymbol_Token': ['NIFTY28MAR24C22000_43210', 'NIFTY28MAR24C22000_43210',
+                                                 'NIFTYBEES-EQ_10576', 'NIFTY28MAR24P22000_43211'],
+                         'Qty': [2000, 1500, -5, 50],
+                         'Status': ['SUCCESS', 'SUCCESS', 'SUCCESS', 'SUCCESS'],
+                         'OCO_Alert_ID': ['A1', None, 'A2', 'A9']})
+
+
+def new_tiu(fv):
+    # only the square off of Tiu is used, no login
+    tiu = object.__new__(app_mods.Tiu)
+    tiu.fv = fv
+    tiu.order_events = None
+    tiu.sec_info = SecurityInfoCache()
+    return tiu
+
+
+def test_reconcile():
+    fv = LocalFv()
+    plan = sq_off.reconcile(records(), sq_off.as_frame(fv.get_order_book()),
+                            sq_off.as_frame(fv.get_pending_gtt_order()), sq_off.as_frame(fv.get_positions()))
+    assert plan.cancels == [sq_off.SqOffItem('CANCEL_ORDER', '102', 0, 'NIFTY28MAR24C22000'),
+                            sq_off.SqOffItem('EXIT_BO', '103', 0, 'NIFTYBEES-EQ'),
+                            sq_off.SqOffItem('CANCEL_GTT', 'A1', 0, 'NIFTY28MAR24C22000'),
+                            sq_off.SqOffItem('CANCEL_GTT', 'A2', 0, 'NIFTYBEES-EQ')]
+    # recorded 3500 against net 2500: exit 2500, the equity is closed by its bracket order exit
+    assert plan.exits == [sq_off.ExitPosition('NFO', 'NIFTY28MAR24C22000', '43210', 'S', 2500),
+                          sq_off.ExitPosition('NFO', 'NIFTY28MAR24P22000', '43211', 'S', 50)]
+
+
+def test_square_off():
+    fv = LocalFv()
+    tiu = new_tiu(fv)
+    report = tiu.square_off_position(records())
+    assert report.complete and report.elapsed < 0.6
+    places = sorted(call[1:] for call in fv.calls if call[0] == 'place')
+    # exit of 2500 sliced below the freeze qty of 1801
+    assert places == [('S', 'NIFTY28MAR24C22000', 1250), ('S', 'NIFTY28MAR24C22000', 1250),
+                      ('S', 'NIFTY28MAR24P22000', 50)]
+    # open orders and GTTs of a symbol are cancelled before its exits, other symbols do not wait
+    events = fv.events
+    assert events.index(('start', 'place', 'S', 'NIFTY28MAR24P22000', 50)) < events.index(('end', 'cancel', '102'))
+    exit_index = [i for i, event in enumerate(events) if event[:4] == ('start', 'place', 'S', 'NIFTY28MAR24C22000')]
+    assert max(events.index(('end', 'cancel', '102')), events.index(('end', 'cancel_gtt', 'A1'))) < min(exit_index)
+    assert len(report.done) == 7 and report.first_exit < REST_LATENCY
+
+    # by symbol, a short equity position is bought back
+    fv = LocalFv()
+    df = records()
+    df.loc[2, 'Order_ID'] = '105'
+    report = new_tiu(fv).square_off_position(df, symbol='NIFTYBEES')
+    assert [call[1:] for call in fv.calls if call[0] == 'place'] == [('B', 'NIFTYBEES-EQ', 5)]
+
+
+def test_failed_cancel():
+    # the GTT of the call fired after the snapshot, 2000 of the 2500 are closed by it
+    fv = LocalFv(triggered={'A1': ('43210', 2000)})
+    tiu = new_tiu(fv)
+    prepared = tiu.prepare_square_off(tiu.square_off_records(records()))
+    fv.trigger()
+    report = tiu.fire_square_off(prepared)
+    places = sorted(call[1:] for call in fv.calls if call[0] == 'place')
+    assert places == [('S', 'NIFTY28MAR24C22000', 500), ('S', 'NIFTY28MAR24P22000', 50)]
+    # position of the symbol read again after its cancels, the second leg is not needed
+    events = fv.events
+    assert events.index(('end', 'cancel_gtt', 'A1')) < [i for i, e in enumerate(events) if e == ('start', 'positions')][-1]
+    assert report.failed == [sq_off.SqOffItem('CANCEL_GTT', 'A1', 0, 'NIFTY28MAR24C22000')]
+    assert sum(item.kind == 'EXIT' for item in report.done) == 3
+
+    # position not known, no exit of the symbol
+    fv = LocalFv(triggered={'A1': ('43210', 2000)})
+    tiu = new_tiu(fv)
+    prepared = tiu.prepare_square_off(tiu.square_off_records(records()))
+    fv.positions_ok = False
+    report = tiu.fire_square_off(prepared)
+    assert [call[1:] for call in fv.calls if call[0] == 'place'] == [('S', 'NIFTY28MAR24P22000', 50)]
+    assert [item.kind for item in report.failed].count('EXIT') == 2
+
+
+def test_deadline():
+    fv = LocalFv(slow_gtt='A2')
+    report = new_tiu(fv).square_off_position(records(), deadline=0.3)
+    assert not report.complete and report.elapsed < 0.5
+    assert report.unfinished == [sq_off.SqOffItem('CANCEL_GTT', 'A2', 0, 'NIFTYBEES-EQ')]
+    # the exits that do not wait for the slow cancel are done
+    assert sum(item.kind == 'EXIT' for item in report.done) == 3
+
+
+def test_auto_square_off():
+    fv = LocalFv()
+    tiu = new_tiu(fv)
+    df = records()
+    sq_off_time = datetime.now() + timedelta(seconds=1.2)
+    auto = app_mods.AutoSquareOff(tiu, lambda: df, sq_off_time, prearm_secs=1.0, refresh_secs=0.1)
+    assert auto.start()
+    time.sleep(1.0)
+    # snapshot is kept fresh, nothing is sent ahead of the time
+    assert [call[0] for call in fv.calls].count('order_book') >= 2
+    assert not any(call[0] in ('place', 'cancel', 'cancel_gtt') for call in fv.calls)
+    # recorded after the last snapshot
+    df.loc[len(df)] = ['106', 'NIFTY28MAR24P22000_43211', 50, 'SUCCESS', None]
+    assert auto.wait(timeout=3.0) and not auto.is_alive()
+
+    # on time, the first exit without a cancel leaves right after the final position read
+    assert auto.lag < 0.005 and auto.report is not None
+    first_place = next(t for name, t in fv.times if name == 'place')
+    assert (first_place - sq_off_time).total_seconds() < REST_LATENCY + 0.03
+    assert ('place', 'S', 'NIFTY28MAR24P22000', 50) in fv.calls
+
+
+def test_auto_square_off_position_change():
+    fv = LocalFv()
+    tiu = new_tiu(fv)
+    sq_off_time = datetime.now() + timedelta(seconds=1.2)
+    auto = app_mods.AutoSquareOff(tiu, records, sq_off_time, prearm_secs=1.0, refresh_secs=0.1)
+    assert auto.start()
+    time.sleep(1.0)
+    assert auto.prepared.plan.exits[0].qty == 2500
+    # closed by hand after the last refresh, the exits follow the position at the time
+    with fv.lock:
+        fv.netqty.update({'43210': 1000, '43211': 0})
+    assert auto.wait(timeout=3.0)
+    assert [call[1:] for call in fv.calls if call[0] == 'place'] == [('S', 'NIFTY28MAR24C22000', 1000)]
+    assert auto.report.complete
+
+
+def test_auto_square_off_elapsed():
+    auto = app_mods.AutoSquareOff(None, lambda: None, datetime.now() - timedelta(seconds=1))
+    assert not auto.start() and not auto.is_alive()
+
+
+def main():
+    test_reconcile()
+    test_square_off()
+    test_failed_cancel()
+    test_deadline()
+    test_auto_square_off()
+    test_auto_square_off_position_change()
+    test_auto_square_off_elapsed()
+    print('square off: ok')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app_mods
+from test_symbol_index import NFO_TXT, write_file
+
+
+class LocalTiu(object):
+    """Stand-in for Tiu serving the option chain of the test scrip master"""
+    def __init__(self, sym_index):
+        self.sym_index = sym_index
+        self.chains = dict()
+        self.sec_info_calls = 0
+
+    def get_option_chain_index(self, symbol, expdate):
+        key = (symbol, expdate.upper())
+        if key not in self.chains:
+            self.chains[key] = app_mods.OptionChain.from_index(self.sym_index, *key)
+        return self.chains[key]
+
+    def get_security_info(self, exchange, symbol, token=None):
+        self.sec_info_calls += 1
+        return {'stat': 'Ok', 'frzqty': '1801'}
+
+    def fill_security_info(self, exchange, tokens):
+        return 0
+
+    def search_scrip(self, exchange, symbol):
+        return ('10576', 'NIFTYBEES-EQ')
+
+    def fetch_ltp(self, exchange, token):
+        return 250.0, 0.01, 1.0
+
+
+class LocalFeed(object):
+    def __init__(self):
+        self.listeners = []
+        self.tokens = set()
+
+    def add_tick_listener(self, listener):
+        self.listeners.append(listener)
+
+    def subscribe_tokens(self, exch, tokens):
+        self.tokens.update(tokens)
+
+    def unsubscribe_tokens(self, exch, tokens):
+        self.tokens.difference_update(tokens)
+
+    def get_ltp(self, token):
+        return 101.5 if token in self.tokens else None
+
+    def tick(self, token, ltp):
+        for listener in self.listeners:
+            listener(token, ltp)
+
+
+def wait_for(cond, timeout=2.0):
+    end = time.time() + timeout
+    while time.time() < end and not cond():
+        time.sleep(0.01)
+    return cond()
+
+
+def test_strike_ladder():
+    with tempfile.TemporaryDirectory() as folder:
+        nfo_file = write_file(folder, 'FV_NFO_symbols.txt', NFO_TXT)
+        tiu = LocalTiu(app_mods.SymbolIndex.load(nfo_file, 'NFO'))
+        feed = LocalFeed()
+        ladder = app_mods.StrikeLadderPrefetcher(tiu, feed, n_strikes=1)
+        ladder.add_instrument('26000', 'NFO', 'NIFTY', '28-MAR-2024')
+        ladder.add_instrument('26000', 'NSE', 'NIFTYBEES')
+        ladder.start()
+        assert wait_for(lambda: ladder.get('NSE', 'NIFTYBEES') is not None)
+
+        assert ladder.get('NFO', 'NIFTY', '28-MAR-2024', 22010.0, 'C') is None  # no tick yet
+        feed.tick('26000', 22010.0)
+        assert wait_for(lambda: ladder.get('NFO', 'NIFTY', '28-MAR-2024', 22010.0, 'C') is not None)
+        leg = ladder.get('NFO', 'NIFTY', '28-MAR-2024', 22010.0, 'C')
+        assert leg.strike == 22000.0 and leg.token == '43210' and leg.ls == 50 and leg.frz_qty == 1801
+        assert ladder.get('NFO', 'NIFTY', '28-MAR-2024', 22010.0, 'P', 1).tsym == 'NIFTY28MAR24P22050'
+        assert ladder.get_ltp(leg.token) == 101.5
+        calls = tiu.sec_info_calls
+
+        # same strike, no refresh
+        feed.tick('26000', 22015.0)
+        time.sleep(0.05)
+        assert tiu.sec_info_calls == calls
+
+        # crossing to 22100 moves the ladder, only new legs are fetched
+        feed.tick('26000', 22090.0)
+        assert wait_for(lambda: ladder.get('NFO', 'NIFTY', '28-MAR-2024', 22090.0, 'C', 1) is not None)
+        assert ladder.get('NFO', 'NIFTY', '28-MAR-2024', 22090.0, 'C', 1).strike == 22200.0
+        assert tiu.sec_info_calls == calls + 3  # 22100 CE/PE and 22200 CE, 22050 legs are kept
+        assert ladder.get('NFO', 'NIFTY', '28-MAR-2024', 22090.0, 'C', -2) is None
+        # 22000 legs dropped out of the window are not fed any more
+        assert leg.token not in feed.tokens
+        assert ladder.get('NFO', 'NIFTY', '28-MAR-2024', 22090.0, 'C', -1).token in feed.tokens
+
+        leg = ladder.get('NSE', 'NIFTYBEES')
+        assert leg.token == '10576' and leg.ti == 0.01 and leg.frz_qty == 1801
+        ladder.stop()
+
+
+def main():
+    test_strike_ladder()
+    print('strike ladder: ok')
+
+
+if __name__ == "__main__":
+    main()
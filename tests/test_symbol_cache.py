@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app_mods.symbol_cache import SymbolCache
+
+SYMBOLS = {('NSE', 'NIFTYBEES'): ('10576', 'NIFTYBEES-EQ'),
+           ('NSE', 'BANKBEES'): ('11439', 'BANKBEES-EQ'),
+           ('NSE', 'NIFTY'): ('26000', 'Nifty 50')}
+
+
+def test_symbol_cache():
+    calls = []
+
+    def resolver(exchange, symbol):
+        calls.append((exchange, symbol))
+        return SYMBOLS.get((exchange, symbol.upper()), ('None', None))
+
+    cache = SymbolCache(max_size=2, negative_ttl=0.2)
+    assert cache.resolve('NSE', 'NIFTYBEES', resolver) == ('10576', 'NIFTYBEES-EQ')
+    assert cache.resolve('nse', 'niftybees', resolver) == ('10576', 'NIFTYBEES-EQ')
+    assert len(calls) == 1
+
+    # misses are remembered until the negative ttl expires
+    assert cache.resolve('NSE', 'UNKNOWN', resolver) == (None, None)
+    assert cache.resolve('NSE', 'UNKNOWN', resolver) == (None, None)
+    assert len(calls) == 2
+    time.sleep(0.25)
+    cache.resolve('NSE', 'UNKNOWN', resolver)
+    assert len(calls) == 3
+
+    # bounded LRU, NIFTYBEES is the least recently used
+    cache.resolve('NSE', 'BANKBEES', resolver)
+    assert len(cache) == 2
+    assert cache.get('NSE', 'NIFTYBEES') == (False, None)
+
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['negative_hits'] == 1 and stats['evictions'] == 1
+
+    # trading day change clears the entries
+    cache.day = cache.day.replace(year=2000)
+    assert cache.get('NSE', 'BANKBEES') == (False, None)
+    assert len(cache) == 0
+
+
+def test_failed_lookup():
+    calls = []
+
+    def resolver(exchange, symbol):
+        # no reply of the broker, expired session or throttled
+        calls.append((exchange, symbol))
+        return None if len(calls) == 1 else SYMBOLS[(exchange, symbol)]
+
+    cache = SymbolCache(negative_ttl=60.0)
+    assert cache.resolve('NSE', 'BANKBEES', resolver) == (None, None)
+    assert len(cache) == 0
+    # not remembered, looked up again
+    assert cache.resolve('NSE', 'BANKBEES', resolver) == ('11439', 'BANKBEES-EQ')
+    assert cache.resolve('NSE', 'BANKBEES', resolver) == ('11439', 'BANKBEES-EQ')
+    assert len(calls) == 2
+
+
+def main():
+    test_symbol_cache()
+    test_failed_lookup()
+    print('symbol cache: ok')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app_mods
+
+NSE_TXT = '''Exchange,Token,LotSize,Symbol,TradingSymbol,Instrument,TickSize,
+NSE,26000,1,Nifty 50,NIFTY INDEX,INDEX,0.05,
+NSE,26009,1,Nifty Bank,NIFTY BANK,INDEX,0.05,
+NSE,10576,1,NIFTYBEES,NIFTYBEES-EQ,EQ,0.01,
+'''
+
+NFO_TXT = '''Exchange,Token,LotSize,Symbol,TradingSymbol,Expiry,Instrument,OptionType,StrikePrice,TickSize,
+NFO,43210,50,NIFTY,NIFTY28MAR24C22000,28-MAR-2024,OPTIDX,CE,22000,0.05,
+NFO,43211,50,NIFTY,NIFTY28MAR24P22000,28-MAR-2024,OPTIDX,PE,22000,0.05,
+NFO,43212,50,NIFTY,NIFTY28MAR24C22050,28-MAR-2024,OPTIDX,CE,22050,0.05,
+NFO,43213,50,NIFTY,NIFTY28MAR24P22050,28-MAR-2024,OPTIDX,PE,22050,0.05,
+NFO,43214,50,NIFTY,NIFTY28MAR24C22100,28-MAR-2024,OPTIDX,CE,22100,0.05,
+NFO,43215,50,NIFTY,NIFTY28MAR24P22100,28-MAR-2024,OPTIDX,PE,22100,0.05,
+NFO,43216,50,NIFTY,NIFTY28MAR24C22200,28-MAR-2024,OPTIDX,CE,22200,0.05,
+NFO,53001,15,BANKNIFTY,BANKNIFTY27MAR24C47000,27-MAR-2024,OPTIDX,CE,47000,0.05,
+NFO,53002,15,BANKNIFTY,BANKNIFTY24APR24C47000,24-APR-2024,OPTIDX,CE,47000,0.05,
+'''
+
+
+def write_file(folder, name, text):
+    file_name = os.path.join(folder, name)
+    with open(file_name, 'w') as f:
+        f.write(text)
+    return file_name
+
+
+def test_symbol_index():
+    with tempfile.TemporaryDirectory() as folder:
+        nse_file = write_file(folder, 'FV_NSE_symbols.txt', NSE_TXT)
+        nfo_file = write_file(folder, 'FV_NFO_symbols.txt', NFO_TXT)
+
+        nse = app_mods.SymbolIndex.load(nse_file, 'NSE')
+        rec = nse.by_name('NIFTY INDEX')
+        assert rec.token == 26000 and rec.tsym == 'Nifty 50'
+        assert nse.by_name('NIFTY BANK').token == 26009
+        assert nse.by_name('NIFTYBEES-EQ').token == 10576
+        assert nse.by_token(10576).tsym == 'NIFTYBEES-EQ'
+        assert nse.by_name('UNKNOWN-EQ') is None
+
+        nfo = app_mods.SymbolIndex.load(nfo_file, 'NFO')
+        assert nfo.by_tsym('NIFTY28MAR24P22000').token == 43211
+        rec = nfo.by_contract('NIFTY', '28-MAR-2024', 22000, 'CE')
+        assert rec.tsym == 'NIFTY28MAR24C22000' and rec.ls == 50
+
+        # second load uses the already built index file
+        assert len(app_mods.SymbolIndex.load(nfo_file, 'NFO')) == 9
+        del nse, nfo
+
+
+def test_option_chain():
+    with tempfile.TemporaryDirectory() as folder:
+        nfo_file = write_file(folder, 'FV_NFO_symbols.txt', NFO_TXT)
+        nfo = app_mods.SymbolIndex.load(nfo_file, 'NFO')
+        chain = app_mods.OptionChain.from_index(nfo, 'NIFTY', '28-MAR-2024')
+        assert len(chain) == 4
+
+        assert chain.resolve(22020.0, 'C').strike == 22000.0
+        assert chain.resolve(22025.0, 'C').strike == 22050.0  # tie goes to the higher strike
+        assert chain.resolve(22060.0, 'P', -1).tsym == 'NIFTY28MAR24P22000'
+        leg = chain.resolve(22090.0, 'C', 1)
+        assert leg.strike == 22200.0 and leg.token == '43216' and leg.ls == 50
+        assert chain.resolve(22190.0, 'P') is None  # 22200 PE is not listed
+        assert chain.resolve(30000.0, 'C', 1) is None
+        assert app_mods.OptionChain.from_index(nfo, 'BANKNIFTY', '28-MAR-2024') is None
+        del nfo, chain
+
+
+def test_strike_grid():
+    with tempfile.TemporaryDirectory() as folder:
+        nfo_file = write_file(folder, 'FV_NFO_symbols.txt', NFO_TXT)
+        nfo = app_mods.SymbolIndex.load(nfo_file, 'NFO')
+        service = app_mods.StrikeGridService(nfo)
+        grid = service.get('NIFTY', '28-mar-2024')
+        assert grid is service.get('NIFTY', '28-MAR-2024')  # served from memory
+        assert grid.interval == 50.0 and not grid.is_uniform()
+        assert grid.step_at(22020.0) == 50.0 and grid.step_at(22150.0) == 100.0
+        assert grid.nearest(22074.0) == 22050.0 and grid.nearest(22075.0) == 22100.0
+        assert grid.nearest(22075.0, 1) == 22200.0 and grid.nearest(22000.0, -1) is None
+        assert service.interval('BANKNIFTY', '27-MAR-2024') is None  # single strike
+        assert service.get('FINNIFTY', '28-MAR-2024') is None
+        del nfo, service, grid
+
+
+def test_compact_search_file():
+    with tempfile.TemporaryDirectory() as folder:
+        nfo_file = write_file(folder, 'FV_NFO_symbols.txt', NFO_TXT)
+        pairs = [('NIFTY', '28-MAR-2024'), ('BANKNIFTY', '27-MAR-2024')]
+        df = app_mods.scrip_master.compact_search_file(nfo_file, pairs)
+        assert len(df) == 8
+        assert 53002 not in df['Token'].values
+        assert df.loc[df['TradingSymbol'] == 'NIFTY28MAR24P22050', 'Token'].iloc[0] == 43213
+        assert os.path.exists(os.path.join(folder, 'FV_NFO_symbols.pkl'))
+
+        # persisted frame is reused when it covers the pairs
+        df = app_mods.scrip_master.load_compacted(nfo_file, pairs[:1])
+        assert df is not None and len(df) == 8
+        assert app_mods.scrip_master.load_compacted(nfo_file, [('BANKNIFTY', '24-APR-2024')]) is None
+
+
+def main():
+    test_symbol_index()
+    test_option_chain()
+    test_strike_grid()
+    test_compact_search_file()
+    print('symbol index: ok')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app_mods
+import app_utils
+from app_mods import shared_classes
+from app_utils.exec_service import ORDER, ExecService
+from app_utils.tracing import Tracer
+from sim_broker import SimBroker
+
+
+def test_ring():
+    tracer = Tracer(capacity=4)
+    # no action, nothing is recorded
+    with tracer.span('QUOTE'):
+        pass
+    tracer.record('QUOTE', 0.0, 1.0)
+    assert tracer.spans() == []
+
+    with tracer.trace('CLICK_BUY'):
+        trace_id = tracer.current_trace()
+        for i in range(5):
+            tracer.record('QUOTE', 10.0, 10.0 + i / 1000)
+    assert tracer.current_trace() == 0
+    spans = tracer.spans()
+    # the oldest span is overwritten, the click ends last
+    assert [s.seq for s in spans] == [2, 3, 4, 5]
+    assert [s.name for s in spans] == ['QUOTE'] * 3 + ['CLICK_BUY'] and {s.trace_id for s in spans} == {trace_id}
+
+    with tracer.trace('CLICK_SHORT'):
+        pass
+    assert tracer.current_trace() == 0 and tracer.spans(trace_id=trace_id + 1)[0].name == 'CLICK_SHORT'
+
+    tracer = Tracer(enabled=False)
+    with tracer.trace('CLICK_BUY'):
+        with tracer.span('QUOTE'):
+            pass
+    assert tracer.spans() == []
+
+
+def test_summary():
+    tracer = Tracer()
+    with tracer.trace('CLICK_BUY'):
+        for i in range(1, 101):
+            tracer.record('PLACE_ORDER', 0.0, i / 1000)
+    summary = tracer.summary()['PLACE_ORDER']
+    assert summary['count'] == 100 and summary['p50_ms'] == 50.0 and summary['p95_ms'] == 95.0
+    assert summary['p99_ms'] == 99.0 and summary['max_ms'] == 100.0
+    assert summary['histogram'] == {'<=1ms': 1, '<=2ms': 1, '<=5ms': 3, '<=10ms': 5, '<=20ms': 10,
+                                    '<=50ms': 30, '<=100ms': 50}
+
+    with tempfile.TemporaryDirectory() as folder:
+        file_path = os.path.join(folder, 'trace', 'summary.json')
+        tracer.export(file_path)
+        with open(file_path) as f:
+            exported = json.load(f)
+    assert exported['recorded'] == 101 and exported['overwritten'] == 0
+    assert exported['spans']['PLACE_ORDER'] == summary and 'CLICK_BUY' in exported['spans']
+
+
+def test_threads():
+    tracer = Tracer()
+    svc = ExecService({ORDER: 4})
+
+    def leg(i):
+        with tracer.span('PLACE_ORDER'):
+            time.sleep(0.01)
+        return tracer.current_trace()
+
+    # writers on many threads, spans of a click keep its trace id on the lanes
+    barrier = threading.Barrier(4)
+
+    def click():
+        barrier.wait()
+        with tracer.trace('CLICK_BUY'):
+            trace_id = tracer.current_trace()
+            futures = [svc.submit(ORDER, leg, i) for i in range(4)]
+            assert [f.result() for f in futures] == [trace_id] * 4
+
+    threads = [threading.Thread(target=click) for _ in range(4)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    svc.shutdown()
+    spans = tracer.spans()
+    assert len(spans) == 20 and len({s.seq for s in spans}) == 20
+    for click_span in (s for s in spans if s.name == 'CLICK_BUY'):
+        legs = tracer.spans(trace_id=click_span.trace_id)[:-1]
+        assert len(legs) == 4 and all(click_span.start <= s.start <= s.end <= click_span.end for s in legs)
+
+
+def new_order():
+    return shared_classes.Combi_Primary_B_MKT_And_OCO_S_MKT_I_Order_NFO(
+        tradingsymbol='NIFTY28MAR24C22000', quantity=50, bl_alert_p=96.5, bp_alert_p=111.5, remarks='TeZ_1')
+
+
+def test_order_stages():
+    tracer = Tracer()
+    app_utils.set_tracer(tracer)
+    broker = SimBroker().start()
+    engine = None
+    try:
+        fv = broker.session()
+        tiu = object.__new__(app_mods.Tiu)
+        tiu.fv = fv
+        tiu.order_events = None
+        tiu.order_engine = None
+        tiu.notifier = None
+        with tracer.trace('CLICK_BUY'):
+            _, resp_ok, _ = tiu.place_and_confirm_tez_order([new_order(), new_order()], use_gtt_oco=True)
+        assert resp_ok == 4
+        names = [s.name for s in tracer.spans(trace_id=1)]
+        assert names.count('PLACE_ORDER') == 2 and names.count('OCO_PLACE') == 2
+        assert names.count('CONFIRM_POLL') >= 2 and names[-1] == 'CLICK_BUY'
+
+        # same stages on the asyncio order engine
+        engine = app_mods.AsyncOrderEngine(fv)
+        engine.start()
+        tiu.order_engine = engine
+        with tracer.trace('CLICK_SHORT'):
+            _, resp_ok, _ = tiu.place_and_confirm_tez_order([new_order()], use_gtt_oco=True)
+        assert resp_ok == 2
+        names = [s.name for s in tracer.spans(trace_id=2)]
+        assert names.count('PLACE_ORDER') == 1 and names.count('OCO_PLACE') == 1 and 'CONFIRM_POLL' in names
+    finally:
+        if engine is not None:
+            engine.stop()
+        broker.stop()
+        app_utils.set_tracer(None)
+
+
+def main():
+    test_ring()
+    test_summary()
+    test_threads()
+    test_order_stages()
+    print('tracing: ok')
+
+
+if __name__ == "__main__":
+    main()
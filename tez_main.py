@@ -173,6 +173,8 @@ def gui_tk_layout():
     def slider_changed(value):
         update_button_states (value)
         update_status_label(value)
+        if g_app_be is not None:
+            g_app_be.arm_order_tickets(int(value) == 1)
 
     # Create a slider (Scale widget) to control the ON/OFF status
     slider_frame = tk.Frame(root)